@@ -4,6 +4,17 @@ from fastapi import Request
 from database import db
 from models import ActivityLog
 
+def get_client_ip(request: Request) -> Optional[str]:
+    """Public client IP, preferring proxy headers (Nginx, Cloudflare, etc.) over the socket peer."""
+    headers_to_check = ["cf-connecting-ip", "x-real-ip", "x-forwarded-for"]
+    for header in headers_to_check:
+        value = request.headers.get(header)
+        if value:
+            if header == "x-forwarded-for":
+                return value.split(",")[0].strip()
+            return value.strip()
+    return request.client.host if request.client else None
+
 async def log_activity(
     username: str,
     action: str,
@@ -18,19 +29,7 @@ async def log_activity(
     This is designed to be non-blocking and safe to call from any route.
     """
     if request and not ip_address:
-        # Check various headers for public IP if behind a proxy (Nginx, Cloudflare, etc.)
-        headers_to_check = ["cf-connecting-ip", "x-real-ip", "x-forwarded-for"]
-        for header in headers_to_check:
-            value = request.headers.get(header)
-            if value:
-                if header == "x-forwarded-for":
-                    ip_address = value.split(",")[0].strip()
-                else:
-                    ip_address = value.strip()
-                break
-        
-        if not ip_address:
-            ip_address = request.client.host if request.client else None
+        ip_address = get_client_ip(request)
 
     try:
         activity = ActivityLog(
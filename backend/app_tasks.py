@@ -0,0 +1,75 @@
+"""
+Registry of the background tasks a worker starts outside of requests (see main.lifespan).
+
+A bare asyncio.create_task is only weakly referenced by the loop and is simply abandoned when the
+worker stops: an advertiser sync or an index build is cut off mid-way, and its exceptions are
+never logged. Tasks started through spawn() are kept until they finish, log their failure, and are
+drained on shutdown:
+    - one-off tasks (syncs, index builds, calibration) get up to the drain timeout to finish
+    - tasks spawned with cancel_on_shutdown=True (endless loops that only sleep between rounds)
+      are cancelled right away
+Whatever is still running when the drain timeout expires is cancelled.
+
+Readiness: the worker is ready once startup (client checks and cache warm-up) has completed, and
+stops being ready as soon as shutdown begins, so a load balancer polling /ready stops routing to it
+before it drains.
+"""
+import asyncio
+import logging
+from typing import Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}  # task -> cancel_on_shutdown
+_ready = False
+_draining = False
+
+
+def spawn(coro: Coroutine, name: Optional[str] = None, cancel_on_shutdown: bool = False) -> asyncio.Task:
+    task = asyncio.ensure_future(coro)
+    if name:
+        task.set_name(name)
+    _tasks[task] = cancel_on_shutdown
+    task.add_done_callback(_on_done)
+    return task
+
+
+def _on_done(task: asyncio.Task):
+    _tasks.pop(task, None)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()!r}")
+
+
+def set_ready(ready: bool):
+    global _ready
+    _ready = ready
+
+
+def is_ready() -> bool:
+    return _ready and not _draining
+
+
+async def drain(timeout: float):
+    """Stop being ready, cancel the loops, give one-off tasks up to `timeout` seconds, cancel the rest."""
+    global _draining
+    _draining = True
+    for task, cancel in list(_tasks.items()):
+        if cancel:
+            task.cancel()
+    pending = list(_tasks)
+    if not pending:
+        return
+    logger.info(f"Draining {len(pending)} background tasks")
+    done, still_running = await asyncio.wait(pending, timeout=timeout)
+    for task in still_running:
+        logger.warning(f"Cancelling background task {task.get_name()} after {timeout}s drain timeout")
+        task.cancel()
+    if still_running:
+        await asyncio.wait(still_running, timeout=5)
+
+
+def task_metrics() -> dict:
+    return {
+        "ready": is_ready(),
+        "running": sorted(task.get_name() for task in _tasks),
+    }
@@ -0,0 +1,169 @@
+"""
+Bounded in-process cache for async loaders, shared by the lookup caches (API connections, Cake
+metadata, shared offer pages, active QA forms, SMTP config, admin stats, authenticated users, list
+totals).
+
+    cache = AsyncTTLCache("cake_metadata", ttl=3600, max_entries=8, stale_ttl=600)
+    verticals = await cache.get_or_load("verticals", fetch_verticals)
+
+    - LRU bound on entries and, optionally, on approximate bytes (JSON length of the values)
+    - per-entry TTL: ttl may be a number or a function of the loaded value; 0 means "do not store"
+    - single flight: concurrent misses for a key share one loader call. It runs shielded, so a
+      client disconnecting does not cancel a load the others are waiting on
+    - stale-while-revalidate: for stale_ttl seconds after expiry the old value is served while
+      one background load refreshes it (a failed refresh keeps serving it until stale_ttl ends)
+    - invalidate(key) also discards a load of that key already in flight (clear(): of every key),
+      so a value read before a write is never stored after it
+Loader exceptions reach every waiter and are not cached. Counters per cache are reported by
+cache_metrics() in /admin/metrics.
+
+Per worker process, like the dict caches it replaces: other workers see a write on expiry.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+TTL = Union[float, Callable[[Any], float]]
+
+_caches = []
+
+
+def _json_size(value: Any) -> int:
+    return len(json.dumps(value, default=str))
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "stale_until", "size")
+
+    def __init__(self, value: Any, expires_at: float, stale_until: float, size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.size = size
+
+
+class AsyncTTLCache:
+    def __init__(self, name: str, ttl: TTL, max_entries: int = 1000, max_bytes: Optional[int] = None,
+                 stale_ttl: float = 0, sizeof: Callable[[Any], int] = _json_size):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stale_ttl = stale_ttl
+        self.sizeof = sizeof
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        self._inflight = {}  # key -> asyncio.Task running the loader; a load only stores while it is listed
+        self._bytes = 0
+        self._metrics = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "loads": 0, "load_errors": 0,
+            "evictions": 0, "expirations": 0, "invalidations": 0,
+        }
+        _caches.append(self)
+
+    async def get_or_load(self, key: Hashable, loader: Loader, ttl: Optional[TTL] = None) -> Any:
+        """The cached value for key, loading it (once, however many callers miss) when absent."""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry.expires_at:
+                self._entries.move_to_end(key)
+                self._metrics["hits"] += 1
+                return entry.value
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                self._metrics["stale_hits"] += 1
+                self._start_load(key, loader, ttl)
+                return entry.value
+            self._remove(key)
+            self._metrics["expirations"] += 1
+
+        self._metrics["misses"] += 1
+        return await asyncio.shield(self._start_load(key, loader, ttl))
+
+    def _start_load(self, key: Hashable, loader: Loader, ttl: Optional[TTL]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, ttl))
+            self._inflight[key] = task
+
+            def _done(finished, key=key):
+                if self._inflight.get(key) is finished:
+                    del self._inflight[key]
+                if not finished.cancelled() and finished.exception() is not None:
+                    # Retrieved here so a background refresh nobody awaits does not warn
+                    logger.warning(f"Cache {self.name}: loading {key!r} failed: {finished.exception()!r}")
+            task.add_done_callback(_done)
+        return task
+
+    async def _load(self, key: Hashable, loader: Loader, ttl: Optional[TTL]) -> Any:
+        self._metrics["loads"] += 1
+        try:
+            value = await loader()
+        except BaseException:
+            self._metrics["load_errors"] += 1
+            raise
+        # Not stored if the key was invalidated meanwhile
+        if self._inflight.get(key) is asyncio.current_task():
+            self.set(key, value, ttl)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[TTL] = None):
+        ttl = self.ttl if ttl is None else ttl
+        seconds = ttl(value) if callable(ttl) else ttl
+        if key in self._entries:
+            self._remove(key)
+        if seconds <= 0:
+            return
+        size = self.sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        now = time.monotonic()
+        self._entries[key] = _Entry(value, now + seconds, now + seconds + self.stale_ttl, size)
+        self._bytes += size
+        self._evict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """The fresh cached value for key, or default. Never loads."""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry.expires_at:
+            return default
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._metrics["evictions"] += 1
+
+    def invalidate(self, key: Hashable):
+        if key in self._entries:
+            self._remove(key)
+        # Waiters on a load already running still get its result; it is just not stored
+        self._inflight.pop(key, None)
+        self._metrics["invalidations"] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        self._inflight.clear()
+        self._metrics["invalidations"] += 1
+
+    def metrics(self) -> dict:
+        return {**self._metrics, "entries": len(self._entries), "bytes": self._bytes, "loading": len(self._inflight)}
+
+
+def cache_metrics() -> dict:
+    return {cache.name: cache.metrics() for cache in _caches}
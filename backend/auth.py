@@ -1,9 +1,17 @@
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import app_tasks
+from async_cache import AsyncTTLCache
 from database import settings, db
 from models import User
 
@@ -12,12 +20,266 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Session versions. Tokens carry "ver", the user's token_version at login; bumping token_version
+# (disable, role change, password reset) revokes every token issued before it. Each worker keeps
+# username -> token_version in memory and refreshes it incrementally from the users whose
+# auth_updated_at moved since the last sync, so validating a token needs no per-request query.
+# Deleted users leave a tombstone in user_tombstones that the incremental sync also reads, so every
+# worker drops them (and rejects their tokens) within TOKEN_VERSION_SYNC_INTERVAL.
+TOKEN_VERSION_SYNC_INTERVAL = 2  # seconds
+TOKEN_VERSION_FULL_SYNC_INTERVAL = 60  # seconds
+# Incremental syncs re-read a little before the newest change seen, for writers whose clocks lag
+TOKEN_VERSION_SYNC_OVERLAP = timedelta(seconds=5)
+# Tombstones only need to outlive a sync; the TTL index removes them after this
+USER_TOMBSTONE_RETENTION = timedelta(days=1)
+_VERSION_PROJECTION = {"_id": 0, "username": 1, "token_version": 1, "auth_updated_at": 1}
+
+_token_versions = {}  # username -> {"version": int, "updated_at": datetime or None}
+_versions_high_water = None  # newest auth_updated_at seen, or the start of the last full load
+_versions_synced_at = None  # time.monotonic() of the last sync
+_versions_loaded_at = None  # time.monotonic() of the last full reload
+_versions_lock = None  # created on first use, inside the running loop
+
+# Authenticated users, so every request does not re-read and re-validate the user document. Keyed
+# on the user's token version and auth_updated_at from the version map, so an entry stops being
+# used as soon as a write from any worker reaches the map (within TOKEN_VERSION_SYNC_INTERVAL).
+USER_CACHE_TTL = 60  # seconds
+MAX_CACHED_USERS = 1000
+user_cache = AsyncTTLCache(
+    "authenticated_users", ttl=lambda user: USER_CACHE_TTL if user else 0, max_entries=MAX_CACHED_USERS
+)
+
+async def _load_user(username: str) -> Optional[User]:
+    user_data = await db.users.find_one({"username": username})
+    return User(**user_data) if user_data else None
+
+def _remember_version(doc: dict, versions: Optional[dict] = None) -> dict:
+    global _versions_high_water
+    entry = {"version": doc.get("token_version", 0), "updated_at": doc.get("auth_updated_at")}
+    (_token_versions if versions is None else versions)[doc["username"]] = entry
+    if entry["updated_at"] and (_versions_high_water is None or entry["updated_at"] > _versions_high_water):
+        _versions_high_water = entry["updated_at"]
+    return entry
+
+async def _sync_token_versions():
+    global _token_versions, _versions_high_water, _versions_synced_at, _versions_loaded_at, _versions_lock
+    if _versions_synced_at is not None and time.monotonic() - _versions_synced_at < TOKEN_VERSION_SYNC_INTERVAL:
+        return
+    if _versions_lock is None:
+        _versions_lock = asyncio.Lock()
+
+    async with _versions_lock:
+        now = time.monotonic()
+        if _versions_synced_at is not None and now - _versions_synced_at < TOKEN_VERSION_SYNC_INTERVAL:
+            return
+        full = _versions_loaded_at is None or now - _versions_loaded_at >= TOKEN_VERSION_FULL_SYNC_INTERVAL
+        query = {} if full else {"auth_updated_at": {"$gte": _versions_high_water - TOKEN_VERSION_SYNC_OVERLAP}}
+        versions = {} if full else None
+        started_at = datetime.utcnow()
+        try:
+            if not full:
+                # A full load only returns existing users, so it needs no tombstones
+                async for doc in db.user_tombstones.find(
+                    {"deleted_at": query["auth_updated_at"]}, {"_id": 0, "username": 1}
+                ):
+                    _token_versions.pop(doc["username"], None)
+            async for doc in db.users.find(query, _VERSION_PROJECTION):
+                _remember_version(doc, versions)
+        except Exception as e:
+            # Keep serving from the current map; unknown users still fall back to a direct lookup
+            print(f"CRITICAL: Failed to sync token versions: {e}")
+        else:
+            if full:
+                _token_versions = versions
+                _versions_loaded_at = now
+                # Everything changed before the load started is in the map now, even when no user
+                # has an auth_updated_at yet; the next incremental sync starts from there
+                if _versions_high_water is None or started_at > _versions_high_water:
+                    _versions_high_water = started_at
+                refresh_password_hashing()
+        _versions_synced_at = now
+
+async def _get_token_version(username: str) -> Optional[dict]:
+    await _sync_token_versions()
+    entry = _token_versions.get(username)
+    if entry is None:
+        # Created since the last sync, or deleted
+        doc = await db.users.find_one({"username": username}, _VERSION_PROJECTION)
+        if doc is None:
+            return None
+        entry = _remember_version(doc)
+    return entry
+
+async def mark_user_changed(username: str, revoke_sessions: bool = False) -> Optional[int]:
+    """
+    Record a write to a user document so every worker reloads it on its next sync. Call after
+    writing. revoke_sessions=True also bumps token_version, invalidating every token issued so far.
+    Returns the user's token_version afterwards (None if the user does not exist).
+    """
+    update = {"$set": {"auth_updated_at": datetime.utcnow()}}
+    if revoke_sessions:
+        update["$inc"] = {"token_version": 1}
+    doc = await db.users.find_one_and_update(
+        {"username": username}, update,
+        projection=_VERSION_PROJECTION, return_document=ReturnDocument.AFTER
+    )
+    if doc:
+        return _remember_version(doc)["version"]
+    _token_versions.pop(username, None)
+    return None
+
+async def forget_user(username: str):
+    """Drop a deleted user: from this worker now, from the others on their next sync (via a tombstone)."""
+    await db.user_tombstones.insert_one({"username": username, "deleted_at": datetime.utcnow()})
+    _token_versions.pop(username, None)
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# bcrypt takes ~250 ms of CPU per call. Request handlers run it on this small dedicated pool so the
+# event loop keeps serving other requests; once MAX_PENDING_PASSWORD_OPS calls are waiting or
+# running, further logins are turned away with a 503 instead of queueing without bound.
+PASSWORD_HASH_WORKERS = 2
+MAX_PENDING_PASSWORD_OPS = 16
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_password_metrics = {
+    "pending": 0,
+    "max_pending": 0,
+    "completed": 0,
+    "rejected": 0,
+    "wait_ms_total": 0.0,
+    "hash_ms_total": 0.0,
+    "bcrypt_rounds": None,  # set by calibrate_password_hashing
+}
+
+def _timed(fn, args, submitted_at: float):
+    started_at = time.perf_counter()
+    result = fn(*args)
+    return result, started_at - submitted_at, time.perf_counter() - started_at
+
+async def _run_password_op(fn, *args):
+    if _password_metrics["pending"] >= MAX_PENDING_PASSWORD_OPS:
+        _password_metrics["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in attempts in progress. Please try again.",
+            headers={"Retry-After": "1"},
+        )
+    _password_metrics["pending"] += 1
+    _password_metrics["max_pending"] = max(_password_metrics["max_pending"], _password_metrics["pending"])
+    try:
+        loop = asyncio.get_running_loop()
+        result, waited, took = await loop.run_in_executor(
+            _password_executor, _timed, fn, args, time.perf_counter()
+        )
+    finally:
+        _password_metrics["pending"] -= 1
+    _password_metrics["completed"] += 1
+    _password_metrics["wait_ms_total"] += waited * 1000
+    _password_metrics["hash_ms_total"] += took * 1000
+    return result
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run_password_op(verify_password, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password, hashed_password) -> tuple:
+    """(valid, new_hash). new_hash is set when the stored hash's cost is outside the calibrated band."""
+    return await _run_password_op(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await _run_password_op(get_password_hash, password)
+
+# bcrypt cost calibration. The cost is picked so one verification takes about
+# settings.PASSWORD_HASH_TARGET_MS on this container, and hashes outside the accepted band around it
+# are rehashed on the next successful login. One calibration per target is published in the
+# counters collection and every worker uses it: a worker only measures when nothing is published
+# for the current target, or when an admin asks for a recalibration (POST
+# /admin/password-hashing/recalibrate). Workers re-read the published cost on each full
+# token-version sync, so they follow a recalibration within TOKEN_VERSION_FULL_SYNC_INTERVAL.
+MIN_BCRYPT_ROUNDS = 10
+MAX_BCRYPT_ROUNDS = 16
+CALIBRATION_REFERENCE_ROUNDS = 10
+# Stored hashes within this many rounds of the calibrated cost are kept, so a recalibration that
+# moves by one round because of measurement noise does not rehash every password
+BCRYPT_ROUNDS_TOLERANCE = 1
+CALIBRATION_ID = "password_hash_rounds"
+_calibration_task = None  # the running calibrate_password_hashing refresh, if any
+
+def _measure_bcrypt_rounds(target_ms: int) -> int:
+    reference = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=CALIBRATION_REFERENCE_ROUNDS)
+    samples = []
+    for _ in range(3):
+        started = time.perf_counter()
+        reference.hash("calibration")
+        samples.append((time.perf_counter() - started) * 1000)
+    # Each extra round doubles the cost
+    rounds = CALIBRATION_REFERENCE_ROUNDS + round(math.log2(target_ms / min(samples)))
+    return max(MIN_BCRYPT_ROUNDS, min(MAX_BCRYPT_ROUNDS, rounds))
+
+def _apply_bcrypt_rounds(rounds: int):
+    pwd_context.update(
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds - BCRYPT_ROUNDS_TOLERANCE,
+        bcrypt__max_rounds=rounds + BCRYPT_ROUNDS_TOLERANCE,
+    )
+
+async def calibrate_password_hashing(recalibrate: bool = False) -> Optional[int]:
+    """
+    Adopt the published bcrypt cost for the current target, measuring and publishing one first if
+    there is none (or recalibrate=True). Run at startup and again on every full token-version sync.
+    Returns the cost in use, None while none could be read (the passlib default applies until then).
+    """
+    target_ms = settings.PASSWORD_HASH_TARGET_MS
+    try:
+        published = await db.counters.find_one({"_id": CALIBRATION_ID})
+        if recalibrate or not published or published.get("target_ms") != target_ms:
+            loop = asyncio.get_running_loop()
+            rounds = await loop.run_in_executor(_password_executor, _measure_bcrypt_rounds, target_ms)
+            # Without recalibrate, a calibration for this target published meanwhile by another worker wins
+            query = {"_id": CALIBRATION_ID} if recalibrate else {"_id": CALIBRATION_ID, "target_ms": {"$ne": target_ms}}
+            try:
+                published = await db.counters.find_one_and_update(
+                    query,
+                    {"$set": {"rounds": rounds, "target_ms": target_ms, "calibrated_at": datetime.utcnow()}},
+                    upsert=True, return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                published = await db.counters.find_one({"_id": CALIBRATION_ID})
+    except Exception as e:
+        # Retried on the next full token-version sync
+        print(f"CRITICAL: Failed to load the bcrypt cost calibration: {e}")
+        return _password_metrics["bcrypt_rounds"]
+
+    rounds = published["rounds"]
+    if rounds != _password_metrics["bcrypt_rounds"]:
+        _apply_bcrypt_rounds(rounds)
+        _password_metrics["bcrypt_rounds"] = rounds
+    return rounds
+
+def refresh_password_hashing():
+    """Run calibrate_password_hashing in the background, unless it already is."""
+    global _calibration_task
+    if _calibration_task is None or _calibration_task.done():
+        _calibration_task = app_tasks.spawn(calibrate_password_hashing(), name="calibrate-password-hashing")
+
+def password_hash_metrics() -> dict:
+    completed = _password_metrics["completed"]
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_pending": MAX_PENDING_PASSWORD_OPS,
+        "pending": _password_metrics["pending"],
+        "queued": max(0, _password_metrics["pending"] - PASSWORD_HASH_WORKERS),
+        "peak_pending": _password_metrics["max_pending"],
+        "completed": completed,
+        "rejected": _password_metrics["rejected"],
+        "avg_wait_ms": round(_password_metrics["wait_ms_total"] / completed, 1) if completed else 0.0,
+        "bcrypt_rounds": _password_metrics["bcrypt_rounds"],
+        "avg_hash_ms": round(_password_metrics["hash_ms_total"] / completed, 1) if completed else 0.0,
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -28,6 +290,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def reissue_access_token(token: str, token_version: int) -> str:
+    """
+    A copy of an already validated token (same subject and expiry) at a new session version, so the
+    caller stays signed in after revoking their own sessions.
+    """
+    payload = jwt.get_unverified_claims(token)
+    expires_delta = datetime.utcfromtimestamp(payload["exp"]) - datetime.utcnow()
+    return create_access_token({"sub": payload["sub"], "ver": token_version}, expires_delta=expires_delta)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -42,12 +313,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     except JWTError:
         raise credentials_exception
     
-    # SECURITY FIX: Always check DB so disabled users cannot use existing tokens.
-    user_data = await db.users.find_one({"username": username})
-    if not user_data:
+    # SECURITY FIX: Tokens are checked against the user's current token_version so disabled users,
+    # changed roles and reset passwords cannot keep using existing tokens. Tokens from before
+    # versioning carry no "ver" and stay valid until the first bump.
+    token_version = payload.get("ver", 0)
+    version = await _get_token_version(username)
+    if version is None or token_version != version["version"]:
         raise credentials_exception
-    
-    user = User(**user_data)
+
+    user = await user_cache.get_or_load(
+        (username, token_version, version["updated_at"]), lambda: _load_user(username)
+    )
+    if user is None:
+        raise credentials_exception
+
     if user.disabled:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,133 @@
+"""
+Login storm benchmark: POST /token throughput and the latency of an unrelated endpoint (GET /)
+while concurrent logins run, with bcrypt on the auth thread pool versus inline on the event loop.
+
+Drives the app in-process over ASGI (one worker, like one gunicorn process) against a separate
+database seeded with a single user:
+    python bench_login.py
+    python bench_login.py --concurrency 32 --seconds 10
+    python bench_login.py --inline              # old behaviour: bcrypt on the event loop
+
+MONGODB_URL and SECRET_KEY come from .env / the environment like the app itself.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+# Must be set before database.py builds its client
+os.environ["DATABASE_NAME"] = os.environ.get("BENCH_DATABASE_NAME", "vellko_bench")
+os.makedirs("uploads", exist_ok=True)
+
+import httpx
+import auth
+import rate_limit
+from database import db, settings
+from main import app
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+BENCH_EMAIL = "bench-login@example.com"
+BENCH_PASSWORD = "bench-password"
+PROBE_INTERVAL = 0.01  # seconds between GET / probes
+
+
+async def seed():
+    await db.users.update_one(
+        {"username": "bench_login"},
+        {"$set": {
+            "username": "bench_login",
+            "email": BENCH_EMAIL,
+            "role": "USER",
+            "hashed_password": auth.get_password_hash(BENCH_PASSWORD),
+        }},
+        upsert=True
+    )
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event) -> list:
+    """
+    GET / on a fixed schedule. Latency is measured from the scheduled send time, so time the
+    event loop spent blocked before the probe could even start is counted.
+    """
+    latencies = []
+    scheduled = time.perf_counter()
+    while not stop.is_set():
+        await client.get("/")
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        scheduled += PROBE_INTERVAL
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+    return latencies
+
+
+async def login_loop(client: httpx.AsyncClient, stop: asyncio.Event, results: dict):
+    while not stop.is_set():
+        response = await client.post("/token", data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD})
+        results[response.status_code] = results.get(response.status_code, 0) + 1
+
+
+async def run(client: httpx.AsyncClient, concurrency: int, seconds: float) -> tuple:
+    stop = asyncio.Event()
+    results = {}
+    probe_task = asyncio.create_task(probe(client, stop))
+    logins = [asyncio.create_task(login_loop(client, stop, results)) for _ in range(concurrency)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    latencies = await probe_task
+    await asyncio.gather(*logins)
+    return latencies, results
+
+
+def report(label: str, latencies: list, results: dict, seconds: float):
+    ok = results.get(200, 0)
+    others = ", ".join(f"{code}: {n}" for code, n in sorted(results.items()) if code != 200)
+    print(f"  {label:<14} GET / p50 {statistics.median(latencies) if latencies else 0:7.1f} ms   "
+          f"p99 {percentile(latencies, 99):7.1f} ms   max {max(latencies, default=0):7.1f} ms   "
+          f"logins {ok / seconds:6.1f}/s" + (f"   ({others})" if others else ""))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--inline", action="store_true", help="run bcrypt on the event loop (pre-pool behaviour)")
+    args = parser.parse_args()
+
+    if settings.DATABASE_NAME == "vellko_affiliate":
+        sys.exit("Refusing to benchmark against the application database.")
+
+    if args.inline:
+        async def inline(fn, *fn_args):
+            return fn(*fn_args)
+        auth._run_password_op = inline
+
+    # One client hammering one account is exactly what the login limits reject
+    for limiter in rate_limit.LIMITERS:
+        limiter.enabled = False
+
+    await seed()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        mode = "inline bcrypt" if args.inline else f"pool of {auth.PASSWORD_HASH_WORKERS}"
+        print(f"{mode}, {args.concurrency} concurrent logins, {args.seconds:g}s per run:")
+        await client.get("/")  # warm-up
+        latencies, results = await run(client, 0, args.seconds)
+        report("idle", latencies, results, args.seconds)
+        latencies, results = await run(client, args.concurrency, args.seconds)
+        report("login storm", latencies, results, args.seconds)
+    if not args.inline:
+        print(f"  pool metrics   {auth.password_hash_metrics()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+"""
+Wire compression benchmark for the large list endpoints: GET /admin/signups (100 per page, with
+Q/A) and GET /admin/signups/export (NDJSON), with MONGO_COMPRESSORS unset versus each compressor.
+
+Each compressor runs in its own child process (the Motor client is configured at import), driving
+the app in-process over ASGI against a separate database seeded with the same synthetic signups as
+bench_signup_list.py. Reports request latency and the bytes mongod sent for the run (serverStatus
+network counters: physicalBytesOut is what went over the wire after compression):
+    python bench_mongo_compression.py
+    python bench_mongo_compression.py --signups 20000 --requests 30 --compressors zstd,zlib
+
+Needs a local mongod that allows the compressors (mongod's default is snappy,zstd,zlib). zstd and
+snappy need optional packages (pymongo[zstd], pymongo[snappy]); a compressor the driver cannot
+load is reported and skipped.
+MONGODB_URL and SECRET_KEY come from .env / the environment like the app itself.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+# Must be set before database.py builds its client
+os.environ["DATABASE_NAME"] = os.environ.get("BENCH_DATABASE_NAME", "vellko_bench")
+os.makedirs("uploads", exist_ok=True)
+
+COMPRESSORS = ["zstd", "snappy", "zlib"]
+ENDPOINTS = [
+    ("list page", "/admin/signups?limit=100&include_qa=true"),
+    ("export", "/admin/signups/export?format=ndjson"),
+]
+BENCH_USERNAME = "bench_compression"
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def network_counters(db) -> dict:
+    network = (await db.client.admin.command("serverStatus"))["network"]
+    return {"logical": network["bytesOut"], "physical": network.get("physicalBytesOut", network["bytesOut"])}
+
+
+async def run_child(args):
+    """One measurement with the compressors from the environment; prints a JSON result line."""
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        from database import db, settings
+    unavailable = [str(w.message) for w in caught if "compression" in str(w.message).lower()]
+    if unavailable:
+        print(json.dumps({"compressors": settings.MONGO_COMPRESSORS, "skipped": unavailable[0]}))
+        return
+
+    import httpx
+    import auth
+    from main import app
+    from bench_signup_list import seed
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    await seed(args.signups)
+    await db.users.update_one(
+        {"username": BENCH_USERNAME},
+        {"$set": {
+            "username": BENCH_USERNAME,
+            "email": "bench-compression@example.com",
+            "role": "ADMIN",
+            "hashed_password": "",
+            "token_version": 0,
+        }},
+        upsert=True
+    )
+    token = auth.create_access_token({"sub": BENCH_USERNAME, "ver": 0})
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        for label, path in ENDPOINTS:
+            response = await client.get(path)  # warm-up (and auth check)
+            response.raise_for_status()
+            before = await network_counters(db)
+            latencies, body_bytes = [], 0
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                body_bytes += len(response.content)
+            after = await network_counters(db)
+            results[label] = {
+                "p50": statistics.median(latencies),
+                "p99": percentile(latencies, 99),
+                "body": body_bytes / args.requests,
+                "logical": (after["logical"] - before["logical"]) / args.requests,
+                "physical": (after["physical"] - before["physical"]) / args.requests,
+            }
+    print(json.dumps({"compressors": settings.MONGO_COMPRESSORS or "none", "results": results}))
+
+
+def run_parent(args):
+    from database import settings
+    if settings.DATABASE_NAME == "vellko_affiliate":
+        sys.exit("Refusing to benchmark against the application database.")
+
+    variants = [""]
+    for name in args.compressors.split(","):
+        if name not in COMPRESSORS:
+            sys.exit(f"Unknown compressor '{name}' (choose from {', '.join(COMPRESSORS)}).")
+        variants.append(name)
+
+    print(f"{args.signups} signups, {args.requests} requests per endpoint, per request:")
+    for compressors in variants:
+        env = {**os.environ, "MONGO_COMPRESSORS": compressors}
+        child = subprocess.run(
+            [sys.executable, __file__, "--child", "--signups", str(args.signups), "--requests", str(args.requests)],
+            env=env, capture_output=True, text=True
+        )
+        if child.returncode != 0:
+            sys.exit(f"Run with compressors '{compressors or 'none'}' failed:\n{child.stderr}")
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        if "skipped" in result:
+            print(f"  {result['compressors']:<6} skipped: {result['skipped']}")
+            continue
+        for label, stats in result["results"].items():
+            ratio = stats["logical"] / stats["physical"] if stats["physical"] else 0
+            print(f"  {result['compressors']:<6} {label:<10} p50 {stats['p50']:8.1f} ms   p99 {stats['p99']:8.1f} ms   "
+                  f"from mongod {stats['physical'] / 1024:9.1f} KiB (x{ratio:4.1f})   "
+                  f"response {stats['body'] / 1024:9.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signups", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--compressors", default="zstd,snappy,zlib", help="compressors to compare with none")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(run_child(args))
+    else:
+        run_parent(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Bytes per page for GET /admin/signups: full SignupInDB documents versus the SignupSummary projection.
+
+Seeds synthetic signups with realistic embedded data (notes, documents, Q/A responses, raw API
+payloads) into a separate database and reports, per page, the BSON bytes read from Mongo, the JSON
+bytes of the response body and the time spent fetching + validating:
+    python bench_signup_list.py
+    python bench_signup_list.py --signups 5000 --limit 100
+
+MONGODB_URL and SECRET_KEY come from .env / the environment like the app itself.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Must be set before database.py builds its client
+os.environ["DATABASE_NAME"] = os.environ.get("BENCH_DATABASE_NAME", "vellko_bench")
+
+import bson
+from database import db, settings
+from models import SignupInDB, SignupSummary, SignupStatus
+from routers.admin import SIGNUP_SUMMARY_PROJECTION, SIGNUP_QA_PROJECTION
+
+
+def _signup(rng: random.Random, i: int) -> dict:
+    now = datetime.utcnow()
+    qa = [
+        {"question_text": f"Question {q} about traffic sources?", "answer": "Lorem ipsum dolor sit amet. " * rng.randint(2, 12),
+         "required": True, "files": [{"tag": "proof", "path": f"uploads/{i}_{q}.pdf"}]}
+        for q in range(rng.randint(0, 6))
+    ]
+    return {
+        "companyInfo": {
+            "companyName": f"Company {i}", "address": f"{i} Main Street", "address2": "Suite 100",
+            "city": "Springfield", "state": "IL", "zip": "62701", "country": "United States",
+            "corporateWebsite": f"https://company{i}.example.com", "referral": "Referrer 1", "referral_id": ""
+        },
+        "marketingInfo": {
+            "paymentModel": "CPA", "primaryCategory": "Finance", "secondaryCategory": "Insurance",
+            "comments": "Marketing comments " * 20, "applicationType": rng.choice(["Web Traffic", "Call Traffic", "Both"])
+        },
+        "accountInfo": {
+            "firstName": "Jane", "lastName": f"Doe{i}", "title": "CEO", "workPhone": "555-0100",
+            "cellPhone": "555-0101", "email": f"user{i}@example.com", "timezone": "EST", "imService": "Skype", "imHandle": f"jane{i}"
+        },
+        "paymentInfo": {
+            "payTo": "Company", "currency": "USD", "taxClass": "Corporation", "ssnTaxId": "12-3456789"
+        },
+        "agreed": True,
+        "application_number": f"VK-{i}",
+        "status": rng.choice(list(SignupStatus)),
+        "created_at": now - timedelta(minutes=i),
+        "tags": rng.sample(["Hot", "Follow Up", "VIP", "Spam"], rng.randint(0, 2)),
+        "cake_response": "<xml>" + "x" * rng.randint(500, 4000) + "</xml>",
+        "ringba_response": "{" + "\"k\": \"v\", " * rng.randint(50, 400) + "}",
+        "cake_qa_responses": qa,
+        "ringba_qa_responses": qa[:2],
+        "notes": [
+            {"id": f"{i}-{n}", "content": "Internal note text " * rng.randint(2, 30), "author": "admin", "created_at": now}
+            for n in range(rng.randint(0, 15))
+        ],
+        "documents": [
+            {"filename": f"doc{d}.pdf", "path": f"uploads/{i}/doc{d}.pdf", "uploaded_by": "admin", "uploaded_at": now}
+            for d in range(rng.randint(0, 5))
+        ],
+    }
+
+
+async def seed(total: int):
+    if await db.signups.estimated_document_count() == total:
+        print(f"Reusing {total} synthetic signups in '{settings.DATABASE_NAME}'.")
+        return
+    await db.signups.drop()
+    rng = random.Random(7)
+    await db.signups.insert_many([_signup(rng, i) for i in range(total)])
+    print(f"Seeded {total} synthetic signups into '{settings.DATABASE_NAME}'.")
+
+
+async def measure(label: str, projection, model, limit: int, pages: int):
+    bson_bytes, json_bytes, durations = [], [], []
+    for page in range(pages):
+        started = time.perf_counter()
+        cursor = db.signups.find({}, projection).sort([("created_at", -1), ("_id", -1)]).skip(page * limit).limit(limit)
+        docs = await cursor.to_list(length=limit)
+        items = [model(**doc) for doc in docs]
+        body = "[" + ",".join(item.model_dump_json(by_alias=True) for item in items) + "]"
+        durations.append((time.perf_counter() - started) * 1000)
+        bson_bytes.append(sum(len(bson.encode(doc)) for doc in docs))
+        json_bytes.append(len(body.encode()))
+    print(f"  {label:<18} BSON {statistics.mean(bson_bytes) / 1024:8.1f} KiB/page   "
+          f"JSON {statistics.mean(json_bytes) / 1024:8.1f} KiB/page   median {statistics.median(durations):7.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signups", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    args = parser.parse_args()
+
+    if settings.DATABASE_NAME == "vellko_affiliate":
+        sys.exit("Refusing to benchmark against the application database.")
+
+    await seed(args.signups)
+    print(f"\nPage size {args.limit}, averaged over {args.pages} pages:")
+    await measure("full SignupInDB", None, SignupInDB, args.limit, args.pages)
+    await measure("summary", SIGNUP_SUMMARY_PROJECTION, SignupSummary, args.limit, args.pages)
+    await measure("summary + Q/A", {**SIGNUP_SUMMARY_PROJECTION, **SIGNUP_QA_PROJECTION}, SignupSummary, args.limit, args.pages)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
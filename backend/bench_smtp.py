@@ -0,0 +1,138 @@
+"""
+SMTP transport benchmark: the thread transport (smtplib sessions from smtp_pool, driven through
+run_in_executor like email_utils.deliver_email) versus the asyncio transport (smtp_async), sending
+the same messages to a local SMTP stand-in (smtp_sink, started in-process on a free port).
+
+Reports throughput, per-message send latency, and how late a 10 ms timer on the event loop fires
+while the sends run. Both pools keep smtp_pool.MAX_CONNECTIONS sessions, so the comparison is the
+transport, not the session count:
+    python bench_smtp.py
+    python bench_smtp.py --messages 5000 --concurrency 50 --body-kb 50
+    python bench_smtp.py --host smtp.example.com --port 587 --username u --password p
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from smtp_async import AsyncSMTPConnectionPool
+from smtp_pool import SMTPConnectionPool
+from smtp_sink import SMTPSink
+
+PROBE_INTERVAL = 0.01  # seconds between event loop lag probes
+FROM_EMAIL = "bench@example.com"
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def build_message(index: int, body_kb: int) -> str:
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = f"Benchmark message {index}"
+    msg["From"] = FROM_EMAIL
+    msg["To"] = f"rcpt{index}@example.com"
+    msg.attach(MIMEText("<p>" + "x" * (body_kb * 1024) + "</p>", "html"))
+    return msg.as_string()
+
+
+async def probe(stop: asyncio.Event) -> list:
+    """How late each PROBE_INTERVAL timer fires, i.e. how long the loop was busy elsewhere."""
+    lags = []
+    while not stop.is_set():
+        scheduled = time.perf_counter() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append((time.perf_counter() - scheduled) * 1000)
+    return lags
+
+
+async def run(send, messages: list, concurrency: int) -> tuple:
+    queue = asyncio.Queue()
+    for index, message in enumerate(messages):
+        queue.put_nowait((index, message))
+    latencies, errors = [], []
+
+    async def sender():
+        while not queue.empty():
+            index, message = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                await send(f"rcpt{index}@example.com", message)
+            except Exception as e:
+                errors.append(e)
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*[sender() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return latencies, errors, elapsed, await probe_task
+
+
+def report(label: str, results: tuple, metrics: dict):
+    latencies, errors, elapsed, lags = results
+    print(f"  {label:<8} {len(latencies) / elapsed:8.1f} msg/s   "
+          f"send p50 {statistics.median(latencies) if latencies else 0:7.1f} ms   "
+          f"p99 {percentile(latencies, 99):7.1f} ms   "
+          f"loop lag p99 {percentile(lags, 99):6.1f} ms   "
+          f"threads {threading.active_count():3d}   "
+          f"sessions opened {metrics['opened']}" + (f"   errors {len(errors)} ({errors[0]!r})" if errors else ""))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10, help="concurrent sends (outbox BATCH_SIZE is 10)")
+    parser.add_argument("--body-kb", type=int, default=20)
+    parser.add_argument("--host", help="benchmark a real server instead of the in-process sink")
+    parser.add_argument("--port", type=int, default=587)
+    parser.add_argument("--username", default="bench")
+    parser.add_argument("--password", default="bench")
+    args = parser.parse_args()
+
+    sink = None
+    if args.host:
+        host, port = args.host, args.port
+    else:
+        sink = SMTPSink(("127.0.0.1", 0), quiet=True)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        host, port = sink.server_address
+    config = {"host": host, "port": port, "username": args.username, "password": args.password}
+    messages = [build_message(index, args.body_kb) for index in range(args.messages)]
+
+    thread_pool = SMTPConnectionPool()
+    async_pool = AsyncSMTPConnectionPool()
+    loop = asyncio.get_running_loop()
+
+    async def send_thread(to_email: str, message: str):
+        await loop.run_in_executor(None, thread_pool.send, config, FROM_EMAIL, to_email, message)
+
+    async def send_async(to_email: str, message: str):
+        await async_pool.send(config, FROM_EMAIL, to_email, message)
+
+    print(f"{args.messages} messages of {args.body_kb} KB to {host}:{port}, {args.concurrency} concurrent sends:")
+    # Warm-up: open the sessions (and executor threads) before timing
+    await asyncio.gather(*[send_thread("warmup@example.com", messages[0]) for _ in range(args.concurrency)])
+    await asyncio.gather(*[send_async("warmup@example.com", messages[0]) for _ in range(args.concurrency)])
+
+    report("thread", await run(send_thread, messages, args.concurrency), thread_pool.metrics())
+    report("asyncio", await run(send_async, messages, args.concurrency), async_pool.metrics())
+
+    thread_pool.close_all()
+    await async_pool.close_all()
+    if sink:
+        sink.shutdown()
+        sink.server_close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
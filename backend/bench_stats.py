@@ -0,0 +1,187 @@
+"""
+Benchmark for GET /admin/stats: the legacy sequential count_documents implementation
+versus the single-pass $facet engine in stats_utils.
+
+Seeds a synthetic data set into a separate database (never the live one) and times both:
+    python bench_stats.py                       # 1,000,000 signups in 'vellko_bench'
+    python bench_stats.py --signups 200000 --runs 3
+    python bench_stats.py --reseed              # drop and regenerate the synthetic data
+
+MONGODB_URL and SECRET_KEY come from .env / the environment like the app itself.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Must be set before database.py builds its client
+os.environ["DATABASE_NAME"] = os.environ.get("BENCH_DATABASE_NAME", "vellko_bench")
+
+from bson import ObjectId
+from database import db, settings
+from models import SignupStatus
+from stats_utils import compute_stats, WEB_TRAFFIC_TYPES
+
+APP_TYPES = ["Web Traffic", "Call Traffic", "Both"]
+API_STATUSES = [None, None, None, "APPROVED", "REJECTED", "FAILED"]
+STATUSES = [SignupStatus.PENDING, SignupStatus.APPROVED, SignupStatus.REJECTED, SignupStatus.REQUESTED_FOR_APPROVAL]
+BATCH_SIZE = 10000
+
+
+async def seed(total: int, reseed: bool):
+    existing = await db.signups.estimated_document_count()
+    if existing == total and not reseed:
+        print(f"Reusing {existing} synthetic signups in '{settings.DATABASE_NAME}'.")
+        return
+
+    print(f"Seeding {total} synthetic signups into '{settings.DATABASE_NAME}'...")
+    await db.signups.drop()
+    await db.users.drop()
+
+    referrers = [{"_id": ObjectId(), "username": f"ref{i}", "full_name": f"Referrer {i}"} for i in range(50)]
+    await db.users.insert_many(referrers)
+
+    rng = random.Random(42)
+    start = datetime.utcnow() - timedelta(days=730)
+    inserted = 0
+    while inserted < total:
+        batch = []
+        for i in range(min(BATCH_SIZE, total - inserted)):
+            referrer = rng.choice(referrers + [None])
+            batch.append({
+                "companyInfo": {
+                    "companyName": f"Company {inserted + i}",
+                    "referral": referrer["full_name"] if referrer else "",
+                    "referral_id": referrer["_id"] if referrer else None
+                },
+                "marketingInfo": {"applicationType": rng.choice(APP_TYPES)},
+                "accountInfo": {"email": f"user{inserted + i}@example.com"},
+                "status": rng.choice(STATUSES),
+                "cake_api_status": rng.choice(API_STATUSES),
+                "ringba_api_status": rng.choice(API_STATUSES),
+                "created_at": start + timedelta(seconds=rng.randint(0, 730 * 86400))
+            })
+        await db.signups.insert_many(batch, ordered=False)
+        inserted += len(batch)
+        print(f"  {inserted}/{total}", end="\r")
+    print()
+
+
+async def legacy_stats(query: dict) -> dict:
+    """The pre-$facet implementation of get_stats, kept verbatim in behaviour for comparison."""
+    total = await db.signups.count_documents(query)
+
+    async def count_status(status_list):
+        status_query = query.copy()
+        status_query["status"] = {"$in": status_list}
+        return await db.signups.count_documents(status_query)
+
+    pending = await count_status([SignupStatus.PENDING, SignupStatus.REQUESTED_FOR_APPROVAL])
+    approved = await count_status([SignupStatus.APPROVED])
+    rejected = await count_status([SignupStatus.REJECTED])
+
+    async def get_granular_stats(api_status_field: str, app_type: str):
+        base_query = query.copy()
+        base_query["$or"] = [
+            {"marketingInfo.applicationType": app_type},
+            {"marketingInfo.applicationType": "Both"}
+        ]
+        approved_count = await db.signups.count_documents({"$and": [base_query, {"$or": [
+            {api_status_field: "APPROVED"},
+            {"marketingInfo.applicationType": app_type, "status": SignupStatus.APPROVED, api_status_field: None}
+        ]}]})
+        rejected_count = await db.signups.count_documents({"$and": [base_query, {"$or": [
+            {api_status_field: "REJECTED"},
+            {"marketingInfo.applicationType": app_type, "status": SignupStatus.REJECTED, api_status_field: None}
+        ]}]})
+        pending_count = await db.signups.count_documents({"$and": [base_query, {"$or": [
+            {api_status_field: "FAILED"},
+            {"marketingInfo.applicationType": "Both", api_status_field: None},
+            {"marketingInfo.applicationType": app_type, "status": SignupStatus.PENDING},
+            {"marketingInfo.applicationType": app_type, "status": SignupStatus.REQUESTED_FOR_APPROVAL}
+        ]}]})
+        total_relevant = await db.signups.count_documents(base_query)
+        return {"total": total_relevant, "approved": approved_count, "rejected": rejected_count, "pending": pending_count}
+
+    cake_stats = await get_granular_stats("cake_api_status", "Web Traffic")
+    ringba_stats = await get_granular_stats("ringba_api_status", "Call Traffic")
+
+    async def get_top_referrers(match_filter: dict):
+        pipeline = [
+            {"$match": match_filter},
+            {"$group": {"_id": "$companyInfo.referral_id", "name": {"$first": "$companyInfo.referral"}, "count": {"$sum": 1}}},
+            {"$match": {"_id": {"$ne": ""}}},
+            {"$addFields": {"convertedId": {"$cond": {
+                "if": {"$and": [{"$ne": ["$_id", None]}, {"$ne": ["$_id", ""]}]},
+                "then": {"$toObjectId": "$_id"},
+                "else": None
+            }}}},
+            {"$lookup": {"from": "users", "localField": "convertedId", "foreignField": "_id", "as": "user_info"}},
+            {"$project": {"name": {"$cond": {
+                "if": {"$gt": [{"$size": "$user_info"}, 0]},
+                "then": {"$arrayElemAt": ["$user_info.full_name", 0]},
+                "else": "$name"
+            }}, "count": 1}},
+            {"$sort": {"count": -1}},
+            {"$limit": 5}
+        ]
+        results = await db.signups.aggregate(pipeline).to_list(length=5)
+        return [{"name": item.get("name") or "Unknown", "count": item["count"]} for item in results]
+
+    top_referrers = await get_top_referrers(query)
+    cake_query = query.copy()
+    cake_query["marketingInfo.applicationType"] = {"$in": ["Web Traffic", "Both"]}
+    top_cake = await get_top_referrers(cake_query)
+    ringba_query = query.copy()
+    ringba_query["marketingInfo.applicationType"] = {"$in": ["Call Traffic", "Both"]}
+    top_ringba = await get_top_referrers(ringba_query)
+
+    return {
+        "total": total, "pending": pending, "approved": approved, "rejected": rejected,
+        "cake_stats": cake_stats, "ringba_stats": ringba_stats,
+        "top_referrers": top_referrers, "top_cake_referrers": top_cake, "top_ringba_referrers": top_ringba
+    }
+
+
+async def timed(label: str, fn, query: dict, runs: int):
+    durations = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = await fn(query)
+        durations.append((time.perf_counter() - started) * 1000)
+    print(f"  {label:<8} min {min(durations):9.1f} ms   median {statistics.median(durations):9.1f} ms")
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signups", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--reseed", action="store_true")
+    args = parser.parse_args()
+
+    if settings.DATABASE_NAME == "vellko_affiliate":
+        sys.exit("Refusing to benchmark against the application database.")
+
+    await seed(args.signups, args.reseed)
+
+    scopes = {
+        "super admin (unscoped)": {},
+        "web traffic admin": {"marketingInfo.applicationType": {"$in": WEB_TRAFFIC_TYPES}},
+    }
+    for name, query in scopes.items():
+        print(f"\nScope: {name}")
+        legacy = await timed("legacy", legacy_stats, query, args.runs)
+        facet = await timed("$facet", compute_stats, query, args.runs)
+        keys = ["total", "pending", "approved", "rejected", "cake_stats", "ringba_stats"]
+        mismatched = [k for k in keys if legacy[k] != facet[k]]
+        print(f"  counters match: {'yes' if not mismatched else 'NO -> ' + ', '.join(mismatched)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
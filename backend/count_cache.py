@@ -0,0 +1,57 @@
+"""
+Cached totals for paginated list endpoints.
+
+Turning a page re-runs the same filter, so exact counts are cached per (collection, normalized
+filter) for a short TTL and dropped whenever this process writes to the collection. Writes made by
+other workers are only picked up when the entry expires, so a cached total is reported as
+approximate. Unfiltered lists use the collection metadata count (estimated_document_count)
+instead of counting at all.
+"""
+import hashlib
+import json
+from async_cache import AsyncTTLCache
+from database import db
+
+COUNT_CACHE_TTL = 30  # seconds
+MAX_ENTRIES_PER_COLLECTION = 500
+
+_count_caches = {}  # collection name -> AsyncTTLCache of filter hash -> count
+
+
+def _query_hash(query: dict) -> str:
+    normalized = json.dumps(query, sort_keys=True, default=str)
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def _cache_for(collection_name: str) -> AsyncTTLCache:
+    cache = _count_caches.get(collection_name)
+    if cache is None:
+        cache = AsyncTTLCache(
+            f"counts:{collection_name}", ttl=COUNT_CACHE_TTL, max_entries=MAX_ENTRIES_PER_COLLECTION
+        )
+        _count_caches[collection_name] = cache
+    return cache
+
+
+async def count_with_cache(collection_name: str, query: dict) -> tuple:
+    """Return (total, exact) for a list filter."""
+    if not query:
+        return await db[collection_name].estimated_document_count(), False
+
+    counted = False
+
+    async def count():
+        nonlocal counted
+        counted = True
+        return await db[collection_name].count_documents(query)
+
+    # Only the request that ran the count reports it as exact
+    total = await _cache_for(collection_name).get_or_load(_query_hash(query), count)
+    return total, counted
+
+
+def invalidate_counts(collection_name: str):
+    """Forget every cached total for a collection. Call after writes to it."""
+    cache = _count_caches.get(collection_name)
+    if cache is not None:
+        cache.clear()
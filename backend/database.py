@@ -1,3 +1,11 @@
+"""
+Settings, the shared Mongo and httpx clients, and the active API connection lookups.
+
+The clients are created here, at import, because routers and helpers import `db` and `http_client`
+by name. Neither connects when it is created: Motor opens its pool on the first operation (the
+startup ping in main.lifespan) and httpx opens connections per request. main.lifespan only closes
+them on shutdown.
+"""
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic_settings import BaseSettings
 from typing import Optional
@@ -5,13 +13,31 @@ from typing import Optional
 class Settings(BaseSettings):
     MONGODB_URL: str = "mongodb://127.0.0.1:27017"
     DATABASE_NAME: str = "vellko_affiliate"
+    # Motor connection pool, per worker process: gunicorn runs 4 workers, so the server sees up to
+    # 4 x maxPoolSize connections. Unset values keep the MONGODB_URL options / driver defaults
+    # (100 connections, wait forever for one, 30s server selection). Checkout waits are reported
+    # in /admin/metrics (mongo_pool).
+    MONGO_MAX_POOL_SIZE: Optional[int] = None
+    MONGO_MIN_POOL_SIZE: Optional[int] = None
+    MONGO_MAX_IDLE_TIME_MS: Optional[int] = None
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = None
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: Optional[int] = None
+    # Wire compression, in order of preference, e.g. "zstd,snappy,zlib". zlib is built in; zstd and
+    # snappy need pymongo[zstd] / pymongo[snappy] (the driver skips them with a warning if missing).
+    # The server must allow the same compressor (net.compression.compressors).
+    MONGO_COMPRESSORS: str = ""
     SECRET_KEY: str # Required, no default for security in production
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Target time for one password verification; the bcrypt cost is calibrated to it at startup
+    PASSWORD_HASH_TARGET_MS: int = 250
     
     # SECURITY: Separate encryption key for DB secrets (SMTP passwords, etc.).
     # Set this in .env to a long random string. Defaults to SECRET_KEY if not set (backward compat).
     DATA_ENCRYPTION_KEY: str = ""
+    # Key rotation: comma-separated retired DATA_ENCRYPTION_KEYs, still accepted for decryption
+    # until reencrypt_secrets.py has moved every stored secret onto the current key.
+    DATA_ENCRYPTION_KEY_PREVIOUS: str = ""
     
     # Cake Marketing
     CAKE_API_KEY: str = ""
@@ -27,6 +53,7 @@ class Settings(BaseSettings):
     SMTP_USER: str = ""
     SMTP_PASSWORD: str = ""
     EMAILS_FROM_EMAIL: str = ""
+    SMTP_TRANSPORT: str = "thread"  # "thread" (smtplib in executor threads) or "asyncio"
     
     # Frontend URL for links (Public)
     FRONTEND_URL: str = "http://localhost:3000"
@@ -41,55 +68,53 @@ class Settings(BaseSettings):
         # Determine extra handling if .env has extra/missing (default is ignore extras)
 
 import httpx
-from datetime import datetime, timedelta
+from async_cache import AsyncTTLCache
+from models import APIConnectionType
+from mongo_pool_metrics import pool_listener
 
 settings = Settings()
 
-client = AsyncIOMotorClient(settings.MONGODB_URL)
+def mongo_client_options() -> dict:
+    options = {"event_listeners": [pool_listener]}
+    configured = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "compressors": settings.MONGO_COMPRESSORS or None,
+    }
+    # Keyword options override the URL's, so only pass the ones that were set
+    options.update({name: value for name, value in configured.items() if value is not None})
+    return options
+
+# Created at import, closed by main.lifespan (see the module docstring)
+client = AsyncIOMotorClient(settings.MONGODB_URL, **mongo_client_options())
 db = client[settings.DATABASE_NAME]
 
 # Connection Pooling
 http_client = httpx.AsyncClient(timeout=30.0)
 
-# Local caching for connections to avoid DB lookups on every request
-_connection_cache = {}
+# Local caching for connections to avoid DB lookups on every request: the active connection of each
+# APIConnectionType, with its secret already decrypted, keyed by the type
 CACHE_TTL = 300 # 5 minutes
+connection_cache = AsyncTTLCache("api_connections", ttl=CACHE_TTL, max_entries=16)
+
+def invalidate_connection_cache(api_type: Optional[APIConnectionType] = None):
+    if api_type is None:
+        connection_cache.clear()
+    else:
+        connection_cache.invalidate(APIConnectionType(api_type))
 
 async def get_database():
     return db
 
 def decrypt_if_needed(val: str) -> str:
-    from encryption_utils import decrypt_field
-    return decrypt_field(val)
+    from encryption_utils import decrypt_secret
+    return decrypt_secret(val)
 
-async def get_active_cake_connection():
-    now = datetime.now()
-    if "cake" in _connection_cache:
-        expiry = _connection_cache["cake"]["expiry"]
-        if now < expiry:
-            return _connection_cache["cake"]["data"]
-
-    connection = await db.api_connections.find_one({"type": "CAKE", "is_active": True})
-    if connection:
-        details = connection.get("cake_details", {})
-        # Ensure new keys are present even for old connections
-        if "api_verticals_url" not in details:
-            details["api_verticals_url"] = settings.CAKE_API_VERTICALS_URL
-        if "api_offers_url" not in details:
-            details["api_offers_url"] = settings.CAKE_API_OFFERS_URL
-        if "api_media_types_url" not in details:
-            details["api_media_types_url"] = settings.CAKE_API_MEDIA_TYPES_URL
-            
-        if details.get("api_key"):
-            details["api_key"] = decrypt_if_needed(details["api_key"])
-        
-        _connection_cache["cake"] = {
-            "data": details,
-            "expiry": now + timedelta(seconds=CACHE_TTL)
-        }
-        return details
-        
-    default_details = {
+def _cake_defaults() -> dict:
+    return {
         "api_key": settings.CAKE_API_KEY,
         "api_url": settings.CAKE_API_URL,
         "api_v2_url": settings.CAKE_API_V2_URL,
@@ -97,21 +122,48 @@ async def get_active_cake_connection():
         "api_media_types_url": settings.CAKE_API_MEDIA_TYPES_URL,
         "api_verticals_url": settings.CAKE_API_VERTICALS_URL
     }
-    _connection_cache["cake"] = {
-        "data": default_details,
-        "expiry": now + timedelta(seconds=CACHE_TTL)
-    }
-    return default_details
 
-async def get_active_ringba_connection():
-    connection = await db.api_connections.find_one({"type": "RINGBA", "is_active": True})
-    if connection:
-        details = connection.get("ringba_details", {})
-        if details.get("api_token"):
-            details["api_token"] = decrypt_if_needed(details["api_token"])
-        return details
+def _ringba_defaults() -> dict:
     return {
         "api_token": settings.RINGBA_API_TOKEN,
         "api_url": settings.RINGBA_API_URL,
         "account_id": settings.RINGBA_ACCOUNT_ID
     }
+
+# How each connection type is stored in api_connections:
+# type -> (details field, encrypted secret field, .env defaults, keys filled from the defaults for old connections)
+CONNECTION_TYPES = {
+    APIConnectionType.CAKE: (
+        "cake_details", "api_key", _cake_defaults,
+        ("api_verticals_url", "api_offers_url", "api_media_types_url")
+    ),
+    APIConnectionType.RINGBA: ("ringba_details", "api_token", _ringba_defaults, ()),
+}
+
+async def _load_connection(api_type: APIConnectionType) -> dict:
+    details_field, secret_field, defaults, backfill = CONNECTION_TYPES[api_type]
+    connection = await db.api_connections.find_one({"type": api_type.value, "is_active": True})
+    if not connection:
+        return defaults()
+
+    details = connection.get(details_field) or {}
+    # Ensure new keys are present even for old connections
+    missing = [key for key in backfill if key not in details]
+    if missing:
+        fallback = defaults()
+        for key in missing:
+            details[key] = fallback[key]
+    if details.get(secret_field):
+        details[secret_field] = decrypt_if_needed(details[secret_field])
+    return details
+
+async def get_active_connection(api_type: APIConnectionType) -> dict:
+    """Details of the active connection of this type (secret decrypted), or the .env defaults."""
+    api_type = APIConnectionType(api_type)
+    return await connection_cache.get_or_load(api_type, lambda: _load_connection(api_type))
+
+async def get_active_cake_connection():
+    return await get_active_connection(APIConnectionType.CAKE)
+
+async def get_active_ringba_connection():
+    return await get_active_connection(APIConnectionType.RINGBA)
@@ -0,0 +1,153 @@
+"""
+Declarative index manifest for the hot query shapes.
+
+main.py applies it on startup. It can also be run by hand to report missing / unused indexes:
+    python db_indexes.py            # report only
+    python db_indexes.py --apply    # create anything missing, then report
+"""
+import asyncio
+import logging
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from database import db
+from signup_counters import COUNTER_KEY_FIELDS
+from email_outbox import SENT_RETENTION
+from auth import USER_TOMBSTONE_RETENTION
+
+logger = logging.getLogger(__name__)
+
+INDEX_MANIFEST = {
+    "signups": [
+        IndexModel([("status", ASCENDING)], name="status"),
+        IndexModel([("marketingInfo.applicationType", ASCENDING), ("status", ASCENDING)], name="application_type_status"),
+        IndexModel([("companyInfo.referral_id", ASCENDING)], name="referral_id"),
+        # Referrer scoping still matches on the referral name for older data
+        IndexModel([("companyInfo.referral", ASCENDING)], name="referral_name"),
+        # List sorts with their _id tie-breaker (pagination_utils); also walked backwards for the opposite order
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="status_created_at_id"),
+        IndexModel([("companyInfo.companyName", ASCENDING), ("_id", ASCENDING)], name="company_name_id"),
+        # create_signup rejects a second application for the same email
+        IndexModel([("accountInfo.email", ASCENDING)], name="account_email_unique", unique=True),
+        # Prefix search (search_utils) and its exact-ID shortcuts
+        IndexModel([("search_tokens", ASCENDING)], name="search_tokens"),
+        IndexModel([("application_number", ASCENDING)], name="application_number"),
+        IndexModel([("cake_affiliate_id", ASCENDING)], name="cake_affiliate_id", sparse=True),
+        IndexModel([("ringba_affiliate_id", ASCENDING)], name="ringba_affiliate_id", sparse=True),
+        # approve_signup scans ^PPC_N\d+$ to pick the next Ringba publisher name
+        IndexModel([("ringba_assigned_name", ASCENDING)], name="ringba_assigned_name", sparse=True),
+    ],
+    "advertiser_offers": [
+        # Sync and CSV imports upsert on (advertiser_id, offer_id)
+        IndexModel([("advertiser_id", ASCENDING), ("offer_id", ASCENDING)], name="advertiser_offer_unique", unique=True),
+    ],
+    "shared_offers": [
+        IndexModel([("token", ASCENDING)], name="token_unique", unique=True),
+    ],
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        # Login is by email; users without one are allowed, so only string emails must be unique
+        IndexModel(
+            [("email", ASCENDING)],
+            name="email_unique",
+            unique=True,
+            partialFilterExpression={"email": {"$type": "string"}}
+        ),
+        # Incremental token-version sync (see auth._sync_token_versions)
+        IndexModel([("auth_updated_at", ASCENDING)], name="auth_updated_at", sparse=True),
+    ],
+    "user_tombstones": [
+        # Deleted users for the incremental token-version sync (see auth.forget_user)
+        IndexModel(
+            [("deleted_at", ASCENDING)],
+            name="deleted_at_ttl",
+            expireAfterSeconds=int(USER_TOMBSTONE_RETENTION.total_seconds())
+        ),
+    ],
+    "email_outbox": [
+        # Claim order for the outbox workers (see email_outbox._claim_job)
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        IndexModel([("sent_at", ASCENDING)], name="sent_at_ttl", expireAfterSeconds=int(SENT_RETENTION.total_seconds())),
+    ],
+    "user_activities": [
+        IndexModel([("timestamp", DESCENDING)], name="timestamp"),
+    ],
+    "call_offers": [
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+    ],
+    "referrer_leaderboard": [
+        IndexModel([("board", ASCENDING), ("referral_id", ASCENDING)], name="board_referrer_unique", unique=True),
+        # get_stats reads the top N of a board
+        IndexModel([("board", ASCENDING), ("count", DESCENDING)], name="board_count"),
+    ],
+    "signup_counters": [
+        IndexModel([(field, ASCENDING) for field in COUNTER_KEY_FIELDS], name="counter_key_unique", unique=True),
+    ],
+}
+
+
+async def apply_collection_indexes(collection_name: str):
+    """Create the manifest indexes for one collection. A failing index is logged and skipped, never fatal."""
+    models = INDEX_MANIFEST.get(collection_name, [])
+    if not models:
+        return
+    collection = db[collection_name]
+    try:
+        await collection.create_indexes(models)
+        return
+    except OperationFailure:
+        pass
+
+    # Retry one by one so a single conflicting index (e.g. duplicates under a unique key)
+    # does not keep the rest from being built
+    for model in models:
+        try:
+            await collection.create_indexes([model])
+        except OperationFailure as e:
+            logger.error(f"Could not create index {collection_name}.{model.document['name']}: {e}")
+
+
+async def apply_indexes():
+    for collection_name in INDEX_MANIFEST:
+        await apply_collection_indexes(collection_name)
+    logger.info("Index manifest applied")
+
+
+async def report_indexes() -> dict:
+    """
+    Compare the live indexes with the manifest.
+    missing: declared but not present. unused: present (and not _id) with zero recorded accesses
+    since the server last restarted, per $indexStats. unmanaged: present but not in the manifest.
+    """
+    report = {"missing": [], "unused": [], "unmanaged": []}
+    for collection_name, models in INDEX_MANIFEST.items():
+        collection = db[collection_name]
+        declared = {model.document["name"] for model in models}
+        existing = {idx["name"] async for idx in collection.list_indexes()}
+
+        report["missing"].extend(f"{collection_name}.{name}" for name in sorted(declared - existing))
+        report["unmanaged"].extend(f"{collection_name}.{name}" for name in sorted(existing - declared - {"_id_"}))
+
+        async for stat in collection.aggregate([{"$indexStats": {}}]):
+            if stat["name"] != "_id_" and stat.get("accesses", {}).get("ops", 0) == 0:
+                report["unused"].append(f"{collection_name}.{stat['name']}")
+    return report
+
+
+async def main(apply: bool):
+    if apply:
+        await apply_indexes()
+    report = await report_indexes()
+    for section, names in report.items():
+        print(f"{section.capitalize()} ({len(names)}):")
+        for name in names:
+            print(f"  {name}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Apply / report the MongoDB index manifest")
+    parser.add_argument("--apply", action="store_true", help="create missing indexes before reporting")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.apply))
@@ -0,0 +1,154 @@
+"""
+Durable outbound email queue.
+
+Routes render their message and insert it into email_outbox (email_utils.send_email), so their
+response time no longer includes the SMTP round trip and a worker restart cannot lose a message
+half-sent from a create_task. Every app worker runs one outbox worker loop (started in main.py):
+    - jobs are claimed atomically (find_one_and_update pending -> sending), so several app
+      workers can consume the same queue without double-sending
+    - up to BATCH_SIZE claimed jobs are delivered concurrently over the pooled SMTP sessions
+    - failures are retried with exponential backoff (RETRY_BASE_DELAY * 2^attempt, capped);
+      after MAX_ATTEMPTS the job is marked failed with its last error
+    - a job left in "sending" by a worker that died is reclaimed after CLAIM_TIMEOUT
+Bodies can hold credentials (invitations, Cake passwords), so they are stored encrypted and removed
+once the message is sent. Sent jobs expire after SENT_RETENTION via a TTL index.
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo import ReturnDocument
+from database import db
+from encryption_utils import encrypt_secret, decrypt_secret
+
+BATCH_SIZE = 10
+POLL_INTERVAL = 5  # seconds between polls when the queue is empty
+MAX_ATTEMPTS = 6
+RETRY_BASE_DELAY = 30  # seconds
+MAX_RETRY_DELAY = 3600  # seconds
+CLAIM_TIMEOUT = timedelta(minutes=5)
+SENT_RETENTION = timedelta(days=30)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_wakeup = None  # asyncio.Event, created by the worker loop so it belongs to the running loop
+_stopping = False
+_outbox_metrics = {"queued": 0, "sent": 0, "retried": 0, "failed": 0}
+
+
+async def enqueue_email(to_email: str, subject: str, html_content: str):
+    return (await enqueue_emails([to_email], subject, html_content))[0]
+
+
+async def enqueue_emails(to_emails: list, subject: str, html_content: str) -> list:
+    """
+    Queue one message for several recipients with a single insert. Each recipient gets its own job,
+    so delivery status and retries stay per recipient; the body is encrypted once and shared.
+    """
+    now = datetime.utcnow()
+    html = encrypt_secret(html_content)
+    result = await db.email_outbox.insert_many([
+        {
+            "to": to_email,
+            "subject": subject,
+            "html": html,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        for to_email in to_emails
+    ])
+    _outbox_metrics["queued"] += len(to_emails)
+    if _wakeup is not None:
+        _wakeup.set()
+    return result.inserted_ids
+
+
+async def _claim_job() -> Optional[dict]:
+    now = datetime.utcnow()
+    return await db.email_outbox.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "claimed_at": {"$lt": now - CLAIM_TIMEOUT}},
+        ]},
+        {"$set": {"status": "sending", "claimed_at": now, "claimed_by": WORKER_ID}, "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(MAX_RETRY_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1)))
+
+
+async def _deliver_job(job: dict):
+    from email_utils import deliver_email
+    try:
+        await deliver_email(job["to"], job["subject"], decrypt_secret(job["html"], strict=True))
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+        if job["attempts"] >= MAX_ATTEMPTS:
+            print(f"CRITICAL: Giving up on email to {job['to']} after {job['attempts']} attempts: {error}")
+            update = {"$set": {"status": "failed", "last_error": error, "failed_at": datetime.utcnow()}}
+            _outbox_metrics["failed"] += 1
+        else:
+            update = {"$set": {
+                "status": "pending",
+                "last_error": error,
+                "next_attempt_at": datetime.utcnow() + _retry_delay(job["attempts"]),
+            }}
+            _outbox_metrics["retried"] += 1
+    else:
+        update = {"$set": {"status": "sent", "sent_at": datetime.utcnow()}, "$unset": {"html": "", "last_error": ""}}
+        _outbox_metrics["sent"] += 1
+    await db.email_outbox.update_one({"_id": job["_id"], "claimed_by": WORKER_ID}, update)
+
+
+async def process_outbox_batch() -> int:
+    """Claim and deliver up to BATCH_SIZE due jobs. Returns how many were claimed."""
+    jobs = []
+    for _ in range(BATCH_SIZE):
+        job = await _claim_job()
+        if job is None:
+            break
+        jobs.append(job)
+    if jobs:
+        await asyncio.gather(*[_deliver_job(job) for job in jobs])
+    return len(jobs)
+
+
+async def run_outbox_worker():
+    """
+    Deliver queued emails until stop_outbox_worker() (or cancellation). Woken immediately by
+    enqueues from this process.
+    """
+    global _wakeup, _stopping
+    _wakeup = asyncio.Event()
+    _stopping = False
+    while not _stopping:
+        try:
+            claimed = await process_outbox_batch()
+        except Exception as e:
+            print(f"CRITICAL: Email outbox worker error: {e}")
+            claimed = 0
+        if claimed or _stopping:
+            continue
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def stop_outbox_worker():
+    """Let the worker finish the batch it is delivering and exit (graceful shutdown)."""
+    global _stopping
+    _stopping = True
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def outbox_metrics() -> dict:
+    return dict(_outbox_metrics)
@@ -1,4 +1,3 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from jinja2 import Environment, FileSystemLoader
@@ -6,8 +5,12 @@ import os
 import asyncio
 from database import settings, db
 from models import SMTPConfig
-from encryption_utils import decrypt_smtp_password
+from encryption_utils import decrypt_secret
 from email.utils import formataddr
+from smtp_pool import smtp_pool
+from smtp_async import async_smtp_pool
+from email_outbox import enqueue_email, enqueue_emails
+from async_cache import AsyncTTLCache
 
 # Setup Jinja2 environment for loading templates
 TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates", "email")
@@ -15,23 +18,28 @@ env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
 
 def _send_smtp_sync(config: dict, msg: MIMEMultipart, to_email: str):
     """
-    Synchronous SMTP sending logic to be run in a thread.
+    Synchronous SMTP sending logic to be run in a thread, on a pooled session (see smtp_pool).
+    Raises on failure.
     """
-    try:
-        with smtplib.SMTP(config["host"], config["port"]) as server:
-            server.starttls()
-            server.login(config["username"], config["password"])
-            server.sendmail(config["from_email"], to_email, msg.as_string())
-        return True
-    except Exception as e:
-        print(f"Failed to send email to {to_email} via {config['host']}: {str(e)}")
-        return False
+    smtp_pool.send(config, config["from_email"], to_email, msg.as_string())
+
+# Resolved active SMTP config (password decrypted), so a fan-out to many recipients does one lookup.
+# The settings router invalidates it on SMTP config writes; other workers pick changes up on expiry.
+# The SMTP pool keys its sessions on the resolved config, so a change also rotates the sessions.
+SMTP_CONFIG_CACHE_TTL = 300 # 5 minutes
+smtp_config_cache = AsyncTTLCache("smtp_config", ttl=SMTP_CONFIG_CACHE_TTL, max_entries=1)
+
+def invalidate_smtp_config_cache():
+    smtp_config_cache.clear()
 
 async def get_active_smtp_config():
     """
-    Fetches the active SMTP configuration from the database.
+    Fetches the active SMTP configuration from the database (cached, see smtp_config_cache).
     Falls back to environment variables if no active config is found.
     """
+    return await smtp_config_cache.get_or_load("active", _resolve_smtp_config)
+
+async def _resolve_smtp_config():
     config_data = await db.smtp_configs.find_one({"is_active": True})
     
     if config_data:
@@ -40,10 +48,11 @@ async def get_active_smtp_config():
             "port": config_data["port"],
             "username": config_data["username"],
             # SECURITY FIX: Decrypt password from DB before use (handles pre-migration plaintext gracefully).
-            "password": decrypt_smtp_password(config_data["password"]),
+            "password": decrypt_secret(config_data["password"]),
             "from_name": config_data.get("from_name"),
             "from_email": config_data["from_email"],
-            "reply_to_email": config_data.get("reply_to_email")
+            "reply_to_email": config_data.get("reply_to_email"),
+            "transport": config_data.get("transport", "thread")
         }
     
     # Fallback to Env
@@ -54,46 +63,74 @@ async def get_active_smtp_config():
             "username": settings.SMTP_USER,
             "password": settings.SMTP_PASSWORD,
             "from_email": settings.EMAILS_FROM_EMAIL,
-            "reply_to_email": None
+            "reply_to_email": None,
+            "transport": settings.SMTP_TRANSPORT
         }
         
     return None
 
 async def send_email(to_email: str, subject: str, html_content: str):
     """
-    Sends an email using the configured SMTP server (DB or Env).
+    Queues an email in the outbox (see email_outbox); a background worker delivers it.
+    Returns True once it is queued.
     """
-    config = await get_active_smtp_config()
-    if not config:
-        print("No SMTP configuration found.")
+    try:
+        await enqueue_email(to_email, subject, html_content)
+        return True
+    except Exception as e:
+        print(f"CRITICAL: Failed to queue email to {to_email}: {str(e)}")
         return False
 
+async def send_email_batch(to_emails: list[str], subject: str, html_content: str) -> dict:
+    """
+    Queues one already-rendered message for many recipients in a single outbox write. The outbox
+    workers deliver them concurrently over the pooled SMTP sessions. Returns {email: queued}.
+    """
+    # Drop blanks and duplicates, keeping order
+    recipients = list(dict.fromkeys(email for email in to_emails if email))
+    if not recipients:
+        return {}
     try:
-        # Create message container
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        
-        # Use from_name if available
-        if config.get("from_name"):
-            msg["From"] = formataddr((config["from_name"], config["from_email"]))
-        else:
-            msg["From"] = config["from_email"]
-            
-        msg["To"] = to_email
-        if config["reply_to_email"]:
-            msg["Reply-To"] = config["reply_to_email"]
-
-        # Attach HTML content
-        part = MIMEText(html_content, "html")
-        msg.attach(part)
-
-        # Run synchronous SMTP sending in a separate thread to avoid blocking main loop
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, _send_smtp_sync, config, msg, to_email)
-
+        await enqueue_emails(recipients, subject, html_content)
+        return {email: True for email in recipients}
     except Exception as e:
-        print(f"Failed to prepare email to {to_email}: {str(e)}")
-        return False
+        print(f"CRITICAL: Failed to queue email to {len(recipients)} recipients: {str(e)}")
+        return {email: False for email in recipients}
+
+async def deliver_email(to_email: str, subject: str, html_content: str):
+    """
+    Sends an email now using the configured SMTP server (DB or Env). Used by the outbox workers;
+    raises on failure so the outbox can record the error and retry.
+    """
+    config = await get_active_smtp_config()
+    if not config:
+        raise RuntimeError("No SMTP configuration found.")
+
+    # Create message container
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+
+    # Use from_name if available
+    if config.get("from_name"):
+        msg["From"] = formataddr((config["from_name"], config["from_email"]))
+    else:
+        msg["From"] = config["from_email"]
+
+    msg["To"] = to_email
+    if config["reply_to_email"]:
+        msg["Reply-To"] = config["reply_to_email"]
+
+    # Attach HTML content
+    part = MIMEText(html_content, "html")
+    msg.attach(part)
+
+    if config.get("transport") == "asyncio":
+        await async_smtp_pool.send(config, config["from_email"], to_email, msg.as_string())
+        return
+
+    # Run synchronous SMTP sending in a separate thread to avoid blocking main loop
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, _send_smtp_sync, config, msg, to_email)
 
 async def send_reset_password_email(to_email: str, token: str):
     """
@@ -176,13 +213,9 @@ async def send_signup_notification_email(to_emails: list[str], signup_data: dict
             link=link
         )
         
-        # Send to each recipient
-        success_count = 0
-        for email in to_emails:
-            if await send_email(to_email=email, subject=f"New Signup: {company_name}", html_content=html_content):
-                success_count += 1
-                
-        return success_count > 0
+        # Rendered once, queued for every recipient in one write
+        results = await send_email_batch(to_emails, subject=f"New Signup: {company_name}", html_content=html_content)
+        return any(results.values())
     except Exception as e:
         print(f"Error preparing signup notification email: {str(e)}")
         return False
@@ -250,13 +283,9 @@ async def send_approval_request_email(to_emails: list[str], signup_data: dict, s
             link=link
         )
 
-        # Send to each recipient
-        success_count = 0
-        for email in to_emails:
-            if await send_email(to_email=email, subject=f"Approval Request: {company_name}", html_content=html_content):
-                success_count += 1
-
-        return success_count > 0
+        # Rendered once, queued for every recipient in one write
+        results = await send_email_batch(to_emails, subject=f"Approval Request: {company_name}", html_content=html_content)
+        return any(results.values())
     except Exception as e:
         print(f"Error preparing approval request email: {str(e)}")
         return False
@@ -322,13 +351,9 @@ async def send_internal_note_notification_email(to_emails: list[str], signup_dat
             link=link
         )
         
-        # Send to each recipient
-        success_count = 0
-        for email in to_emails:
-            if await send_email(to_email=email, subject=f"New Internal Note: {company_name}", html_content=html_content):
-                success_count += 1
-                
-        return success_count > 0
+        # Rendered once, queued for every recipient in one write
+        results = await send_email_batch(to_emails, subject=f"New Internal Note: {company_name}", html_content=html_content)
+        return any(results.values())
     except Exception as e:
         print(f"Error preparing internal note notification email: {str(e)}")
         return False
@@ -1,59 +1,59 @@
 import base64
 import hashlib
-from cryptography.fernet import Fernet
+from functools import lru_cache
+from typing import Tuple
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from database import settings
 
-def get_fernet_key() -> bytes:
-    """
-    Derive a 32-byte b64-encoded key from the application's SECRET_KEY.
-    Used for API connection key encryption (backward compat).
-    """
-    secret = settings.SECRET_KEY.encode()
-    key = hashlib.sha256(secret).digest()
-    return base64.urlsafe_b64encode(key)
-
-def get_smtp_fernet_key() -> bytes:
-    """
-    Derive a Fernet key for SMTP password encryption.
-    Uses DATA_ENCRYPTION_KEY if set, falls back to SECRET_KEY for backward compat.
-    SECURITY: Keeping keys separate from JWT signing key is best practice.
-    """
-    key_source = settings.DATA_ENCRYPTION_KEY if settings.DATA_ENCRYPTION_KEY else settings.SECRET_KEY
+def _derive_key(key_source: str) -> bytes:
     key = hashlib.sha256(key_source.encode()).digest()
     return base64.urlsafe_b64encode(key)
 
-def encrypt_field(value: str) -> str:
-    """Encrypt a field using the primary key (for API keys)."""
-    if not value:
-        return ""
-    f = Fernet(get_fernet_key())
-    return f.encrypt(value.encode()).decode()
+def _keyring_sources() -> Tuple[str, ...]:
+    """Current data key first (it encrypts), then retired keys, then SECRET_KEY for legacy values."""
+    sources = [settings.DATA_ENCRYPTION_KEY or settings.SECRET_KEY]
+    sources += [key.strip() for key in settings.DATA_ENCRYPTION_KEY_PREVIOUS.split(",") if key.strip()]
+    sources.append(settings.SECRET_KEY)
+    return tuple(dict.fromkeys(sources))
 
-def decrypt_field(value: str) -> str:
-    """Decrypt a field encrypted with the primary key (for API keys)."""
-    if not value:
-        return ""
-    try:
-        f = Fernet(get_fernet_key())
-        return f.decrypt(value.encode()).decode()
-    except Exception as e:
-        print(f"Decryption error: {e}")
-        return value  # Fallback: may be plaintext (migration safety)
-
-def encrypt_smtp_password(value: str) -> str:
-    """Encrypt an SMTP password using the DATA_ENCRYPTION_KEY."""
+# Key derivation and Fernet construction used to run on every call; the ciphers are built once per
+# key set instead. Keyed on the key sources, so a settings change is never served a stale cipher.
+@lru_cache(maxsize=8)
+def _build_keyring(sources: Tuple[str, ...]) -> MultiFernet:
+    return MultiFernet([Fernet(_derive_key(source)) for source in sources])
+
+@lru_cache(maxsize=8)
+def _build_fernet(key_source: str) -> Fernet:
+    return Fernet(_derive_key(key_source))
+
+def get_data_keyring() -> MultiFernet:
+    """MultiFernet over every accepted key: encrypts with the current one, decrypts with any."""
+    return _build_keyring(_keyring_sources())
+
+def get_current_fernet() -> Fernet:
+    """The current data key alone, e.g. to tell whether a value still needs re-encrypting."""
+    return _build_fernet(_keyring_sources()[0])
+
+def key_fingerprint() -> str:
+    """Non-secret identifier of the current data key (for re-encryption checkpoints)."""
+    return hashlib.sha256(_derive_key(_keyring_sources()[0])).hexdigest()[:16]
+
+def encrypt_secret(value: str) -> str:
+    """Encrypt a stored secret (SMTP passwords, API keys, queued email bodies) with the current data key."""
     if not value:
         return ""
-    f = Fernet(get_smtp_fernet_key())
-    return f.encrypt(value.encode()).decode()
+    return get_data_keyring().encrypt(value.encode()).decode()
 
-def decrypt_smtp_password(value: str) -> str:
-    """Decrypt an SMTP password. Falls back to plaintext if decryption fails (pre-migration data)."""
+def decrypt_secret(value: str, strict: bool = False) -> str:
+    """
+    Decrypt a value encrypted with any key in the data keyring. A value that does not decrypt is
+    returned as is (plaintext stored before encryption, see reencrypt_secrets.py), or raises with strict=True.
+    """
     if not value:
         return ""
     try:
-        f = Fernet(get_smtp_fernet_key())
-        return f.decrypt(value.encode()).decode()
-    except Exception:
-        # Gracefully handle plaintext passwords (pre-migration). Run migrate_smtp_passwords.py to fix.
+        return get_data_keyring().decrypt(value.encode()).decode()
+    except InvalidToken:
+        if strict:
+            raise
         return value
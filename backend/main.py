@@ -1,16 +1,132 @@
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
-from routers import public, users, admin, two_factor, offers, shared_offers, call_offers
-from database import settings
+from routers import public, users, admin, two_factor, offers, shared_offers, call_offers, qa_forms
+from database import settings, db, client, http_client, get_active_cake_connection, get_active_ringba_connection
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+import asyncio
 import logging
+from datetime import datetime, timezone
+from models import APIConnectionType
+from routers.advertisers import run_sync_in_background
+from db_indexes import apply_indexes
+from auth import refresh_password_hashing
+from email_outbox import run_outbox_worker, stop_outbox_worker
+from email_utils import get_active_smtp_config
+from smtp_pool import smtp_pool
+from smtp_async import async_smtp_pool
+import app_tasks
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Vellko Affiliate Dashboard API")
+WARMUP_TIMEOUT = 10  # seconds startup waits for cache warm-up before serving anyway
+DRAIN_TIMEOUT = 20  # seconds background tasks get on shutdown (gunicorn's graceful timeout is 30)
+MONGO_RETRY_INTERVAL = 5  # seconds between pings while Mongo is unreachable at startup
+
+async def auto_sync_scheduler():
+    """Loop running in the background to automatically synchronize advertisers."""
+    logger.info("Auto-sync scheduler background task started")
+    while True:
+        try:
+            # Fetch all advertisers that have response mapping set up
+            cursor = db.advertisers.find({"response_mapping": {"$ne": None}})
+            advertisers = await cursor.to_list(length=100)
+            
+            for adv in advertisers:
+                hours = adv.get("auto_sync_hours", 3)
+                # Safeguard: if hours is 0 or negative, skip auto sync
+                if hours <= 0:
+                    continue
+                    
+                last_synced = adv.get("last_synced_at")
+                sync_needed = False
+                
+                if not last_synced:
+                    sync_needed = True
+                else:
+                    # Ensure timezone-aware datetime comparison
+                    if last_synced.tzinfo is None:
+                        last_synced = last_synced.replace(tzinfo=timezone.utc)
+                    now = datetime.now(timezone.utc)
+                    elapsed = (now - last_synced).total_seconds()
+                    if elapsed >= (hours * 3600):
+                        sync_needed = True
+                        
+                if sync_needed and adv.get("sync_status") != "SYNCING":
+                    logger.info(f"Auto-sync triggered for advertiser: {adv.get('name')} (every {hours} hours)")
+                    app_tasks.spawn(run_sync_in_background(str(adv["_id"])), name=f"advertiser-sync:{adv['_id']}")
+        except Exception as e:
+            logger.error(f"Error in auto_sync_scheduler loop: {str(e)}")
+            
+        # Sleep for 10 minutes before checking again
+        await asyncio.sleep(600)
+
+async def warm_caches():
+    """
+    Fill the caches the first requests after a deploy would otherwise pay for: the Cake/Ringba
+    connections, Cake verticals and media types, the active QA forms and the SMTP config.
+    Best effort: a failure is logged and that cache fills on first use as before.
+    """
+    warmers = {
+        "cake connection": get_active_cake_connection(),
+        "ringba connection": get_active_ringba_connection(),
+        "smtp config": get_active_smtp_config(),
+        "verticals": offers.get_verticals(),
+        "media types": offers.get_media_types(),
+        "cake qa form": qa_forms.get_active_form(APIConnectionType.CAKE),
+        "ringba qa form": qa_forms.get_active_form(APIConnectionType.RINGBA),
+    }
+    results = await asyncio.gather(*warmers.values(), return_exceptions=True)
+    for name, result in zip(warmers, results):
+        if isinstance(result, BaseException):
+            reason = getattr(result, "detail", None) or repr(result)
+            logger.warning(f"Cache warm-up of {name} failed: {reason}")
+
+async def wait_for_mongo():
+    """Ping until Mongo answers; the worker is not ready before that."""
+    while True:
+        try:
+            await db.command("ping")
+            return
+        except Exception as e:
+            logger.error(f"CRITICAL: MongoDB not reachable, retrying in {MONGO_RETRY_INTERVAL}s: {e}")
+            await asyncio.sleep(MONGO_RETRY_INTERVAL)
+
+async def become_ready():
+    await wait_for_mongo()
+    try:
+        await asyncio.wait_for(warm_caches(), timeout=WARMUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Cache warm-up did not finish within {WARMUP_TIMEOUT}s; the rest fills on first use")
+    app_tasks.set_ready(True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The Mongo and httpx clients already exist (database.py creates them at import); this only
+    # waits for Mongo on startup and closes both on shutdown
+    # Index builds can take a while on large collections; don't hold up worker boot for them
+    app_tasks.spawn(apply_indexes(), name="apply-indexes")
+    refresh_password_hashing()
+    app_tasks.spawn(run_outbox_worker(), name="email-outbox-worker")
+    app_tasks.spawn(auto_sync_scheduler(), name="auto-sync-scheduler", cancel_on_shutdown=True)
+
+    # Serve once warm, unless Mongo is down: then start anyway (not ready) and keep retrying
+    readiness = app_tasks.spawn(become_ready(), name="become-ready", cancel_on_shutdown=True)
+    await asyncio.wait([readiness], timeout=WARMUP_TIMEOUT + 1)
+
+    yield
+
+    stop_outbox_worker()
+    await app_tasks.drain(DRAIN_TIMEOUT)
+    await http_client.aclose()
+    await async_smtp_pool.close_all()
+    await asyncio.get_running_loop().run_in_executor(None, smtp_pool.close_all)
+    client.close()
+
+app = FastAPI(title="Vellko Affiliate Dashboard API", lifespan=lifespan)
 
 # Configure CORS
 origins = [
@@ -63,7 +179,6 @@ app.include_router(shared_offers.router)
 
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
-from routers import qa_forms
 app.include_router(qa_forms.router)
 
 from routers import reports as reports_router
@@ -78,51 +193,9 @@ async def root():
     return {"message": "Vellko Affiliate API is running (UPDATED)"}
 
 
-import asyncio
-from datetime import datetime, timezone
-from database import db
-from routers.advertisers import run_sync_in_background
-
-async def auto_sync_scheduler():
-    """Loop running in the background to automatically synchronize advertisers."""
-    logger.info("Auto-sync scheduler background task started")
-    while True:
-        try:
-            # Fetch all advertisers that have response mapping set up
-            cursor = db.advertisers.find({"response_mapping": {"$ne": None}})
-            advertisers = await cursor.to_list(length=100)
-            
-            for adv in advertisers:
-                hours = adv.get("auto_sync_hours", 3)
-                # Safeguard: if hours is 0 or negative, skip auto sync
-                if hours <= 0:
-                    continue
-                    
-                last_synced = adv.get("last_synced_at")
-                sync_needed = False
-                
-                if not last_synced:
-                    sync_needed = True
-                else:
-                    # Ensure timezone-aware datetime comparison
-                    if last_synced.tzinfo is None:
-                        last_synced = last_synced.replace(tzinfo=timezone.utc)
-                    now = datetime.now(timezone.utc)
-                    elapsed = (now - last_synced).total_seconds()
-                    if elapsed >= (hours * 3600):
-                        sync_needed = True
-                        
-                if sync_needed and adv.get("sync_status") != "SYNCING":
-                    logger.info(f"Auto-sync triggered for advertiser: {adv.get('name')} (every {hours} hours)")
-                    asyncio.create_task(run_sync_in_background(str(adv["_id"])))
-        except Exception as e:
-            logger.error(f"Error in auto_sync_scheduler loop: {str(e)}")
-            
-        # Sleep for 10 minutes before checking again
-        await asyncio.sleep(600)
-
-@app.on_event("startup")
-async def startup_event():
-    asyncio.create_task(auto_sync_scheduler())
-
-
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until startup has finished and again once shutdown has begun."""
+    if not app_tasks.is_ready():
+        return JSONResponse(status_code=503, content={"status": "not ready"})
+    return {"status": "ready"}
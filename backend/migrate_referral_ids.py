@@ -0,0 +1,52 @@
+import asyncio
+from pymongo import UpdateOne
+from database import db
+from referrer_leaderboard import as_referral_id, rebuild_leaderboard
+from signup_counters import reconcile_counters
+
+BATCH_SIZE = 1000
+
+async def migrate():
+    # Convert string companyInfo.referral_id values to ObjectIds (empty strings become null).
+    # Safe to re-run: only string values are touched.
+    cursor = db.signups.find(
+        {"companyInfo.referral_id": {"$type": "string"}},
+        {"companyInfo.referral_id": 1}
+    ).batch_size(BATCH_SIZE)
+
+    operations = []
+    converted = 0
+    skipped = 0
+    async for signup in cursor:
+        raw_id = signup["companyInfo"]["referral_id"]
+        referral_id = as_referral_id(raw_id)
+        if referral_id is None and raw_id.strip():
+            print(f"Skipping signup {signup['_id']}: referral_id '{raw_id}' is not an ObjectId.")
+            skipped += 1
+            continue
+        operations.append(UpdateOne(
+            {"_id": signup["_id"]},
+            {"$set": {"companyInfo.referral_id": referral_id}}
+        ))
+        if len(operations) >= BATCH_SIZE:
+            await db.signups.bulk_write(operations, ordered=False)
+            converted += len(operations)
+            operations = []
+            print(f"Converted {converted} signups...")
+
+    if operations:
+        await db.signups.bulk_write(operations, ordered=False)
+        converted += len(operations)
+
+    print(f"Converted: {converted}, Skipped: {skipped}")
+
+    # Counter buckets are keyed by the stored referral_id, so rebuild them along with the leaderboards
+    drift = await reconcile_counters(apply=True)
+    print(f"Signup counters reconciled ({len(drift)} buckets corrected).")
+    entries = await rebuild_leaderboard()
+    print(f"Referrer leaderboard rebuilt ({entries} entries).")
+
+    print("Migration complete.")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,35 @@
+import asyncio
+from pymongo import UpdateOne
+from database import db
+from search_utils import SEARCH_PROJECTION, build_search_tokens
+
+BATCH_SIZE = 1000
+
+async def migrate():
+    # Backfill (or rebuild) search_tokens for every signup. Safe to re-run.
+    cursor = db.signups.find({}, SEARCH_PROJECTION).batch_size(BATCH_SIZE)
+
+    operations = []
+    updated = 0
+    async for signup in cursor:
+        operations.append(UpdateOne(
+            {"_id": signup["_id"]},
+            {"$set": {"search_tokens": build_search_tokens(signup)}}
+        ))
+        if len(operations) >= BATCH_SIZE:
+            await db.signups.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+            print(f"Updated {updated} signups...")
+
+    if operations:
+        await db.signups.bulk_write(operations, ordered=False)
+        updated += len(operations)
+
+    # Make sure the index that serves the search exists
+    await db.signups.create_index("search_tokens", name="search_tokens")
+
+    print(f"Migration complete. {updated} signups indexed for search.")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -14,11 +14,21 @@ class APIConnectionType(str, Enum):
     CAKE = "CAKE"
     RINGBA = "RINGBA"
 
+class SMTPTransport(str, Enum):
+    THREAD = "thread"  # smtplib on executor threads (smtp_pool)
+    ASYNCIO = "asyncio"  # asyncio streams on the event loop (smtp_async)
+
 class CallOfferStatus(str, Enum):
     ACTIVE = "Active"
     PAUSED = "Pause/ Hold"
     CLOSED = "Closed"
 
+from pydantic import BeforeValidator
+from typing import Annotated
+
+# Helper to handle ObjectId
+PyObjectId = Annotated[str, BeforeValidator(str)]
+
 class CompanyInfo(BaseModel):
     companyName: str
     address: str
@@ -30,7 +40,7 @@ class CompanyInfo(BaseModel):
     # SECURITY FIX: AnyHttpUrl enforces http/https, preventing javascript: XSS payloads.
     corporateWebsite: Optional[Union[AnyHttpUrl, str]] = ""
     referral: Optional[str] = ""
-    referral_id: Optional[str] = None
+    referral_id: Optional[PyObjectId] = None # stored as the referrer's user ObjectId
 
 class MarketingInfo(BaseModel):
     paymentModel: str
@@ -67,12 +77,6 @@ class SignupCreate(BaseModel):
     agreed: bool
     ipAddress: Optional[str] = "0.0.0.0"
 
-from pydantic import BeforeValidator
-from typing import Annotated
-
-# Helper to handle ObjectId
-PyObjectId = Annotated[str, BeforeValidator(str)]
-
 class SignupDocument(BaseModel):
     filename: str
     path: str
@@ -138,6 +142,45 @@ class SignupInDB(SignupCreate):
     requested_ringba_approval: Optional[bool] = None
     referrer_manager_id: Optional[str] = None
     
+# List view of a signup: only what the tables render. The full SignupInDB (notes, documents,
+# raw API responses) is served by GET /admin/signups/{id}.
+class SignupSummaryCompanyInfo(BaseModel):
+    companyName: Optional[str] = None
+    country: Optional[str] = None
+    referral: Optional[str] = None
+    referral_id: Optional[PyObjectId] = None
+
+class SignupSummaryAccountInfo(BaseModel):
+    firstName: Optional[str] = None
+    lastName: Optional[str] = None
+    email: Optional[str] = None
+
+class SignupSummaryMarketingInfo(BaseModel):
+    applicationType: Optional[str] = None
+
+class SignupSummary(BaseModel):
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    application_number: Optional[str] = None
+    tags: Optional[List[str]] = Field(default_factory=list)
+    status: SignupStatus = SignupStatus.PENDING
+    created_at: Optional[datetime] = None
+    companyInfo: SignupSummaryCompanyInfo = Field(default_factory=SignupSummaryCompanyInfo)
+    accountInfo: SignupSummaryAccountInfo = Field(default_factory=SignupSummaryAccountInfo)
+    marketingInfo: SignupSummaryMarketingInfo = Field(default_factory=SignupSummaryMarketingInfo)
+    cake_affiliate_id: Optional[str] = None
+    cake_api_status: Optional[str] = None
+    ringba_affiliate_id: Optional[str] = None
+    ringba_api_status: Optional[str] = None
+    ringba_assigned_name: Optional[str] = None
+    requested_cake_approval: Optional[bool] = None
+    requested_ringba_approval: Optional[bool] = None
+    processed_by: Optional[str] = None
+    processed_at: Optional[datetime] = None
+    notes_count: int = 0
+    # Only loaded with include_qa=true (approved summary)
+    cake_qa_responses: Optional[List[QAResponse]] = None
+    ringba_qa_responses: Optional[List[QAResponse]] = None
+
         
 
 class Tag(BaseModel):
@@ -208,6 +251,12 @@ class UserRoleUpdate(BaseModel):
 
 class UserInDB(User):
     hashed_password: str
+    # Bumped to revoke every issued token (see auth.mark_user_changed)
+    token_version: int = 0
+
+class UserSelfUpdateResponse(User):
+    # Set when the update revoked the caller's sessions (password change): replaces their token
+    access_token: Optional[str] = None
 
 class Token(BaseModel):
     access_token: str
@@ -245,6 +294,7 @@ class SMTPConfig(BaseModel):
     from_name: Optional[str] = None
     from_email: str
     reply_to_email: Optional[str] = None
+    transport: SMTPTransport = SMTPTransport.THREAD
     is_active: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -262,6 +312,7 @@ class SMTPConfigCreate(BaseModel):
     from_name: Optional[str] = None
     from_email: str
     reply_to_email: Optional[str] = None
+    transport: SMTPTransport = SMTPTransport.THREAD
     is_active: Optional[bool] = False
 
 class SMTPConfigUpdate(BaseModel):
@@ -273,6 +324,7 @@ class SMTPConfigUpdate(BaseModel):
     from_name: Optional[str] = None
     from_email: Optional[str] = None
     reply_to_email: Optional[str] = None
+    transport: Optional[SMTPTransport] = None
     is_active: Optional[bool] = None
 
 class AccountInfoUpdate(BaseModel):
@@ -302,10 +354,12 @@ class SignupUpdate(BaseModel):
     paymentInfo: Optional[PaymentInfoUpdate] = None
 
 class PaginatedSignups(BaseModel):
-    items: List[SignupInDB]
-    total: int
+    items: List[SignupSummary]
+    total: Optional[int] = None # omitted in cursor mode unless include_total=true
+    total_exact: bool = True # False when total is estimated or served from the count cache
     page: int
     limit: int
+    next_after: Optional[str] = None
 
 # API Connection Models
 class CakeDetails(BaseModel):
@@ -408,6 +462,7 @@ class ClientEvent(BaseModel):
 class PaginatedActivity(BaseModel):
     logs: List[ActivityLog]
     total: int
+    total_exact: bool = True
     page: int
     pages: int
 class CallOffer(BaseModel):
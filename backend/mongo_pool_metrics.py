@@ -0,0 +1,104 @@
+"""
+Connection pool metrics for the Motor client (registered in database.py as an event listener).
+
+The number that matters for sizing MONGO_MAX_POOL_SIZE is how long operations wait to check out a
+connection: near zero while the pool has free connections, growing once every connection is busy.
+Waits are recorded per checkout into a small histogram, together with checkout failures (e.g.
+waitQueueTimeoutMS expiring) and the number of connections open and in use.
+
+Checkouts happen on the driver's threads; the start of a checkout and its outcome are reported on
+the same thread, so the start time is kept thread-local.
+"""
+import threading
+import time
+from pymongo import monitoring
+
+WAIT_BUCKETS_MS = (1, 5, 25, 100, 500, 2000)
+
+
+class PoolWaitListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._checkouts = 0
+        self._wait_total_ms = 0.0
+        self._wait_max_ms = 0.0
+        self._buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)  # last bucket: slower than the largest bound
+        self._failed = {}
+        self._open = 0
+        self._in_use = 0
+        self._cleared = 0
+
+    def _elapsed_ms(self):
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return None if started is None else (time.perf_counter() - started) * 1000
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._elapsed_ms()
+        with self._lock:
+            self._in_use += 1
+            if waited is None:
+                return
+            self._checkouts += 1
+            self._wait_total_ms += waited
+            self._wait_max_ms = max(self._wait_max_ms, waited)
+            bucket = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if waited <= bound), len(WAIT_BUCKETS_MS))
+            self._buckets[bucket] += 1
+
+    def connection_check_out_failed(self, event):
+        self._elapsed_ms()
+        with self._lock:
+            self._failed[event.reason] = self._failed.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._in_use = max(0, self._in_use - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._open = max(0, self._open - 1)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._cleared += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def metrics(self) -> dict:
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+            return {
+                "checkouts": self._checkouts,
+                "wait_avg_ms": round(self._wait_total_ms / self._checkouts, 3) if self._checkouts else 0.0,
+                "wait_max_ms": round(self._wait_max_ms, 3),
+                "wait_histogram": dict(zip(labels, self._buckets)),
+                "checkout_failures": dict(self._failed),
+                "connections_open": self._open,
+                "connections_in_use": self._in_use,
+                "pool_cleared": self._cleared,
+            }
+
+
+pool_listener = PoolWaitListener()
+
+
+def mongo_pool_metrics() -> dict:
+    return pool_listener.metrics()
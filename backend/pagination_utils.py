@@ -0,0 +1,79 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+The `after` token is opaque to clients: base64url JSON holding the sort field, direction, the sort
+value of the last row returned and its _id. The next page is the rows strictly past that
+(value, _id) pair in sort order, which a (field, _id) compound index serves directly regardless
+of how deep the page is, unlike skip().
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from bson import ObjectId
+from fastapi import HTTPException
+
+# Public sort_by name -> document path, for sorts that support `after`
+KEYSET_SORT_FIELDS = {
+    "created_at": "created_at",
+    "companyName": "companyInfo.companyName",
+}
+
+
+def _get_path(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def encode_cursor(sort_by: str, sort_order: int, last_doc: dict) -> str:
+    value = _get_path(last_doc, KEYSET_SORT_FIELDS[sort_by])
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    payload = {"s": sort_by, "o": sort_order, "v": value, "id": str(last_doc["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort_by: str, sort_order: int) -> tuple:
+    """Return (value, _id) from an `after` token. 400 when it is malformed or was issued for another sort."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = payload["v"]
+        if isinstance(value, dict) and "$date" in value:
+            value = datetime.fromisoformat(value["$date"])
+        last_id = ObjectId(payload["id"])
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+    if payload.get("s") != sort_by or payload.get("o") != sort_order:
+        raise HTTPException(status_code=400, detail="Pagination cursor does not match the requested sort")
+    return value, last_id
+
+
+def keyset_filter(path: str, sort_order: int, value, last_id: ObjectId) -> dict:
+    """
+    Filter for the rows after (value, last_id) when sorting by [(path, sort_order), (_id, sort_order)].
+    Comparison operators never match null/missing values, while sort puts them first, so they are
+    handled explicitly.
+    """
+    past = "$gt" if sort_order == 1 else "$lt"
+    if value is None:
+        clauses = [{path: None, "_id": {past: last_id}}]
+        if sort_order == 1:
+            # Ascending: every non-null value comes after the nulls
+            clauses.append({path: {"$ne": None}})
+    else:
+        clauses = [{path: {past: value}}, {path: value, "_id": {past: last_id}}]
+        if sort_order == -1:
+            # Descending: the nulls come last
+            clauses.append({path: None})
+    return {"$or": clauses}
+
+
+def sort_spec(path: str, sort_order: int) -> list:
+    """Sort with an _id tie-breaker so pages are stable and match the (field, _id) indexes."""
+    return [(path, sort_order), ("_id", sort_order)]
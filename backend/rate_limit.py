@@ -0,0 +1,106 @@
+"""
+In-memory token-bucket rate limits for the unauthenticated endpoints that cost a Mongo read plus
+bcrypt or an SMTP send (login, forgot-password, shared-link OTP request/verify).
+
+Each limiter keeps one bucket per key (client IP, account email, link token) as a
+(tokens, updated_at) tuple, in least recently updated order. Buckets that have refilled completely
+are equivalent to a fresh bucket and are swept out periodically from the old end, so memory only
+holds keys seen recently. At max_keys the least recently updated bucket is dropped, so a flood of
+unique (spoofed) keys costs O(1) per request. Checks run before any DB or crypto work and reject
+with 429 + Retry-After.
+
+Limits are per worker process; with N gunicorn workers a client can get up to N times the burst.
+"""
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException, status
+
+SWEEP_INTERVAL = 60  # seconds between evictions of full buckets
+
+
+class TokenBucketLimiter:
+    def __init__(self, name: str, capacity: int, per_minute: float, max_keys: int = 50000):
+        self.name = name
+        self.capacity = float(capacity)
+        self.rate = per_minute / 60.0  # tokens per second
+        self.max_keys = max_keys
+        self.enabled = True
+        self.rejected = 0
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at), least recently updated first
+        self._swept_at = time.monotonic()
+
+    def _sweep(self, now: float):
+        full_after = self.capacity / self.rate
+        while self._buckets:
+            _, updated_at = next(iter(self._buckets.values()))
+            if now - updated_at < full_after:
+                break
+            self._buckets.popitem(last=False)
+        self._swept_at = now
+
+    def acquire(self, key: str, cost: float = 1.0) -> Optional[float]:
+        """Take `cost` tokens from key's bucket. Returns None if allowed, else seconds until it would be."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        if now - self._swept_at >= SWEEP_INTERVAL:
+            self._sweep(now)
+
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+            bucket = (self.capacity, now)
+        tokens, updated_at = bucket
+        tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+        if tokens < cost:
+            self._buckets[key] = (tokens, now)
+            self.rejected += 1
+            return (cost - tokens) / self.rate
+        self._buckets[key] = (tokens - cost, now)
+        return None
+
+    def metrics(self) -> dict:
+        return {"keys": len(self._buckets), "rejected": self.rejected}
+
+
+LOGIN_PER_IP = TokenBucketLimiter("login_per_ip", capacity=20, per_minute=10)
+LOGIN_PER_ACCOUNT = TokenBucketLimiter("login_per_account", capacity=5, per_minute=5)
+FORGOT_PASSWORD_PER_IP = TokenBucketLimiter("forgot_password_per_ip", capacity=5, per_minute=2)
+FORGOT_PASSWORD_PER_ACCOUNT = TokenBucketLimiter("forgot_password_per_account", capacity=2, per_minute=0.2)
+OTP_REQUEST_PER_IP = TokenBucketLimiter("otp_request_per_ip", capacity=5, per_minute=2)
+OTP_REQUEST_PER_ACCOUNT = TokenBucketLimiter("otp_request_per_account", capacity=3, per_minute=0.5)
+OTP_VERIFY_PER_IP = TokenBucketLimiter("otp_verify_per_ip", capacity=10, per_minute=10)
+# Per link: caps guessing of the 6-digit code no matter how many IPs are used
+OTP_VERIFY_PER_LINK = TokenBucketLimiter("otp_verify_per_link", capacity=10, per_minute=5)
+
+LIMITERS = [
+    LOGIN_PER_IP, LOGIN_PER_ACCOUNT,
+    FORGOT_PASSWORD_PER_IP, FORGOT_PASSWORD_PER_ACCOUNT,
+    OTP_REQUEST_PER_IP, OTP_REQUEST_PER_ACCOUNT,
+    OTP_VERIFY_PER_IP, OTP_VERIFY_PER_LINK,
+]
+
+
+def enforce(*checks: tuple):
+    """
+    Raise 429 unless every (limiter, key) check passes. Keys that are None (e.g. no client IP) are
+    skipped. Tokens are only taken while earlier checks pass, so one rejection does not drain the
+    other buckets.
+    """
+    for limiter, key in checks:
+        if key is None:
+            continue
+        retry_after = limiter.acquire(key)
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts. Please try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+
+def rate_limit_metrics() -> dict:
+    return {limiter.name: limiter.metrics() for limiter in LIMITERS}
@@ -0,0 +1,154 @@
+"""
+Re-encrypt every stored secret with the current DATA_ENCRYPTION_KEY.
+
+Covers SMTP passwords, API connection keys and queued email bodies. Values under a retired key
+(DATA_ENCRYPTION_KEY_PREVIOUS, or SECRET_KEY for older API keys) are rotated onto the current key.
+Plaintext SMTP passwords and API keys from before encryption was added are encrypted. Values
+already on the current key are left alone, so the script is safe to re-run.
+
+Key rotation:
+    1. Set DATA_ENCRYPTION_KEY to the new key and move the old one into DATA_ENCRYPTION_KEY_PREVIOUS
+    2. Restart the app (it now encrypts with the new key and still reads the old one)
+    3. python reencrypt_secrets.py
+    4. Once it reports nothing left under old keys, remove DATA_ENCRYPTION_KEY_PREVIOUS
+
+Documents are processed in _id order in batches of BATCH_SIZE, each written with one bulk_write.
+Progress is checkpointed in db.counters after every batch, so an interrupted run resumes where it
+stopped (for the same current key). Use --restart to start over.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+from cryptography.fernet import InvalidToken
+from pymongo import UpdateOne
+from database import db
+from encryption_utils import get_data_keyring, get_current_fernet, key_fingerprint
+
+BATCH_SIZE = 500
+
+# collection -> (encrypted fields, whether a field may still hold pre-encryption plaintext)
+SECRET_FIELDS = {
+    "smtp_configs": (["password"], True),
+    "api_connections": (["cake_details.api_key", "ringba_details.api_token"], True),
+    "email_outbox": (["html"], False),
+}
+
+
+def _checkpoint_id(collection: str) -> str:
+    return f"reencrypt_secrets:{collection}"
+
+
+def _get_path(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _is_fernet_token(value: str) -> bool:
+    try:
+        return base64.urlsafe_b64decode(value.encode())[:1] == b"\x80"
+    except (binascii.Error, ValueError):
+        return False
+
+
+def _reencrypt_value(value: str, allow_plaintext: bool, stats: dict):
+    """New ciphertext for value, or None when it is already current (or cannot be read)."""
+    token = value.encode()
+    try:
+        get_current_fernet().decrypt(token)
+        stats["current"] += 1
+        return None
+    except InvalidToken:
+        pass
+    try:
+        rotated = get_data_keyring().rotate(token).decode()
+        stats["rotated"] += 1
+        return rotated
+    except InvalidToken:
+        pass
+    if _is_fernet_token(value) or not allow_plaintext:
+        stats["unreadable"] += 1
+        return None
+    stats["encrypted"] += 1
+    return get_data_keyring().encrypt(token).decode()
+
+
+async def reencrypt_collection(collection_name: str, restart: bool = False, dry_run: bool = False) -> dict:
+    fields, allow_plaintext = SECRET_FIELDS[collection_name]
+    collection = db[collection_name]
+    fingerprint = key_fingerprint()
+    stats = {"documents": 0, "current": 0, "rotated": 0, "encrypted": 0, "unreadable": 0}
+
+    query = {"$or": [{field: {"$type": "string", "$ne": ""}} for field in fields]}
+    checkpoint = None if restart else await db.counters.find_one({"_id": _checkpoint_id(collection_name)})
+    if checkpoint and checkpoint.get("key") == fingerprint:
+        query = {"$and": [query, {"_id": {"$gt": checkpoint["last_id"]}}]}
+        print(f"  {collection_name}: resuming after {checkpoint['last_id']}")
+
+    projection = {field: 1 for field in fields}
+    cursor = collection.find(query, projection).sort("_id", 1).batch_size(BATCH_SIZE)
+    operations = []
+    last_id = None
+
+    async def flush():
+        if operations and not dry_run:
+            await collection.bulk_write(operations, ordered=False)
+        if last_id is not None and not dry_run:
+            await db.counters.update_one(
+                {"_id": _checkpoint_id(collection_name)},
+                {"$set": {"key": fingerprint, "last_id": last_id}},
+                upsert=True
+            )
+        operations.clear()
+
+    async for doc in cursor:
+        stats["documents"] += 1
+        last_id = doc["_id"]
+        matched, updates = {"_id": doc["_id"]}, {}
+        for field in fields:
+            value = _get_path(doc, field)
+            if not isinstance(value, str) or not value:
+                continue
+            new_value = _reencrypt_value(value, allow_plaintext, stats)
+            if new_value is not None:
+                # Only replace the value that was read, never a concurrent edit
+                matched[field] = value
+                updates[field] = new_value
+        if updates:
+            operations.append(UpdateOne(matched, {"$set": updates}))
+        if stats["documents"] % BATCH_SIZE == 0:
+            await flush()
+    await flush()
+
+    if not dry_run:
+        await db.counters.delete_one({"_id": _checkpoint_id(collection_name)})
+    return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress and scan everything")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+
+    unreadable = 0
+    for collection_name in SECRET_FIELDS:
+        stats = await reencrypt_collection(collection_name, restart=args.restart, dry_run=args.dry_run)
+        unreadable += stats["unreadable"]
+        print(f"  [OK]   {collection_name}: {stats['documents']} documents, {stats['current']} already current, "
+              f"{stats['rotated']} rotated, {stats['encrypted']} plaintext encrypted, {stats['unreadable']} unreadable")
+
+    if args.dry_run:
+        print("\nDry run complete. Nothing was written.")
+    elif unreadable:
+        print(f"\nCRITICAL: {unreadable} values could not be decrypted with any configured key and were left as is.")
+    else:
+        print("\nRe-encryption complete. No values remain under retired keys.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,209 @@
+"""
+Precomputed referrer leaderboards for the dashboard.
+
+referrer_leaderboard holds one document per (board, referral_id) with the number of signups that
+referrer brought in, so get_stats reads the top N straight off the (board, count) index instead of
+grouping signups and $lookup-ing users on every request. Boards, by application type:
+    all     every signup
+    cake    Web Traffic + Both
+    ringba  Call Traffic + Both
+    both    Both only (what a single-platform admin sees of the other platform)
+
+The tracked signup writes in signup_counters keep it current. Rebuild from scratch with:
+    python referrer_leaderboard.py
+"""
+import asyncio
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from database import db
+from stats_utils import WEB_TRAFFIC_TYPES, CALL_TRAFFIC_TYPES, TOP_REFERRERS_LIMIT
+
+BOARDS = {
+    "all": None,
+    "cake": WEB_TRAFFIC_TYPES,
+    "ringba": CALL_TRAFFIC_TYPES,
+    "both": ["Both"],
+}
+
+# Marker in the shared counters collection, written once a full rebuild has completed
+READY_MARKER_ID = "referrer_leaderboard"
+_leaderboard_ready = False
+
+
+def as_referral_id(value) -> Optional[ObjectId]:
+    """Stored form of companyInfo.referral_id: the referrer's user ObjectId, or None."""
+    if isinstance(value, ObjectId):
+        return value
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return None
+
+
+def referral_id_filter(value: str):
+    """Match a referral_id whether the signup stores it as an ObjectId or as a legacy string."""
+    referral_id = as_referral_id(value)
+    if referral_id is None:
+        return value
+    return {"$in": [referral_id, str(referral_id)]}
+
+
+def _boards_for(app_type: Optional[str]) -> list:
+    return [board for board, types in BOARDS.items() if types is None or app_type in types]
+
+
+def _entries(doc: Optional[dict]) -> dict:
+    """(board, referral_id) -> referral name for one signup."""
+    if not doc:
+        return {}
+    company = doc.get("companyInfo") or {}
+    referral_id = as_referral_id(company.get("referral_id"))
+    if referral_id is None:
+        return {}
+    app_type = (doc.get("marketingInfo") or {}).get("applicationType")
+    return {(board, referral_id): company.get("referral") for board in _boards_for(app_type)}
+
+
+async def apply_leaderboard_change(before: Optional[dict], after: Optional[dict]):
+    """
+    Move one signup between leaderboard entries. before=None is an insert, after=None a delete.
+    Failures are logged, not raised; the rebuild command repairs any drift.
+    """
+    before_entries = _entries(before)
+    after_entries = _entries(after)
+
+    operations = []
+    for board, referral_id in before_entries.keys() - after_entries.keys():
+        operations.append(UpdateOne({"board": board, "referral_id": referral_id}, {"$inc": {"count": -1}}))
+    for (board, referral_id), name in after_entries.items():
+        if (board, referral_id) in before_entries:
+            continue
+        operations.append(UpdateOne(
+            {"board": board, "referral_id": referral_id},
+            {"$inc": {"count": 1}, "$set": {"name": name}},
+            upsert=True
+        ))
+    if not operations:
+        return
+
+    try:
+        await db.referrer_leaderboard.bulk_write(operations, ordered=False)
+    except Exception as e:
+        print(f"CRITICAL: Failed to update referrer leaderboard: {e}")
+
+
+async def rename_leaderboard_referrer(old_name: str, new_name: str):
+    """Carry a referrer rename into the stored display names (see signup_counters.rename_referral_tracked)."""
+    try:
+        await db.referrer_leaderboard.update_many({"name": old_name}, {"$set": {"name": new_name}})
+    except Exception as e:
+        print(f"CRITICAL: Failed to rename referrer in leaderboard: {e}")
+
+
+# --- Reading ---
+
+async def leaderboard_ready() -> bool:
+    global _leaderboard_ready
+    if not _leaderboard_ready:
+        _leaderboard_ready = await db.counters.find_one({"_id": READY_MARKER_ID}) is not None
+    return _leaderboard_ready
+
+
+def boards_for_scope(query: dict) -> Optional[dict]:
+    """
+    Leaderboards answering each top-referrer list of the /admin/stats response for a stats scope,
+    or None when the scope is not a plain (admin) application-type scope.
+    """
+    if not query:
+        return {"top_referrers": "all", "top_cake_referrers": "cake", "top_ringba_referrers": "ringba"}
+    if list(query) != ["marketingInfo.applicationType"]:
+        return None
+    allowed = (query["marketingInfo.applicationType"] or {}).get("$in")
+    if allowed == WEB_TRAFFIC_TYPES:
+        return {"top_referrers": "cake", "top_cake_referrers": "cake", "top_ringba_referrers": "both"}
+    if allowed == CALL_TRAFFIC_TYPES:
+        return {"top_referrers": "ringba", "top_cake_referrers": "both", "top_ringba_referrers": "ringba"}
+    return None
+
+
+async def read_top_referrers(boards: dict) -> dict:
+    """Top referrers for each requested board, with names resolved by a single users query."""
+    tops = {}
+    for key, board in boards.items():
+        cursor = db.referrer_leaderboard.find(
+            {"board": board, "count": {"$gt": 0}},
+            {"_id": 0, "referral_id": 1, "name": 1, "count": 1}
+        ).sort("count", -1).limit(TOP_REFERRERS_LIMIT)
+        tops[key] = await cursor.to_list(length=TOP_REFERRERS_LIMIT)
+
+    referrer_ids = list({entry["referral_id"] for entries in tops.values() for entry in entries})
+    names = {}
+    if referrer_ids:
+        async for u in db.users.find({"_id": {"$in": referrer_ids}}, {"full_name": 1}):
+            names[u["_id"]] = u.get("full_name")
+
+    return {
+        key: [
+            {"name": names.get(entry["referral_id"]) or entry.get("name") or "Unknown", "count": entry["count"]}
+            for entry in entries
+        ]
+        for key, entries in tops.items()
+    }
+
+
+# --- Rebuild ---
+
+async def rebuild_leaderboard():
+    """Recompute every leaderboard from the signups collection and mark the leaderboards ready."""
+    pipeline = [
+        {"$match": {"companyInfo.referral_id": {"$nin": [None, ""]}}},
+        {
+            "$group": {
+                "_id": {"referral_id": "$companyInfo.referral_id", "applicationType": "$marketingInfo.applicationType"},
+                "count": {"$sum": 1},
+                "name": {"$last": "$companyInfo.referral"}
+            }
+        }
+    ]
+    totals = {}
+    async for row in db.signups.aggregate(pipeline, allowDiskUse=True):
+        referral_id = as_referral_id(row["_id"].get("referral_id"))
+        if referral_id is None:
+            continue
+        for board in _boards_for(row["_id"].get("applicationType")):
+            entry = totals.setdefault((board, referral_id), {"count": 0, "name": None})
+            entry["count"] += row["count"]
+            entry["name"] = row.get("name") or entry["name"]
+
+    from db_indexes import apply_collection_indexes
+    await apply_collection_indexes("referrer_leaderboard")
+
+    rebuilt_at = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"board": board, "referral_id": referral_id},
+            {"$set": {"count": entry["count"], "name": entry["name"], "rebuilt_at": rebuilt_at}},
+            upsert=True
+        )
+        for (board, referral_id), entry in totals.items()
+    ]
+    if operations:
+        await db.referrer_leaderboard.bulk_write(operations, ordered=False)
+    # Entries for referrers that no longer have signups
+    await db.referrer_leaderboard.delete_many({"rebuilt_at": {"$ne": rebuilt_at}})
+    await db.counters.update_one(
+        {"_id": READY_MARKER_ID},
+        {"$set": {"rebuilt_at": rebuilt_at}},
+        upsert=True
+    )
+    return len(operations)
+
+
+async def main():
+    entries = await rebuild_leaderboard()
+    print(f"Referrer leaderboard rebuilt: {entries} entries.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
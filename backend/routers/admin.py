@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Body, File, UploadFile
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 import smtplib
 import asyncio
 import secrets
-from database import db, get_active_cake_connection, get_active_ringba_connection
-from models import SignupInDB, SignupStatus, User, UserRole, SignupUpdate, PaginatedSignups, ApplicationPermission, QAResponse, ActivityLog, ClientEvent, PaginatedActivity, Tag
-from auth import get_current_user
+import csv
+import io
+from database import db, settings, get_active_cake_connection, get_active_ringba_connection
+from models import SignupInDB, SignupSummary, SignupStatus, User, UserRole, SignupUpdate, PaginatedSignups, ApplicationPermission, QAResponse, ActivityLog, ClientEvent, PaginatedActivity, Tag
+from auth import get_current_user, mark_user_changed, forget_user
 from bson import ObjectId
 from pydantic import BaseModel
 from datetime import datetime, timedelta
@@ -13,6 +16,13 @@ import os
 import shutil
 from email_utils import send_invitation_email, send_referral_assignment_email, send_cake_credentials_email
 from activity_utils import log_activity
+from stats_utils import build_stats_scope_query, compute_stats
+from signup_counters import compute_stats_from_counters, update_signup_tracked, delete_signup_tracked
+from stats_cache import get_cached_stats
+from search_utils import build_search_query, build_relevance_stages, refresh_search_tokens, touches_search_fields
+from count_cache import count_with_cache
+from referrer_leaderboard import referral_id_filter
+from pagination_utils import KEYSET_SORT_FIELDS, encode_cursor, decode_cursor, keyset_filter, sort_spec
 from fastapi import Request
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -25,227 +35,62 @@ async def get_current_admin(current_user: User = Depends(get_current_user)):
         pass
     return current_user
 
+async def _compute_scoped_stats(query: dict) -> dict:
+    # Admin scopes are served from the materialized signup_counters (see signup_counters).
+    # Referral scopes, or a deployment whose counters were never rebuilt, fall back to the
+    # single-pass $facet aggregation over the user's scoped signups.
+    stats = await compute_stats_from_counters(query)
+    if stats is None:
+        stats = await compute_stats(query)
+    return stats
+
 @router.get("/stats")
 async def get_stats(user: User = Depends(get_current_admin)):
-    query = {}
-    
-    # Role based filtering for stats
-    if user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
-        # Filter by referral_id if available (more robust), falling back to name for old data
-        if hasattr(user, '_id') and user._id:
-             query["$or"] = [
-                 {"companyInfo.referral_id": str(user._id)},
-                 # Fallback for old data without ID
-                 {"companyInfo.referral": user.full_name}
-             ]
-        elif user.full_name:
-             query["companyInfo.referral"] = user.full_name
-        else:
-             query["companyInfo.referral"] = "NON_EXISTENT_REFERRAL"
-    
-    
-    # Application permission filtering
-    # Super admin sees everything, no filtering needed
-    if user.role != UserRole.SUPER_ADMIN and hasattr(user, 'application_permission'):
-        from models import ApplicationPermission
-        if user.application_permission == ApplicationPermission.WEB_TRAFFIC:
-            # Show Web Traffic signups and Both signups
-            query["marketingInfo.applicationType"] = {"$in": ["Web Traffic", "Both"]}
-        elif user.application_permission == ApplicationPermission.CALL_TRAFFIC:
-            # Show Call Traffic signups and Both signups
-            query["marketingInfo.applicationType"] = {"$in": ["Call Traffic", "Both"]}
-        # If user permission is BOTH, show all signups (no additional filtering needed)
-
-
-    # Basic stats with optional filtering
-    total = await db.signups.count_documents(query)
-    
-    # Helper to count with status and existing query filter
-    async def count_status(status_list):
-        status_query = query.copy()
-        status_query["status"] = {"$in": status_list}
-        return await db.signups.count_documents(status_query)
-
-    # Pending should include both PENDING and REQUESTED_FOR_APPROVAL
-    pending = await count_status([
-        SignupStatus.PENDING,
-        SignupStatus.REQUESTED_FOR_APPROVAL
-    ])
-
-    approved = await count_status([SignupStatus.APPROVED])
-    rejected = await count_status([SignupStatus.REJECTED])
-
-    # Remove Chart Data as requested for cleaner UI/Dashboard
-    # (Removed pipeline and chart_data_cursor logic)
-
-    # --- Application Specific Stats (Granular) ---
-    async def get_granular_stats(api_status_field: str, app_type: str):
-        # Base filter for this application type (Specific Type OR Both)
-        base_query = query.copy()
-        base_query["$or"] = [
-            {"marketingInfo.applicationType": app_type},
-            {"marketingInfo.applicationType": "Both"}
-        ]
-        
-        # Approved Count
-        # Logic: Explicitly "APPROVED" OR (Implicitly "APPROVED" for Single-Type apps via Global Status)
-        approved_query = {
-            "$and": [
-                base_query,
-                {
-                    "$or": [
-                        {api_status_field: "APPROVED"},
-                        {
-                            "marketingInfo.applicationType": app_type,
-                            "status": SignupStatus.APPROVED,
-                            api_status_field: None
-                        }
-                    ]
-                }
-            ]
-        }
-        approved_count = await db.signups.count_documents(approved_query)
-
-        # Rejected Count
-        rejected_query = {
-            "$and": [
-                base_query,
-                {
-                    "$or": [
-                        {api_status_field: "REJECTED"},
-                        {
-                            "marketingInfo.applicationType": app_type,
-                            "status": SignupStatus.REJECTED,
-                            api_status_field: None
-                        }
-                    ]
-                }
-            ]
-        }
-        rejected_count = await db.signups.count_documents(rejected_query)
-
-        # Pending Count
-        # Logic: Explicitly None (and not global rejected/approved if single type?? No, if single type and global pending, api status is likely None)
-        # For "Both": If api_status is None, it is Pending.
-        # For Single: If Global PENDING, it is Pending.
-        pending_query = {
-             "$and": [
-                base_query,
-                {
-                    "$or": [
-                        # Explicitly FAILED means Pending/Needs Action
-                        {api_status_field: "FAILED"},
-                        # For Both: Explicitly None means Pending
-                        {"marketingInfo.applicationType": "Both", api_status_field: None},
-                        # For Single: Global Pending
-                        {"marketingInfo.applicationType": app_type, "status": SignupStatus.PENDING},
-                        # For Single: Global Requested
-                        {"marketingInfo.applicationType": app_type, "status": SignupStatus.REQUESTED_FOR_APPROVAL}
-                    ]
-                }
-            ]
-        }
-        pending_count = await db.signups.count_documents(pending_query)
-        
-        total_relevant = await db.signups.count_documents(base_query)
-
-        return {
-            "total": total_relevant,
-            "approved": approved_count,
-            "rejected": rejected_count,
-            "pending": pending_count
-        }
-
-    cake_stats = await get_granular_stats("cake_api_status", "Web Traffic")
-    ringba_stats = await get_granular_stats("ringba_api_status", "Call Traffic")
-
-
-    # --- Referrer Stats Aggregation Helper ---
-    async def get_top_referrers(match_filter: dict):
-        pipeline = [
-            {"$match": match_filter},
-            {
-                "$group": {
-                    "_id": "$companyInfo.referral_id",
-                    "name": {"$first": "$companyInfo.referral"}, # Fallback name
-                    "count": {"$sum": 1}
-                }
-            },
-            {"$match": {"_id": {"$ne": None}, "_id": {"$ne": ""}}}, # Exclude empty referrers
-            {
-                "$addFields": {
-                    "convertedId": {
-                        "$cond": {
-                            "if": {"$and": [{"$ne": ["$_id", None]}, {"$ne": ["$_id", ""]}]},
-                            "then": {"$toObjectId": "$_id"},
-                            "else": None
-                        }
-                    }
-                }
-            },
-            {"$lookup": {
-                "from": "users",
-                "localField": "convertedId",
-                "foreignField": "_id",
-                "as": "user_info"
-            }},
-            {
-                "$project": {
-                    "name": {
-                        "$cond": {
-                            "if": {"$gt": [{"$size": "$user_info"}, 0]},
-                            "then": {"$arrayElemAt": ["$user_info.full_name", 0]},
-                            "else": "$name"
-                        }
-                    },
-                    "count": 1
-                }
-            },
-            {"$sort": {"count": -1}},
-            {"$limit": 5}
-        ]
-        cursor = db.signups.aggregate(pipeline)
-        results = await cursor.to_list(length=5)
-        return [{"name": item.get("name") or "Unknown", "count": item["count"]} for item in results]
-
-    # Global Top Referrers
-    formatted_referrers = await get_top_referrers(query)
-    
-    # Platform Specific Top Referrers (All applications for that platform)
-    cake_referrer_query = query.copy()
-    cake_referrer_query["marketingInfo.applicationType"] = {"$in": ["Web Traffic", "Both"]}
-    top_cake_referrers = await get_top_referrers(cake_referrer_query)
-
-    ringba_referrer_query = query.copy()
-    ringba_referrer_query["marketingInfo.applicationType"] = {"$in": ["Call Traffic", "Both"]}
-    top_ringba_referrers = await get_top_referrers(ringba_referrer_query)
-
-    return {
-        "total": total,
-        "pending": pending,
-        "approved": approved,
-        "rejected": rejected,
-        "cake_stats": cake_stats,
-        "ringba_stats": ringba_stats,
-        "top_referrers": formatted_referrers,
-        "top_cake_referrers": top_cake_referrers,
-        "top_ringba_referrers": top_ringba_referrers
-    }
-
-@router.get("/signups", response_model=PaginatedSignups)
-async def get_signups(
-    status: Optional[SignupStatus] = None, 
+    query = build_stats_scope_query(user)
+    # Users sharing a scope share one cached result and one in-flight computation (see stats_cache)
+    return await get_cached_stats(query, _compute_scoped_stats)
+
+# Fields of a SignupSummary, projected in Mongo so list pages never read notes, documents or raw API payloads
+SIGNUP_SUMMARY_PROJECTION = {
+    "application_number": 1,
+    "tags": 1,
+    "status": 1,
+    "created_at": 1,
+    "companyInfo.companyName": 1,
+    "companyInfo.country": 1,
+    "companyInfo.referral": 1,
+    "companyInfo.referral_id": 1,
+    "accountInfo.firstName": 1,
+    "accountInfo.lastName": 1,
+    "accountInfo.email": 1,
+    "marketingInfo.applicationType": 1,
+    "cake_affiliate_id": 1,
+    "cake_api_status": 1,
+    "ringba_affiliate_id": 1,
+    "ringba_api_status": 1,
+    "ringba_assigned_name": 1,
+    "requested_cake_approval": 1,
+    "requested_ringba_approval": 1,
+    "processed_by": 1,
+    "processed_at": 1,
+    "notes_count": {"$size": {"$ifNull": ["$notes", []]}},
+}
+SIGNUP_QA_PROJECTION = {"cake_qa_responses": 1, "ringba_qa_responses": 1}
+
+async def build_signups_query(
+    user: User,
+    status: Optional[SignupStatus] = None,
     referral: Optional[str] = None,
     referral_id: Optional[str] = None,
     application_type: Optional[str] = None,
     search: Optional[str] = None,
-    tag: Optional[str] = None,
-    page: int = Query(1, ge=1),
-    limit: int = Query(20, ge=1, le=100),
-    sort_by: Optional[str] = "created_at",
-    sort_order: int = Query(-1, ge=-1, le=1), # -1 for desc, 1 for asc
-    user: User = Depends(get_current_admin)
-):
+    tag: Optional[str] = None
+) -> tuple:
+    """
+    Mongo filter for the admin signups list and its export: role scope, application type, per-platform
+    status semantics, search and tag. Returns (query, search_query); search_query is None when
+    there is no (usable) search text.
+    """
     query = {}
     
     # Role based filtering
@@ -253,7 +98,7 @@ async def get_signups(
         # Filter by referral_id if available, fallback to name
         if hasattr(user, '_id') and user._id:
              query["$or"] = [
-                 {"companyInfo.referral_id": str(user._id)},
+                 {"companyInfo.referral_id": referral_id_filter(str(user._id))},
                  {"companyInfo.referral": user.full_name}
              ]
         elif user.full_name:
@@ -263,7 +108,7 @@ async def get_signups(
     else:
         # Admin filtering
         if referral_id:
-            query["companyInfo.referral_id"] = referral_id
+            query["companyInfo.referral_id"] = referral_id_filter(referral_id)
         elif referral:
             query["companyInfo.referral"] = referral
     
@@ -328,26 +173,12 @@ async def get_signups(
             # Default behavior (Both or All)
             query["status"] = status
             
-    if search:
-        search_regex = {"$regex": search, "$options": "i"}
-        search_or = [
-            {"companyInfo.companyName": search_regex},
-            {"accountInfo.email": search_regex},
-            {"cake_affiliate_id": search_regex},
-            {"ringba_affiliate_id": search_regex},
-            {"ringba_assigned_name": search_regex},
-            {"application_number": search_regex},
-            {"tags": search_regex}
-        ]
-        if "$or" in query:
-            existing_or = query.pop("$or")
-            if "$and" not in query:
-                query["$and"] = []
-            query["$and"].extend([{"$or": existing_or}, {"$or": search_or}])
-        elif "$and" in query:
-            query["$and"].append({"$or": search_or})
-        else:
-            query["$or"] = search_or
+    # Served from the search_tokens index (see search_utils), not a regex scan of every field
+    search_query = await build_search_query(search) if search else None
+    if search_query:
+        if "$and" not in query:
+            query["$and"] = []
+        query["$and"].append(search_query)
 
     # Remove empty query keys if any were accidentally set to None
     query = {k: v for k, v in query.items() if v is not None}
@@ -355,27 +186,169 @@ async def get_signups(
     if tag:
         query["tags"] = tag
 
+    return query, search_query
+
+@router.get("/signups", response_model=PaginatedSignups)
+async def get_signups(
+    status: Optional[SignupStatus] = None, 
+    referral: Optional[str] = None,
+    referral_id: Optional[str] = None,
+    application_type: Optional[str] = None,
+    search: Optional[str] = None,
+    tag: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    sort_by: Optional[str] = None, # defaults to "relevance" when searching, else "created_at"
+    sort_order: int = Query(-1, ge=-1, le=1), # -1 for desc, 1 for asc
+    after: Optional[str] = None, # keyset cursor (next_after of the previous page); replaces page
+    include_total: Optional[bool] = None, # defaults to True for page mode, False for cursor mode
+    include_qa: bool = False, # add the Q/A responses to each summary (approved summary view)
+    user: User = Depends(get_current_admin)
+):
+    query, search_query = await build_signups_query(user, status, referral, referral_id, application_type, search, tag)
+
     # Sorting
     # Handle nested fields for sorting if needed, e.g., companyInfo.companyName
-    effective_sort_by = sort_by
-    if sort_by == "companyName":
-        effective_sort_by = "companyInfo.companyName"
-    
-    sort_dict = {effective_sort_by: sort_order} if effective_sort_by else {"created_at": -1}
+    if not sort_by:
+        sort_by = "relevance" if search_query else "created_at"
+
+    if sort_by == "relevance" and not search_query:
+        sort_by = "created_at"
+
+    effective_sort_by = KEYSET_SORT_FIELDS.get(sort_by, sort_by)
+    keyset = sort_by in KEYSET_SORT_FIELDS
+
+    if after and not keyset:
+        raise HTTPException(status_code=400, detail="Cursor pagination is only supported for created_at and companyName sorts")
 
-    total_count = await db.signups.count_documents(query)
+    if include_total is None:
+        include_total = not after
+    total_count, total_exact = await count_with_cache("signups", query) if include_total else (None, False)
     
+    projection = dict(SIGNUP_SUMMARY_PROJECTION)
+    if include_qa:
+        projection.update(SIGNUP_QA_PROJECTION)
+
     skip = (page - 1) * limit
-    cursor = db.signups.find(query).sort(list(sort_dict.items())).skip(skip).limit(limit)
-    items = await cursor.to_list(length=limit)
+    if sort_by == "relevance":
+        pipeline = [{"$match": query}] + build_relevance_stages(search) + [
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$project": projection}
+        ]
+        items = await db.signups.aggregate(pipeline).to_list(length=limit)
+    else:
+        if after:
+            # Keyset mode: seek past the last row of the previous page instead of skipping
+            value, last_id = decode_cursor(after, sort_by, sort_order)
+            query.setdefault("$and", []).append(keyset_filter(effective_sort_by, sort_order, value, last_id))
+            skip = 0
+        cursor = db.signups.find(query, projection).sort(sort_spec(effective_sort_by, sort_order)).skip(skip).limit(limit)
+        items = await cursor.to_list(length=limit)
+
+    next_after = None
+    if keyset and len(items) == limit:
+        next_after = encode_cursor(sort_by, sort_order, items[-1])
     
     return {
         "items": items,
         "total": total_count,
+        "total_exact": total_exact,
         "page": page,
-        "limit": limit
+        "limit": limit,
+        "next_after": next_after
     }
 
+# Rows per Mongo batch and per streamed chunk; memory stays bounded by this regardless of the result size
+EXPORT_BATCH_SIZE = 500
+EXPORT_QA_FIELDS = {"cake_qa_responses", "ringba_qa_responses"}
+# CSV header -> dotted path into a dumped SignupSummary
+EXPORT_CSV_COLUMNS = {
+    "id": "_id",
+    "application_number": "application_number",
+    "created_at": "created_at",
+    "status": "status",
+    "company_name": "companyInfo.companyName",
+    "country": "companyInfo.country",
+    "first_name": "accountInfo.firstName",
+    "last_name": "accountInfo.lastName",
+    "email": "accountInfo.email",
+    "application_type": "marketingInfo.applicationType",
+    "referral": "companyInfo.referral",
+    "referral_id": "companyInfo.referral_id",
+    "tags": "tags",
+    "cake_affiliate_id": "cake_affiliate_id",
+    "cake_api_status": "cake_api_status",
+    "ringba_affiliate_id": "ringba_affiliate_id",
+    "ringba_api_status": "ringba_api_status",
+    "ringba_assigned_name": "ringba_assigned_name",
+    "processed_by": "processed_by",
+    "processed_at": "processed_at",
+    "notes_count": "notes_count",
+}
+
+def _export_cell(row: dict, path: str):
+    value = row
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    if isinstance(value, list):
+        return ";".join(str(v) for v in value)
+    return "" if value is None else value
+
+async def _stream_signups_export(cursor, export_format: str):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        writer.writerow(EXPORT_CSV_COLUMNS.keys())
+
+    rows = 0
+    async for doc in cursor:
+        summary = SignupSummary(**doc)
+        if export_format == "csv":
+            row = summary.model_dump(mode="json", by_alias=True, exclude=EXPORT_QA_FIELDS)
+            writer.writerow([_export_cell(row, path) for path in EXPORT_CSV_COLUMNS.values()])
+        else:
+            buffer.write(summary.model_dump_json(by_alias=True, exclude=EXPORT_QA_FIELDS))
+            buffer.write("\n")
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@router.get("/signups/export")
+async def export_signups(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    status: Optional[SignupStatus] = None,
+    referral: Optional[str] = None,
+    referral_id: Optional[str] = None,
+    application_type: Optional[str] = None,
+    search: Optional[str] = None,
+    tag: Optional[str] = None,
+    sort_by: str = Query("created_at", pattern="^(created_at|companyName)$"),
+    sort_order: int = Query(-1, ge=-1, le=1),
+    user: User = Depends(get_current_admin)
+):
+    """
+    Every signup matching the /admin/signups filters, streamed from a single cursor as CSV or NDJSON
+    (one SignupSummary per line). No count, no skip; rows are flushed every EXPORT_BATCH_SIZE.
+    """
+    query, _ = await build_signups_query(user, status, referral, referral_id, application_type, search, tag)
+    cursor = db.signups.find(query, SIGNUP_SUMMARY_PROJECTION) \
+        .sort(sort_spec(KEYSET_SORT_FIELDS[sort_by], sort_order)) \
+        .batch_size(EXPORT_BATCH_SIZE)
+
+    filename = f"signups_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_signups_export(cursor, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.get("/signups/{id}", response_model=SignupInDB)
 async def get_signup(id: str, user: User = Depends(get_current_admin)):
     signup = await db.signups.find_one({"_id": ObjectId(id)})
@@ -462,8 +435,8 @@ async def approve_signup(id: str, request: Request, decision: SignupDecision = B
 
     if needs_approval_request or (hasattr(user, 'can_approve_signups') and user.can_approve_signups is False):
         # User cannot directly approve. Create Approval Request.
-        await db.signups.update_one(
-            {"_id": ObjectId(id)},
+        await update_signup_tracked(
+            ObjectId(id),
             {
                 "$set": {
                     "status": SignupStatus.REQUESTED_FOR_APPROVAL,
@@ -974,10 +947,9 @@ async def approve_signup(id: str, request: Request, decision: SignupDecision = B
         update_data["ringba_affiliate_id"] = ringba_affiliate_id
 
     # Save results
-    await db.signups.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": update_data}
-    )
+    await update_signup_tracked(ObjectId(id), {"$set": update_data})
+    if touches_search_fields(update_data):
+        await refresh_search_tokens([ObjectId(id)])
     
     if not overall_success:
         detail_msg = []
@@ -1113,10 +1085,7 @@ async def reject_signup(id: str, request: Request, decision: SignupDecision = Bo
 
     update_fields["status"] = new_status
 
-    await db.signups.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": update_fields}
-    )
+    await update_signup_tracked(ObjectId(id), {"$set": update_fields})
 
     # Log activity
     company_name = signup_data.get("companyInfo", {}).get("companyName", "Unknown")
@@ -1141,20 +1110,17 @@ async def update_referral(id: str, referral: str = Body(..., embed=True), user:
     if referral and referral not in ["Others", "Other", "None", ""]:
         referrer = await db.users.find_one({"full_name": referral})
         if referrer:
-            referral_id = str(referrer["_id"])
+            referral_id = referrer["_id"]
     
     # Update both referral name and referral_id
     update_fields = {
         "companyInfo.referral": referral,
-        "companyInfo.referral_id": referral_id if referral_id else ""
+        "companyInfo.referral_id": referral_id
     }
     
-    result = await db.signups.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": update_fields}
-    )
+    previous = await update_signup_tracked(ObjectId(id), {"$set": update_fields})
     
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Signup not found")
         
     # Notify new referrer
@@ -1176,9 +1142,9 @@ async def delete_signup(id: str, user: User = Depends(get_current_admin)):
     if user.role != UserRole.SUPER_ADMIN:
         raise HTTPException(status_code=403, detail="Only Super Admins can delete signups")
 
-    result = await db.signups.delete_one({"_id": ObjectId(id)})
+    deleted = await delete_signup_tracked(ObjectId(id))
 
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Signup not found")
 
     return {"message": "Signup deleted successfully"}
@@ -1199,6 +1165,14 @@ async def update_signup(id: str, update_data: SignupUpdate, user: User = Depends
     if update_data.companyInfo:
         for k, v in update_data.companyInfo.model_dump(exclude_none=True).items():
             update_doc[f"companyInfo.{k}"] = v
+
+        # Keep referral_id in step with a reassigned referral name
+        new_referral = update_doc.get("companyInfo.referral")
+        if new_referral is not None and new_referral != original_signup.get("companyInfo", {}).get("referral"):
+            new_referrer = None
+            if new_referral not in ["Others", "Other", "None", ""]:
+                new_referrer = await db.users.find_one({"full_name": new_referral}, {"_id": 1})
+            update_doc["companyInfo.referral_id"] = new_referrer["_id"] if new_referrer else None
             
     if update_data.marketingInfo:
         for k, v in update_data.marketingInfo.model_dump(exclude_none=True).items():
@@ -1218,13 +1192,12 @@ async def update_signup(id: str, update_data: SignupUpdate, user: User = Depends
     update_doc["is_updated"] = True
     update_doc["updated_at"] = datetime.utcnow()
 
-    result = await db.signups.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": update_doc}
-    )
+    previous = await update_signup_tracked(ObjectId(id), {"$set": update_doc})
     
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Signup not found")
+    if touches_search_fields(update_doc):
+        await refresh_search_tokens([ObjectId(id)])
 
     # Check if referral changed and notify
     new_referral = update_doc.get("companyInfo.referral")
@@ -1260,8 +1233,8 @@ async def reset_signup(id: str, user: User = Depends(get_current_admin)):
         if referral != user.full_name:
              raise HTTPException(status_code=403, detail="Not authorized to reset this signup")
 
-    await db.signups.update_one(
-        {"_id": ObjectId(id)},
+    await update_signup_tracked(
+        ObjectId(id),
         {
             "$set": {
                 "status": SignupStatus.PENDING,
@@ -1281,6 +1254,7 @@ async def reset_signup(id: str, user: User = Depends(get_current_admin)):
             }
         }
     )
+    await refresh_search_tokens([ObjectId(id)])
     return {"message": "Signup reset to Pending"}
 
 @router.post("/signups/{id}/documents")
@@ -1466,14 +1440,14 @@ async def add_signup_note(id: str, note: str = Body(..., embed=True), user: User
         recipient_emails = [u["email"] for u in recipients if u.get("email")]
         
         if recipient_emails:
-            # Send notification (fire-and-forget background task to keep UI snappy)
-            asyncio.create_task(send_internal_note_notification_email(
+            # Queued in the email outbox, so this returns without waiting on SMTP
+            await send_internal_note_notification_email(
                 to_emails=recipient_emails,
                 signup_data=signup_data,
                 signup_id=id,
                 author=user.full_name or user.username,
                 note_content=note
-            ))
+            )
             
     except Exception as e:
         print(f"Failed to send internal note notifications: {e}")
@@ -1524,6 +1498,7 @@ async def update_tags(id: str, tags: List[str] = Body(..., embed=True), user: Us
         {"_id": ObjectId(id)},
         {"$set": {"tags": tags}}
     )
+    await refresh_search_tokens([ObjectId(id)])
     
     return {"message": "Tags updated", "tags": tags}
 
@@ -1577,10 +1552,12 @@ async def delete_tag(tag_name: str, user: User = Depends(get_current_admin)):
     await db.tags.delete_many({"name": tag_name})
     
     # Remove the tag from all signups
+    tagged_ids = await db.signups.distinct("_id", {"tags": tag_name})
     result = await db.signups.update_many(
         {"tags": tag_name},
         {"$pull": {"tags": tag_name}}
     )
+    await refresh_search_tokens(tagged_ids)
     
     return {"message": f"Tag '{tag_name}' removed from {result.modified_count} applications and global registry"}
 
@@ -1614,10 +1591,12 @@ async def update_tag(tag_name: str, update: TagUpdate, user: User = Depends(get_
     
     # 3. Rename in signups if name changed
     if update.new_name and update.new_name != tag_name:
+        tagged_ids = await db.signups.distinct("_id", {"tags": tag_name})
         result = await db.signups.update_many(
             {"tags": tag_name},
             {"$set": {"tags.$": update.new_name}}
         )
+        await refresh_search_tokens(tagged_ids)
         return {"message": f"Tag renamed globally. Updated {result.modified_count} applications."}
     
     return {"message": "Tag color/name updated successfully."}
@@ -1654,7 +1633,7 @@ async def get_activity(
     if user.role != UserRole.SUPER_ADMIN:
         raise HTTPException(status_code=403, detail="Only Super Admins can view activity logs")
     
-    total = await db.user_activities.count_documents({})
+    total, total_exact = await count_with_cache("user_activities", {})
     pages = (total + limit - 1) // limit
     
     skip = (page - 1) * limit
@@ -1663,6 +1642,7 @@ async def get_activity(
     return PaginatedActivity(
         logs=[ActivityLog(**log) for log in logs],
         total=total,
+        total_exact=total_exact,
         page=page,
         pages=pages
     )
@@ -1686,7 +1666,14 @@ async def log_client_activity(
     return {"status": "ok"}
 
 from models import UserCreate, UserInDB
-from auth import get_password_hash
+from auth import get_password_hash_async, password_hash_metrics, calibrate_password_hashing
+from rate_limit import rate_limit_metrics
+from smtp_pool import smtp_pool
+from smtp_async import async_smtp_pool
+from email_outbox import outbox_metrics
+from mongo_pool_metrics import mongo_pool_metrics
+from app_tasks import task_metrics
+from async_cache import cache_metrics
 
 @router.get("/users", response_model=List[User])
 async def get_users(user: User = Depends(get_current_admin)):
@@ -1763,7 +1750,7 @@ async def create_user(user_in: UserCreate, request: Request, user: User = Depend
         
     user_dict = user_in.dict()
     password = user_dict.pop("password")
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash_async(password)
     
     user_db = UserInDB(**user_dict, hashed_password=hashed_password)
     await db.users.insert_one(user_db.dict())
@@ -1818,6 +1805,7 @@ async def delete_user(username: str, request: Request, user: User = Depends(get_
     result = await db.users.delete_one({"username": username})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await forget_user(username)
         
     # Log activity
     await log_activity(
@@ -1851,6 +1839,8 @@ async def update_user_status(username: str, status_update: UserStatusUpdate, req
         {"username": username},
         {"$set": {"disabled": status_update.disabled}}
     )
+    # Disabling revokes the user's tokens
+    await mark_user_changed(username, revoke_sessions=status_update.disabled)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -1886,6 +1876,7 @@ async def update_user_role(username: str, role_update: UserRoleUpdate, request:
         {"username": username},
         {"$set": {"role": role_update.role}}
     )
+    await mark_user_changed(username, revoke_sessions=True)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -1941,7 +1932,7 @@ async def update_user(username: str, user_update: UserUpdate, request: Request,
     if user_update.can_view_advertiser_offer_list is not None:
         update_data["can_view_advertiser_offer_list"] = user_update.can_view_advertiser_offer_list
     if user_update.password is not None:
-        update_data["hashed_password"] = get_password_hash(user_update.password)
+        update_data["hashed_password"] = await get_password_hash_async(user_update.password)
     if user_update.cake_account_manager_id is not None:
         update_data["cake_account_manager_id"] = user_update.cake_account_manager_id
     if user_update.can_view_masked is not None:
@@ -1954,6 +1945,8 @@ async def update_user(username: str, user_update: UserUpdate, request: Request,
         {"username": username},
         {"$set": update_data}
     )
+    # An admin password reset revokes the user's tokens
+    await mark_user_changed(username, revoke_sessions="hashed_password" in update_data)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -1969,6 +1962,31 @@ async def update_user(username: str, user_update: UserUpdate, request: Request,
 
     return {"message": "User updated successfully"}
 
+@router.get("/metrics")
+async def get_metrics(user: User = Depends(get_current_admin)):
+    """Per-worker runtime metrics (each gunicorn worker answers for itself)."""
+    if user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        raise HTTPException(status_code=403, detail="Only admins can view metrics")
+    return {
+        "pid": os.getpid(),
+        "password_hashing": password_hash_metrics(),
+        "rate_limits": rate_limit_metrics(),
+        "smtp_pool": smtp_pool.metrics(),
+        "smtp_async_pool": async_smtp_pool.metrics(),
+        "email_outbox": outbox_metrics(),
+        "mongo_pool": mongo_pool_metrics(),
+        "background_tasks": task_metrics(),
+        "caches": cache_metrics(),
+    }
+
+@router.post("/password-hashing/recalibrate")
+async def recalibrate_password_hashing(user: User = Depends(get_current_admin)):
+    """Re-measure the bcrypt cost on this worker and publish it; the other workers adopt it on their next full sync."""
+    if user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        raise HTTPException(status_code=403, detail="Only admins can recalibrate password hashing")
+    rounds = await calibrate_password_hashing(recalibrate=True)
+    return {"bcrypt_rounds": rounds, "target_ms": settings.PASSWORD_HASH_TARGET_MS}
+
 from models import SMTPConfigCreate
 
 def _test_smtp_sync(config: SMTPConfigCreate):
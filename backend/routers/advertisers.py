@@ -12,6 +12,7 @@ from database import db
 from models import Advertiser, AdvertiserOffer, ResponseMapping, HeaderItem, User, UserRole
 from auth import get_current_user
 from activity_utils import log_activity
+from count_cache import count_with_cache, invalidate_counts
 from pydantic import BaseModel
 
 
@@ -183,6 +184,7 @@ async def sync_advertiser_offers_db(advertiser: Dict[str, Any]) -> int:
 
     # Wipe existing offers for this advertiser to ensure database consistency with current API state
     await db.advertiser_offers.delete_many({"advertiser_id": adv_id})
+    invalidate_counts("advertiser_offers")
 
     synced_offers = []
     for raw_offer in offers_raw:
@@ -255,6 +257,7 @@ async def sync_advertiser_offers_db(advertiser: Dict[str, Any]) -> int:
             for offer_doc in synced_offers
         ]
         await db.advertiser_offers.bulk_write(operations)
+        invalidate_counts("advertiser_offers")
         
     return len(synced_offers)
 
@@ -331,7 +334,7 @@ async def get_consolidated_offers(
             
         query["$or"] = query_or
 
-    total_count = await db.advertiser_offers.count_documents(query)
+    total_count, total_exact = await count_with_cache("advertiser_offers", query)
     skip = (page - 1) * limit
     sort_dir = -1 if sort_descending else 1
     
@@ -381,6 +384,7 @@ async def get_consolidated_offers(
     return {
         "success": True,
         "row_count": total_count,
+        "total_exact": total_exact,
         "offers": serialized,
         "custom_columns": custom_columns,
         "page": page,
@@ -516,6 +520,7 @@ async def update_custom_column(payload: CustomColumnUpdateRequest, user: User =
         {f"custom_fields.{old_clean}": {"$exists": True}},
         {"$rename": {f"custom_fields.{old_clean}": f"custom_fields.{new_clean}"}}
     )
+    invalidate_counts("advertiser_offers")
     
     return {"success": True, "message": f"Successfully renamed '{old_clean}' to '{new_clean}' system-wide."}
 
@@ -594,6 +599,7 @@ async def update_advertiser(id: str, adv_in: AdvertiserUpdate, request: Request,
             {"advertiser_id": id},
             {"$set": set_dict}
         )
+        invalidate_counts("advertiser_offers")
 
     await log_activity(
         username=user.username,
@@ -662,6 +668,7 @@ async def delete_advertiser(id: str, request: Request, user: User = Depends(get_
     
     # Delete synced offers
     deleted_offers = await db.advertiser_offers.delete_many({"advertiser_id": id})
+    invalidate_counts("advertiser_offers")
     
     await log_activity(
         username=user.username,
@@ -992,6 +999,7 @@ async def upload_advertiser_offers_csv(
         ]
         
         await db.advertiser_offers.bulk_write(operations)
+        invalidate_counts("advertiser_offers")
         
         # Save custom columns on the Advertiser document for quick frontend rendering
         if all_custom_keys:
@@ -3,6 +3,7 @@ from typing import List, Optional, Dict, Any
 from database import db
 from models import CallOffer, CallOfferCreate, CallOfferUpdate, User, UserRole
 from auth import get_current_user
+from count_cache import count_with_cache, invalidate_counts
 from bson import ObjectId
 from datetime import datetime
 import csv
@@ -36,6 +37,7 @@ async def create_call_offer(offer: CallOfferCreate, user: User = Depends(get_cur
     offer_dict["created_by"] = user.username
     
     result = await db.call_offers.insert_one(offer_dict)
+    invalidate_counts("call_offers")
     offer_dict["_id"] = result.inserted_id
     return offer_dict
 
@@ -65,7 +67,7 @@ async def get_call_offers(
         # For non-admins, only show Active offers by default
         query["status"] = "Active"
     
-    total = await db.call_offers.count_documents(query)
+    total, total_exact = await count_with_cache("call_offers", query)
     cursor = db.call_offers.find(query).skip(skip).limit(limit).sort("created_at", -1)
     offers = await cursor.to_list(length=limit)
     
@@ -73,7 +75,7 @@ async def get_call_offers(
     for offer in offers:
         offer["_id"] = str(offer["_id"])
         
-    return {"items": offers, "total": total}
+    return {"items": offers, "total": total, "total_exact": total_exact}
 
 @router.get("/filters")
 async def get_call_offer_filters(user: User = Depends(check_call_permission)):
@@ -155,6 +157,7 @@ async def update_call_offer(id: str, update: CallOfferUpdate, user: User = Depen
         {"$set": update_data},
         return_document=True
     )
+    invalidate_counts("call_offers")
     
     if not result:
         raise HTTPException(status_code=404, detail="Offer not found")
@@ -166,6 +169,7 @@ async def delete_call_offer(id: str, user: User = Depends(get_current_admin)):
         raise HTTPException(status_code=400, detail="Invalid ID")
     
     result = await db.call_offers.delete_one({"_id": ObjectId(id)})
+    invalidate_counts("call_offers")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Offer not found")
     return {"message": "Offer deleted successfully"}
@@ -185,6 +189,7 @@ async def batch_create_call_offers(offers: List[CallOfferCreate], user: User = D
         docs.append(doc)
     
     result = await db.call_offers.insert_many(docs)
+    invalidate_counts("call_offers")
     return {"message": f"Successfully created {len(result.inserted_ids)} offers", "count": len(result.inserted_ids)}
 
 @router.post("/analyze")
@@ -360,5 +365,6 @@ async def upload_call_offers(
         raise HTTPException(status_code=400, detail="No valid offers found in CSV. Please check your headers.")
         
     result = await db.call_offers.insert_many(docs)
+    invalidate_counts("call_offers")
     return {"message": f"Successfully imported {len(result.inserted_ids)} offers", "count": len(result.inserted_ids)}
 
@@ -5,7 +5,7 @@ import xmltodict
 import math
 from pydantic import BaseModel
 from database import db, settings, get_active_cake_connection, http_client
-from datetime import datetime, timedelta
+from async_cache import AsyncTTLCache
 
 router = APIRouter(
     prefix="/offers",
@@ -13,9 +13,15 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Cache for metadata (verticals, media types)
-_metadata_cache = {}
+# Cache for metadata (verticals, media types). Served stale for a while after expiry so a slow
+# Cake response is paid by a background refresh rather than by the request that found it expired.
 METADATA_CACHE_TTL = 3600 # 1 hour
+METADATA_STALE_TTL = 600 # 10 minutes
+metadata_cache = AsyncTTLCache("cake_metadata", ttl=METADATA_CACHE_TTL, max_entries=8, stale_ttl=METADATA_STALE_TTL)
+
+def _metadata_ttl(result: list) -> int:
+    # An empty list usually means Cake answered with an unexpected payload: retry on next use
+    return METADATA_CACHE_TTL if result else 0
 
 # Pydantic models for response structure (optional but good for docs)
 class Offer(BaseModel):
@@ -218,12 +224,9 @@ async def get_media_types():
     """
     Fetch available media types from Cake Marketing API.
     """
-    now = datetime.now()
-    if "media_types" in _metadata_cache:
-        expiry = _metadata_cache["media_types"]["expiry"]
-        if now < expiry:
-            return _metadata_cache["media_types"]["data"]
+    return await metadata_cache.get_or_load("media_types", _fetch_media_types, ttl=_metadata_ttl)
 
+async def _fetch_media_types():
     cake_conn = await get_active_cake_connection()
     api_key = cake_conn["api_key"]
     base_url = cake_conn["api_media_types_url"]
@@ -266,10 +269,6 @@ async def get_media_types():
                     "media_type_name": name.strip()
                 })
         
-        _metadata_cache["media_types"] = {
-            "data": result,
-            "expiry": now + timedelta(seconds=METADATA_CACHE_TTL)
-        }
         return result
 
     except httpx.RequestError as e:
@@ -279,12 +278,9 @@ async def get_verticals():
     """
     Fetch available verticals from Cake Marketing API.
     """
-    now = datetime.now()
-    if "verticals" in _metadata_cache:
-        expiry = _metadata_cache["verticals"]["expiry"]
-        if now < expiry:
-            return _metadata_cache["verticals"]["data"]
+    return await metadata_cache.get_or_load("verticals", _fetch_verticals, ttl=_metadata_ttl)
 
+async def _fetch_verticals():
     cake_conn = await get_active_cake_connection()
     api_key = cake_conn["api_key"]
     base_url = cake_conn["api_verticals_url"]
@@ -334,10 +330,6 @@ async def get_verticals():
                     "vertical_name": name.strip()
                 })
         
-        _metadata_cache["verticals"] = {
-            "data": result,
-            "expiry": now + timedelta(seconds=METADATA_CACHE_TTL)
-        }
         return result
 
     except httpx.RequestError as e:
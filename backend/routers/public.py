@@ -1,14 +1,20 @@
-from fastapi import APIRouter, HTTPException, Body, Depends, status, Form
+from fastapi import APIRouter, HTTPException, Body, Depends, status, Form, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from database import db, settings
 from models import SignupCreate, SignupStatus, Token, UserRole
 from datetime import datetime, timedelta
-from auth import verify_password, create_access_token, get_password_hash
+from auth import verify_and_update_password_async, create_access_token, get_password_hash_async, mark_user_changed
 from email_utils import send_reset_password_email, send_signup_notification_email
+from signup_counters import record_signup_created
+from search_utils import build_search_tokens
+from referrer_leaderboard import as_referral_id
+from activity_utils import get_client_ip
+from rate_limit import enforce, LOGIN_PER_IP, LOGIN_PER_ACCOUNT, FORGOT_PASSWORD_PER_IP, FORGOT_PASSWORD_PER_ACCOUNT
 from pydantic import BaseModel, EmailStr
 import uuid
 import pyotp
 from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter()
 
@@ -60,8 +66,18 @@ async def create_signup(signup: SignupCreate):
     signup_dict["status"] = SignupStatus.PENDING
     signup_dict["created_at"] = datetime.utcnow()
     signup_dict["is_updated"] = False
+    signup_dict["companyInfo"]["referral_id"] = as_referral_id(signup_dict["companyInfo"].get("referral_id"))
+    signup_dict["search_tokens"] = build_search_tokens(signup_dict)
     
-    result = await db.signups.insert_one(signup_dict)
+    try:
+        result = await db.signups.insert_one(signup_dict)
+    except DuplicateKeyError:
+        # Concurrent submission with the same email lost the race on the unique index
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="An application with this email already exists. Please contact support to check your application status."
+        )
+    await record_signup_created(signup_dict)
     
     # Send Email Notifications
     try:
@@ -82,10 +98,7 @@ async def create_signup(signup: SignupCreate):
                  
         # 3. Send Emails
         if recipient_emails:
-            # We use a background task or just await it here. 
-            # For simplicity/robustness in this context, we await it (it's fast enough via SMTP usually)
-            # or could use BackgroundTasks from FastAPI if passed to the route.
-            # Given the current structure, synchronous call is okay or we can just call the util which handles its own try/catch.
+            # Only queues the messages; the email outbox workers deliver them
             await send_signup_notification_email(list(recipient_emails), signup_dict, str(result.inserted_id))
             
     except Exception as e:
@@ -95,12 +108,18 @@ async def create_signup(signup: SignupCreate):
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     remember: bool = Form(False),
     otp: str = Form(None)
 ):
+    enforce(
+        (LOGIN_PER_IP, get_client_ip(request)),
+        (LOGIN_PER_ACCOUNT, form_data.username.lower().strip()),
+    )
     user = await db.users.find_one({"email": form_data.username})
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    valid, new_hash = await verify_and_update_password_async(form_data.password, user["hashed_password"]) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -131,6 +150,10 @@ async def login_for_access_token(
                 headers={"WWW-Authenticate": "Bearer"},
             )
     
+    # Stored hash was made at another bcrypt cost than the calibrated one (see auth.calibrate_password_hashing)
+    if new_hash:
+        await db.users.update_one({"_id": user["_id"]}, {"$set": {"hashed_password": new_hash}})
+
     # If remember is True, set expiry to 30 days, else use default setting
     # Robustly handle string inputs if passed via Form e.g. "true"/"false"
     is_remembered = remember
@@ -141,7 +164,7 @@ async def login_for_access_token(
     access_token_expires = timedelta(minutes=expire_minutes)
     
     access_token = create_access_token(
-        data={"sub": user["username"]}, expires_delta=access_token_expires
+        data={"sub": user["username"], "ver": user.get("token_version", 0)}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -149,7 +172,11 @@ class ForgotPasswordRequest(BaseModel):
     email: EmailStr
 
 @router.post("/forgot-password")
-async def forgot_password(request: ForgotPasswordRequest):
+async def forgot_password(request: ForgotPasswordRequest, http_request: Request):
+    enforce(
+        (FORGOT_PASSWORD_PER_IP, get_client_ip(http_request)),
+        (FORGOT_PASSWORD_PER_ACCOUNT, request.email.lower()),
+    )
     user = await db.users.find_one({"email": request.email})
     if not user:
         # Don't reveal if user exists
@@ -167,10 +194,7 @@ async def forgot_password(request: ForgotPasswordRequest):
         }}
     )
     
-    # Send email
-    # Note: send_reset_password_email is now async. In production, use background tasks.
-    # For now, we'll run it directly or wrap in thread if blocking is an issue, 
-    # but for low volume it's acceptable.
+    # Send email (queued in the email outbox, delivered by a background worker)
     await send_reset_password_email(request.email, reset_token)
     
     return {"message": "If this email is registered, you will receive password reset instructions."}
@@ -192,7 +216,7 @@ async def reset_password(request: ResetPasswordRequest):
             detail="Invalid or expired reset token"
         )
         
-    hashed_password = get_password_hash(request.new_password)
+    hashed_password = await get_password_hash_async(request.new_password)
     
     await db.users.update_one(
         {"_id": user["_id"]},
@@ -202,5 +226,6 @@ async def reset_password(request: ResetPasswordRequest):
             "reset_token_expires_at": None
         }}
     )
+    await mark_user_changed(user["username"], revoke_sessions=True)
     
     return {"message": "Password has been reset successfully"}
@@ -5,10 +5,24 @@ from models import QAForm, QAFormCreate, QAFormUpdate, User, UserRole, APIConnec
 from auth import get_current_user
 from bson import ObjectId
 from datetime import datetime
+from async_cache import AsyncTTLCache
 from activity_utils import log_activity
 
 router = APIRouter(prefix="/admin/qa-forms", tags=["QA Forms"])
 
+# Active form per API type, read on every approval screen; dropped on any form write
+ACTIVE_FORM_CACHE_TTL = 300 # 5 minutes
+active_form_cache = AsyncTTLCache("active_qa_forms", ttl=ACTIVE_FORM_CACHE_TTL, max_entries=8)
+
+def invalidate_active_forms():
+    active_form_cache.clear()
+
+async def get_active_form(api_type: APIConnectionType) -> Optional[dict]:
+    key = APIConnectionType(api_type).value
+    return await active_form_cache.get_or_load(
+        key, lambda: db.qa_forms.find_one({"api_type": key, "status": "Active"})
+    )
+
 async def get_current_admin(current_user: User = Depends(get_current_user)):
     # current_user is already a validated User object (disabled check already done)
     if current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
@@ -110,6 +124,7 @@ async def update_qa_form(id: str, form_in: QAFormUpdate, request: Request, user:
         {"_id": ObjectId(id)},
         {"$set": update_data}
     )
+    invalidate_active_forms()
     
     updated = await db.qa_forms.find_one({"_id": ObjectId(id)})
 
@@ -134,6 +149,7 @@ async def delete_qa_form(id: str, request: Request, user: User = Depends(get_cur
         raise HTTPException(status_code=403, detail="Not authorized")
         
     await db.qa_forms.delete_one({"_id": ObjectId(id)})
+    invalidate_active_forms()
 
     # Log activity
     await log_activity(
@@ -168,6 +184,7 @@ async def activate_qa_form(id: str, request: Request, user: User = Depends(get_c
         {"_id": ObjectId(id)},
         {"$set": {"status": "Active"}}
     )
+    invalidate_active_forms()
     
     # Log activity
     await log_activity(
@@ -186,7 +203,7 @@ async def get_active_qa_form(api_type: APIConnectionType, user: User = Depends(g
     if not check_permission(user, api_type):
         raise HTTPException(status_code=403, detail="Not authorized")
         
-    form = await db.qa_forms.find_one({"api_type": api_type, "status": "Active"})
+    form = await get_active_form(api_type)
     if not form:
         return None
         
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from typing import List
-from database import db
+from database import db, invalidate_connection_cache
 from models import User, UserRole, SMTPConfig, SMTPConfigCreate, SMTPConfigUpdate, APIConnection, APIConnectionCreate, APIConnectionUpdate, APIConnectionType
 from auth import get_current_user
 from bson import ObjectId
 from datetime import datetime
-from encryption_utils import encrypt_field, decrypt_field, encrypt_smtp_password
+from encryption_utils import encrypt_secret
+from email_utils import invalidate_smtp_config_cache
 
 router = APIRouter(prefix="/admin/settings", tags=["settings"])
 
@@ -32,7 +33,7 @@ async def create_smtp_config(config: SMTPConfigCreate, user: User = Depends(get_
     
     # SECURITY FIX: Encrypt SMTP password before saving to DB
     if config_dict.get("password"):
-        config_dict["password"] = encrypt_smtp_password(config_dict["password"])
+        config_dict["password"] = encrypt_secret(config_dict["password"])
     
     # If this is the first config, make it active by default
     count = await db.smtp_configs.count_documents({})
@@ -43,6 +44,7 @@ async def create_smtp_config(config: SMTPConfigCreate, user: User = Depends(get_
         await db.smtp_configs.update_many({}, {"$set": {"is_active": False}})
         
     result = await db.smtp_configs.insert_one(config_dict)
+    invalidate_smtp_config_cache()
     created_config = await db.smtp_configs.find_one({"_id": result.inserted_id})
     # Mask password in response
     created_config["password"] = "****"
@@ -59,7 +61,7 @@ async def update_smtp_config(id: str, config: SMTPConfigUpdate, user: User = Dep
     # SECURITY FIX: Encrypt password if being updated, skip mask value
     if "password" in update_data:
         if update_data["password"] and update_data["password"] != "****":
-            update_data["password"] = encrypt_smtp_password(update_data["password"])
+            update_data["password"] = encrypt_secret(update_data["password"])
         else:
             # Don't overwrite the stored password if masked value sent
             del update_data["password"]
@@ -72,6 +74,7 @@ async def update_smtp_config(id: str, config: SMTPConfigUpdate, user: User = Dep
         {"_id": ObjectId(id)},
         {"$set": update_data}
     )
+    invalidate_smtp_config_cache()
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Config not found")
@@ -86,6 +89,7 @@ async def delete_smtp_config(id: str, user: User = Depends(get_current_admin)):
     # For now allow, fallback to env vars.
     
     result = await db.smtp_configs.delete_one({"_id": ObjectId(id)})
+    invalidate_smtp_config_cache()
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Config not found")
         
@@ -103,6 +107,7 @@ async def activate_smtp_config(id: str, user: User = Depends(get_current_admin))
     
     # Activate target
     await db.smtp_configs.update_one({"_id": ObjectId(id)}, {"$set": {"is_active": True}})
+    invalidate_smtp_config_cache()
     
     return {"message": "SMTP Config activated"}
 
@@ -127,9 +132,9 @@ async def create_api_connection(connection: APIConnectionCreate, user: User = De
     
     # Encrypt keys
     if connection_dict.get("cake_details"):
-        connection_dict["cake_details"]["api_key"] = encrypt_field(connection_dict["cake_details"]["api_key"])
+        connection_dict["cake_details"]["api_key"] = encrypt_secret(connection_dict["cake_details"]["api_key"])
     if connection_dict.get("ringba_details"):
-        connection_dict["ringba_details"]["api_token"] = encrypt_field(connection_dict["ringba_details"]["api_token"])
+        connection_dict["ringba_details"]["api_token"] = encrypt_secret(connection_dict["ringba_details"]["api_token"])
 
     connection_dict["created_at"] = datetime.utcnow()
     connection_dict["updated_at"] = datetime.utcnow()
@@ -143,6 +148,7 @@ async def create_api_connection(connection: APIConnectionCreate, user: User = De
         await db.api_connections.update_many({"type": connection.type}, {"$set": {"is_active": False}})
         
     result = await db.api_connections.insert_one(connection_dict)
+    invalidate_connection_cache(connection.type)
     created_connection = await db.api_connections.find_one({"_id": result.inserted_id})
     return created_connection
 
@@ -163,7 +169,7 @@ async def update_api_connection(id: str, connection: APIConnectionUpdate, user:
             if existing and existing.get("cake_details"):
                 update_data["cake_details"]["api_key"] = existing["cake_details"]["api_key"]
         else:
-            update_data["cake_details"]["api_key"] = encrypt_field(update_data["cake_details"]["api_key"])
+            update_data["cake_details"]["api_key"] = encrypt_secret(update_data["cake_details"]["api_key"])
             
     if update_data.get("ringba_details"):
         if update_data["ringba_details"].get("api_token") == "****":
@@ -171,7 +177,7 @@ async def update_api_connection(id: str, connection: APIConnectionUpdate, user:
             if existing and existing.get("ringba_details"):
                 update_data["ringba_details"]["api_token"] = existing["ringba_details"]["api_token"]
         else:
-            update_data["ringba_details"]["api_token"] = encrypt_field(update_data["ringba_details"]["api_token"])
+            update_data["ringba_details"]["api_token"] = encrypt_secret(update_data["ringba_details"]["api_token"])
     
     if update_data.get("is_active"):
         # Get target connection to know its type
@@ -188,6 +194,8 @@ async def update_api_connection(id: str, connection: APIConnectionUpdate, user:
         {"_id": ObjectId(id)},
         {"$set": update_data}
     )
+    # The update may change the connection's type, so drop every cached type
+    invalidate_connection_cache()
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Connection not found")
@@ -197,9 +205,10 @@ async def update_api_connection(id: str, connection: APIConnectionUpdate, user:
 
 @router.delete("/connections/{id}")
 async def delete_api_connection(id: str, user: User = Depends(get_current_admin)):
-    result = await db.api_connections.delete_one({"_id": ObjectId(id)})
-    if result.deleted_count == 0:
+    deleted = await db.api_connections.find_one_and_delete({"_id": ObjectId(id)}, projection={"type": 1})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Connection not found")
+    invalidate_connection_cache(deleted["type"])
     return {"message": "Connection deleted"}
 
 @router.post("/connections/{id}/activate")
@@ -213,5 +222,6 @@ async def activate_api_connection(id: str, user: User = Depends(get_current_admi
     
     # Activate target
     await db.api_connections.update_one({"_id": ObjectId(id)}, {"$set": {"is_active": True}})
+    invalidate_connection_cache(connection["type"])
     
     return {"message": f"{connection['type']} connection activated"}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, Body, Query
+from fastapi import APIRouter, HTTPException, Depends, Body, Query, Request
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 import uuid
@@ -12,15 +12,24 @@ import xmltodict
 import auth
 from routers import public
 import math
+from count_cache import count_with_cache
+from async_cache import AsyncTTLCache
+from activity_utils import get_client_ip
+from rate_limit import enforce, OTP_REQUEST_PER_IP, OTP_REQUEST_PER_ACCOUNT, OTP_VERIFY_PER_IP, OTP_VERIFY_PER_LINK
 
 router = APIRouter(
     prefix="/offers/share",
     tags=["shared_offers"]
 )
 
-# Cache for shared data
-_data_cache = {}
+# Cache for shared data, one entry per (link, page, limit, search, vertical). Bounded: every
+# distinct search string is a new key.
 DATA_CACHE_TTL = 120 # 2 minutes
+DATA_CACHE_MAX_ENTRIES = 2000
+DATA_CACHE_MAX_BYTES = 32 * 1024 * 1024
+shared_data_cache = AsyncTTLCache(
+    "shared_offer_data", ttl=DATA_CACHE_TTL, max_entries=DATA_CACHE_MAX_ENTRIES, max_bytes=DATA_CACHE_MAX_BYTES
+)
 
 SHARING_EXPIRATION_HOURS = 24
 OTP_EXPIRATION_MINUTES = 10
@@ -200,7 +209,11 @@ async def check_share_link(token: str):
     return {"valid": True}
 
 @router.post("/{token}/otp/request")
-async def request_otp(token: str, request: OTPRequest):
+async def request_otp(token: str, request: OTPRequest, http_request: Request):
+    enforce(
+        (OTP_REQUEST_PER_IP, get_client_ip(http_request)),
+        (OTP_REQUEST_PER_ACCOUNT, f"{token}:{request.email.lower().strip()}"),
+    )
     # Check link validity first
     doc = await db.shared_offers.find_one({"token": token, "active": True})
     if not doc:
@@ -241,7 +254,11 @@ async def request_otp(token: str, request: OTPRequest):
     return {"message": "OTP sent"}
 
 @router.post("/{token}/otp/verify", response_model=OTPVerifyResponse)
-async def verify_otp(token: str, request: OTPVerifyRequest):
+async def verify_otp(token: str, request: OTPVerifyRequest, http_request: Request):
+    enforce(
+        (OTP_VERIFY_PER_IP, get_client_ip(http_request)),
+        (OTP_VERIFY_PER_LINK, token),
+    )
     doc = await db.shared_offers.find_one({"token": token, "active": True})
     if not doc:
         raise HTTPException(status_code=404, detail="Link not found")
@@ -281,36 +298,35 @@ async def get_shared_data(
     except (ValueError, TypeError):
         active_vertical_id = 0
 
-    # Cache Check
-    cache_key = f"{token}_{page}_{limit}_{search}_{active_vertical_id}"
-    now = datetime.now()
-    if cache_key in _data_cache:
-        cached = _data_cache[cache_key]
-        if now < cached["expiry"]:
-            # Increment view count even for cache hits? 
-            # View count is usually for unique access, but here it's on every data fetch.
-            # Let's keep it consistent.
-            await db.shared_offers.update_one({"token": token}, {"$inc": {"views": 1}})
-            return cached["data"]
-
-    # Verify JWT
+    # Verify JWT (before the cache, so cached pages are only served to a valid session)
     try:
         payload = jwt.decode(access_token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         if payload["sub"] != token:
             raise HTTPException(status_code=403, detail="Invalid token scope")
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Session expired")
-    except jwt.InvalidTokenError:
+    except jwt.JWTError:
         raise HTTPException(status_code=401, detail="Invalid session")
-        
+
+    # Increment view count (every data fetch counts, cached or not)
+    await db.shared_offers.update_one({"token": token}, {"$inc": {"views": 1}})
+
+    return await shared_data_cache.get_or_load(
+        (token, page, limit, search, active_vertical_id),
+        lambda: _load_shared_data(token, page, limit, search, active_vertical_id),
+        ttl=_shared_data_ttl
+    )
+
+def _shared_data_ttl(result: dict) -> int:
+    # Cake error / empty responses (no filters_applied) are not cached, as before
+    return DATA_CACHE_TTL if "filters_applied" in result else 0
+
+async def _load_shared_data(token: str, page: int, limit: int, search: Optional[str], active_vertical_id: int):
     # Get filters and settings
     doc = await db.shared_offers.find_one({"token": token})
     filters = doc.get("filters", {})
     visible_columns = doc.get("visible_columns", [])
     
-    # Increment view count
-    await db.shared_offers.update_one({"token": token}, {"$inc": {"views": 1}})
-    
     # Fetch Data
     offer_type = doc.get("offer_type", "web")
     
@@ -349,7 +365,7 @@ async def get_shared_data(
                 query["$and"].append({"$or": v_queries})
         
         # We can add more filters here if needed
-        total_count = await db.call_offers.count_documents(query)
+        total_count, total_exact = await count_with_cache("call_offers", query)
         cursor = db.call_offers.find(query).skip((page-1)*limit).limit(limit).sort("created_at", -1)
         items = await cursor.to_list(length=limit)
         
@@ -370,6 +386,7 @@ async def get_shared_data(
             "success": True,
             "offers": processed_offers,
             "row_count": total_count,
+            "total_exact": total_exact,
             "filters_applied": filters,
             "visible_columns": visible_columns,
             "link_name": doc.get("name"),
@@ -378,7 +395,6 @@ async def get_shared_data(
             "limit": limit,
             "total_pages": math.ceil(total_count/limit) if limit > 0 else 0
         }
-        _data_cache[cache_key] = {"data": result, "expiry": now + timedelta(seconds=DATA_CACHE_TTL)}
         return result
 
     # Standard Web (Cake) Logic
@@ -547,12 +563,6 @@ async def get_shared_data(
             "total_pages": total_pages
         }
         
-        # Store in cache
-        _data_cache[cache_key] = {
-            "data": result,
-            "expiry": now + timedelta(seconds=DATA_CACHE_TTL)
-        }
-        
         return result
         
     except Exception as e:
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from models import User
-from auth import get_current_active_user
+from auth import get_current_active_user, mark_user_changed
 from database import db
 from pydantic import BaseModel
 import pyotp
@@ -50,6 +50,7 @@ async def enable_two_factor(request: VerifyRequest, user: User = Depends(get_cur
             "is_two_factor_enabled": True
         }}
     )
+    await mark_user_changed(user.username)
     
     return {"message": "Two-factor authentication enabled successfully"}
 
@@ -72,5 +73,6 @@ async def disable_two_factor(request: VerifyRequest, user: User = Depends(get_cu
             "is_two_factor_enabled": False
         }}
     )
+    await mark_user_changed(user.username)
     
     return {"message": "Two-factor authentication disabled successfully"}
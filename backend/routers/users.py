@@ -1,7 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from database import db
-from models import User, UserUpdate
-from auth import get_current_user, get_password_hash, verify_password
+from models import User, UserUpdate, UserSelfUpdateResponse
+from auth import (
+    get_current_user, get_password_hash_async, verify_password_async, mark_user_changed,
+    oauth2_scheme, reissue_access_token
+)
+from signup_counters import rename_referral_tracked
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -10,13 +14,18 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
     # current_user is already a User object from get_current_user
     return current_user
 
-@router.put("/me", response_model=User)
-async def update_user_me(user_update: UserUpdate, current_user: User = Depends(get_current_user)):
+@router.put("/me", response_model=UserSelfUpdateResponse)
+async def update_user_me(
+    user_update: UserUpdate,
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(oauth2_scheme)
+):
     existing_user_data = await db.users.find_one({"username": current_user.username})
     if not existing_user_data:
         raise HTTPException(status_code=404, detail="User not found")
         
     update_data = {k: v for k, v in user_update.dict().items() if v is not None}
+    access_token = None
     
     # Do not allow users to update their own email
     if "email" in update_data:
@@ -28,11 +37,11 @@ async def update_user_me(user_update: UserUpdate, current_user: User = Depends(g
         if not current_password:
             raise HTTPException(status_code=400, detail="Current password is required to set a new password")
         
-        if not verify_password(current_password, existing_user_data.get("hashed_password")):
+        if not await verify_password_async(current_password, existing_user_data.get("hashed_password")):
             raise HTTPException(status_code=400, detail="Incorrect current password")
             
         password = update_data.pop("password")
-        update_data["hashed_password"] = get_password_hash(password)
+        update_data["hashed_password"] = await get_password_hash_async(password)
     elif "current_password" in update_data:
         # Just clean up if it was provided without a new password
         update_data.pop("current_password")
@@ -45,17 +54,20 @@ async def update_user_me(user_update: UserUpdate, current_user: User = Depends(g
             
             # If name actually changed and old name existed
             if old_name and new_name and old_name != new_name:
-                # Update all signups that referred to the old name
-                await db.signups.update_many(
-                    {"companyInfo.referral": old_name},
-                    {"$set": {"companyInfo.referral": new_name}}
-                )
+                # Update all signups that referred to the old name, with their stats and leaderboard entries
+                await rename_referral_tracked(old_name, new_name)
 
         await db.users.update_one(
             {"username": current_user.username},
             {"$set": update_data}
         )
-        
+        # A password change signs out every other session (e.g. after a compromise); the caller
+        # gets a token at the new version
+        password_changed = "hashed_password" in update_data
+        token_version = await mark_user_changed(current_user.username, revoke_sessions=password_changed)
+        if password_changed and token_version is not None:
+            access_token = reissue_access_token(token, token_version)
+
     # Return updated user
     updated_user_data = await db.users.find_one({"username": current_user.username})
-    return User(**updated_user_data)
+    return UserSelfUpdateResponse(**updated_user_data, access_token=access_token)
@@ -0,0 +1,138 @@
+"""
+Indexed search for the admin signups list.
+
+Every signup carries a `search_tokens` array: the lowercased values of the searchable fields plus
+their alphanumeric parts. A multikey index on it serves anchored prefix regexes, so a search is an
+index range scan instead of a case-insensitive regex over seven fields of every document.
+Signups written before this existed are backfilled by migrate_search_tokens.py.
+"""
+import re
+from typing import Iterable, Optional
+from pymongo import UpdateOne
+from database import db
+from count_cache import invalidate_counts
+
+# Fields searched from the signups list (dot paths)
+SEARCH_FIELDS = [
+    "companyInfo.companyName",
+    "accountInfo.email",
+    "cake_affiliate_id",
+    "ringba_affiliate_id",
+    "ringba_assigned_name",
+    "application_number",
+    "tags",
+]
+SEARCH_PROJECTION = {path: 1 for path in SEARCH_FIELDS}
+
+# Keeps the index entries small; a whole value longer than this is still found through its parts
+MAX_TOKEN_LENGTH = 100
+MAX_QUERY_WORDS = 8
+
+_WORD_SPLIT = re.compile(r"[^a-z0-9]+")
+_APPLICATION_NUMBER = re.compile(r"vk-?(\d+)")
+
+
+def _normalize(value) -> str:
+    return str(value).strip().lower()
+
+
+def _field_values(doc: dict, path: str) -> list:
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return []
+        value = value.get(part)
+    if value in [None, ""]:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def build_search_tokens(doc: dict) -> list:
+    """Token list for a signup document: each whole value and its alphanumeric words."""
+    tokens = set()
+    for path in SEARCH_FIELDS:
+        for value in _field_values(doc, path):
+            text = _normalize(value)
+            if not text:
+                continue
+            if len(text) <= MAX_TOKEN_LENGTH:
+                tokens.add(text)
+            tokens.update(word for word in _WORD_SPLIT.split(text) if word)
+    return sorted(tokens)
+
+
+def _query_words(search: str) -> list:
+    return [word for word in _WORD_SPLIT.split(_normalize(search)) if word][:MAX_QUERY_WORDS]
+
+
+async def build_search_query(search: str) -> Optional[dict]:
+    """
+    Translate the search box text into a signups filter, or None for an empty search.
+    Exact identifiers short-circuit: VK-1234 is an application number lookup, and an all-digit
+    search that matches an affiliate ID exactly returns just that signup. Anything else matches
+    signups where every word is a prefix of one of their tokens.
+    """
+    text = _normalize(search)
+    words = _query_words(search)
+    if not words:
+        return None
+
+    app_number = _APPLICATION_NUMBER.fullmatch(text)
+    if app_number:
+        return {"application_number": f"VK-{app_number.group(1)}"}
+
+    if text.isdigit():
+        id_query = {"$or": [{"cake_affiliate_id": text}, {"ringba_affiliate_id": text}]}
+        if await db.signups.find_one(id_query, {"_id": 1}):
+            return id_query
+
+    # Anchored and case-sensitive (tokens are already lowercase), so each clause is an index range scan
+    return {"$and": [{"search_tokens": {"$regex": "^" + re.escape(word)}} for word in words]}
+
+
+def build_relevance_stages(search: str) -> list:
+    """
+    $addFields/$sort stages ranking search hits: words that equal a whole token beat prefix-only
+    matches, and an exact match of the full search text (e.g. a complete company name) ranks first.
+    Newest first among equal scores.
+    """
+    text = _normalize(search)
+    words = _query_words(search)
+    tokens = {"$ifNull": ["$search_tokens", []]}
+    return [
+        {
+            "$addFields": {
+                "_search_score": {
+                    "$add": [
+                        {"$size": {"$setIntersection": [tokens, words]}},
+                        {"$cond": [{"$in": [text, tokens]}, len(words) + 1, 0]}
+                    ]
+                }
+            }
+        },
+        {"$sort": {"_search_score": -1, "created_at": -1, "_id": -1}},
+    ]
+
+
+async def refresh_search_tokens(signup_ids: Iterable):
+    """Recompute search_tokens for the given signups after a write that touched searchable fields."""
+    signup_ids = list(signup_ids)
+    if not signup_ids:
+        return
+    operations = []
+    async for doc in db.signups.find({"_id": {"$in": signup_ids}}, SEARCH_PROJECTION):
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"search_tokens": build_search_tokens(doc)}}))
+    if operations:
+        invalidate_counts("signups")
+        try:
+            await db.signups.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # Stale tokens only affect search; the backfill script repairs them
+            print(f"CRITICAL: Failed to refresh signup search tokens: {e}")
+
+
+def touches_search_fields(set_fields: dict) -> bool:
+    return any(
+        key == path or key.startswith(path + ".") or path.startswith(key + ".")
+        for key in set_fields for path in SEARCH_FIELDS
+    )
@@ -0,0 +1,326 @@
+"""
+Materialized signup counters for O(1) dashboard stats.
+
+The signup_counters collection holds one document per distinct
+(referral_id, applicationType, status, cake_api_status, ringba_api_status) combination
+with the number of signups in that bucket. Every route that changes one of those fields
+moves the signup between buckets with $inc, so get_stats reads a handful of small
+documents instead of scanning signups.
+
+Rebuild / reconcile from scratch (reports drift, --apply writes the corrections):
+    python signup_counters.py
+    python signup_counters.py --apply
+"""
+import asyncio
+import copy
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from database import db
+from models import SignupStatus
+from count_cache import invalidate_counts
+from stats_cache import invalidate_stats_cache
+from referrer_leaderboard import apply_leaderboard_change, rename_leaderboard_referrer, leaderboard_ready, boards_for_scope, read_top_referrers
+from stats_utils import WEB_TRAFFIC_TYPES, CALL_TRAFFIC_TYPES, TOP_REFERRERS_LIMIT
+
+# Counter key field -> path on the signup document
+COUNTER_KEY_FIELDS = {
+    "referral_id": "companyInfo.referral_id",
+    "applicationType": "marketingInfo.applicationType",
+    "status": "status",
+    "cake_api_status": "cake_api_status",
+    "ringba_api_status": "ringba_api_status",
+}
+# Also projected so counter documents can carry a display name for the referrer leaderboards
+COUNTER_PROJECTION = {path: 1 for path in COUNTER_KEY_FIELDS.values()}
+COUNTER_PROJECTION["companyInfo.referral"] = 1
+
+# Marker in the shared counters collection, written once a full rebuild has completed
+READY_MARKER_ID = "signup_counters"
+_counters_ready = False
+
+
+def _get_path(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value.value if isinstance(value, SignupStatus) else value
+
+
+def counter_key(doc: dict) -> dict:
+    """Bucket key for a signup document (missing fields count as None)."""
+    return {field: _get_path(doc, path) for field, path in COUNTER_KEY_FIELDS.items()}
+
+
+def _apply_set(doc: dict, set_fields: dict) -> dict:
+    """Return a copy of doc with a $set (dot-notation keys) applied."""
+    after = copy.deepcopy(doc)
+    for path, value in set_fields.items():
+        target = after
+        parts = path.split(".")
+        for part in parts[:-1]:
+            if not isinstance(target.get(part), dict):
+                target[part] = {}
+            target = target[part]
+        target[parts[-1]] = value
+    return after
+
+
+async def apply_counter_change(before: Optional[dict], after: Optional[dict]):
+    """
+    Move one signup from its old bucket to its new one. before=None is an insert, after=None a delete.
+    Failures are logged, not raised: the request must not fail over a counter, and the
+    reconcile command repairs any drift.
+    """
+    before_key = counter_key(before) if before else None
+    after_key = counter_key(after) if after else None
+    if before_key == after_key:
+        return
+
+    operations = []
+    if before_key:
+        operations.append(UpdateOne(before_key, {"$inc": {"count": -1}}))
+    if after_key:
+        referral_name = _get_path(after, "companyInfo.referral")
+        operations.append(UpdateOne(after_key, {"$inc": {"count": 1}, "$set": {"referral": referral_name}}, upsert=True))
+
+    try:
+        await db.signup_counters.bulk_write(operations, ordered=False)
+    except Exception as e:
+        print(f"CRITICAL: Failed to update signup counters: {e}")
+
+
+async def record_signup_created(signup_doc: dict):
+    invalidate_counts("signups")
+    invalidate_stats_cache()
+    await apply_counter_change(None, signup_doc)
+    await apply_leaderboard_change(None, signup_doc)
+
+
+async def update_signup_tracked(signup_id: ObjectId, update: dict) -> Optional[dict]:
+    """
+    update_one replacement for writes that may touch counter key fields (or reassign the referrer).
+    Reads the pre-image atomically with the write and returns it (None when the signup does not exist).
+    """
+    before = await db.signups.find_one_and_update(
+        {"_id": signup_id},
+        update,
+        projection=COUNTER_PROJECTION,
+        return_document=ReturnDocument.BEFORE
+    )
+    if before:
+        invalidate_counts("signups")
+        after = _apply_set(before, update.get("$set", {}))
+        if counter_key(before) != counter_key(after) or _get_path(before, "companyInfo.referral") != _get_path(after, "companyInfo.referral"):
+            # Status, platform status, referrer or application type changed
+            invalidate_stats_cache()
+        await apply_counter_change(before, after)
+        await apply_leaderboard_change(before, after)
+    return before
+
+
+async def delete_signup_tracked(signup_id: ObjectId) -> Optional[dict]:
+    """delete_one replacement that also releases the signup's counter bucket."""
+    deleted = await db.signups.find_one_and_delete({"_id": signup_id}, projection=COUNTER_PROJECTION)
+    if deleted:
+        invalidate_counts("signups")
+        invalidate_stats_cache()
+        await apply_counter_change(deleted, None)
+        await apply_leaderboard_change(deleted, None)
+    return deleted
+
+
+
+async def rename_referral_tracked(old_name: str, new_name: str) -> int:
+    """
+    update_many replacement for renaming a referrer on its signups (companyInfo.referral). The name
+    is not part of any counter key, but counter buckets and leaderboard entries store it for display
+    and referrer stats scopes match on it. Returns the number of signups renamed.
+    """
+    result = await db.signups.update_many(
+        {"companyInfo.referral": old_name},
+        {"$set": {"companyInfo.referral": new_name}}
+    )
+    invalidate_counts("signups")
+    invalidate_stats_cache()
+    try:
+        await db.signup_counters.update_many({"referral": old_name}, {"$set": {"referral": new_name}})
+    except Exception as e:
+        print(f"CRITICAL: Failed to rename referrer in signup counters: {e}")
+    await rename_leaderboard_referrer(old_name, new_name)
+    return result.modified_count
+
+
+# --- Reading stats from the counters ---
+
+async def counters_ready() -> bool:
+    global _counters_ready
+    if not _counters_ready:
+        _counters_ready = await db.counters.find_one({"_id": READY_MARKER_ID}) is not None
+    return _counters_ready
+
+
+def _counter_filter(query: dict) -> Optional[dict]:
+    """
+    Translate a stats scope filter to a signup_counters filter.
+    Only unscoped and application-type scoped (admin) queries are served from counters; referral scopes
+    carry a name fallback the counters cannot express and are selective enough for the aggregation.
+    """
+    counter_query = {}
+    for key, value in query.items():
+        if key != "marketingInfo.applicationType":
+            return None
+        counter_query["applicationType"] = value
+    counter_query["count"] = {"$gt": 0}
+    return counter_query
+
+
+def _stats_from_buckets(buckets: list) -> dict:
+    totals = {"total": 0, "pending": 0, "approved": 0, "rejected": 0}
+    platforms = {
+        "cake_stats": ("cake_api_status", "Web Traffic"),
+        "ringba_stats": ("ringba_api_status", "Call Traffic"),
+    }
+    platform_totals = {name: {"total": 0, "approved": 0, "rejected": 0, "pending": 0} for name in platforms}
+
+    for bucket in buckets:
+        n = bucket["count"]
+        status = bucket.get("status")
+        app_type = bucket.get("applicationType")
+
+        totals["total"] += n
+        if status in [SignupStatus.PENDING, SignupStatus.REQUESTED_FOR_APPROVAL]:
+            totals["pending"] += n
+        elif status == SignupStatus.APPROVED:
+            totals["approved"] += n
+        elif status == SignupStatus.REJECTED:
+            totals["rejected"] += n
+
+        # Same predicates as the per-platform counters in stats_utils
+        for name, (api_field, platform_type) in platforms.items():
+            if app_type not in [platform_type, "Both"]:
+                continue
+            api_status = bucket.get(api_field)
+            single_type = app_type == platform_type
+            counts = platform_totals[name]
+            counts["total"] += n
+            if api_status == "APPROVED" or (single_type and status == SignupStatus.APPROVED and api_status is None):
+                counts["approved"] += n
+            if api_status == "REJECTED" or (single_type and status == SignupStatus.REJECTED and api_status is None):
+                counts["rejected"] += n
+            if (api_status == "FAILED"
+                    or (app_type == "Both" and api_status is None)
+                    or (single_type and status in [SignupStatus.PENDING, SignupStatus.REQUESTED_FOR_APPROVAL])):
+                counts["pending"] += n
+
+    return {**totals, **platform_totals}
+
+
+async def _top_referrers_from_buckets(buckets: list, app_types: Optional[list] = None) -> list:
+    by_referrer = {}
+    for bucket in buckets:
+        referral_id = bucket.get("referral_id")
+        if referral_id in [None, ""]:
+            continue
+        if app_types and bucket.get("applicationType") not in app_types:
+            continue
+        entry = by_referrer.setdefault(str(referral_id), {"count": 0, "name": None})
+        entry["count"] += bucket["count"]
+        entry["name"] = entry["name"] or bucket.get("referral")
+
+    top = sorted(by_referrer.items(), key=lambda item: item[1]["count"], reverse=True)[:TOP_REFERRERS_LIMIT]
+    object_ids = [ObjectId(rid) for rid, _ in top if ObjectId.is_valid(rid)]
+    names = {}
+    if object_ids:
+        async for u in db.users.find({"_id": {"$in": object_ids}}, {"full_name": 1}):
+            names[str(u["_id"])] = u.get("full_name")
+
+    return [{"name": names.get(rid) or entry["name"] or "Unknown", "count": entry["count"]} for rid, entry in top]
+
+
+async def compute_stats_from_counters(query: dict) -> Optional[dict]:
+    """/admin/stats response built from signup_counters, or None when the scope cannot be served from them."""
+    counter_query = _counter_filter(query)
+    if counter_query is None or not await counters_ready():
+        return None
+
+    buckets = await db.signup_counters.find(counter_query, {"_id": 0}).to_list(length=None)
+    stats = _stats_from_buckets(buckets)
+
+    boards = boards_for_scope(query)
+    if boards and await leaderboard_ready():
+        stats.update(await read_top_referrers(boards))
+    else:
+        stats["top_referrers"] = await _top_referrers_from_buckets(buckets)
+        stats["top_cake_referrers"] = await _top_referrers_from_buckets(buckets, WEB_TRAFFIC_TYPES)
+        stats["top_ringba_referrers"] = await _top_referrers_from_buckets(buckets, CALL_TRAFFIC_TYPES)
+    return stats
+
+
+# --- Rebuild / reconcile ---
+
+def _key_tuple(key: dict) -> tuple:
+    return tuple(key.get(field) for field in COUNTER_KEY_FIELDS)
+
+
+async def reconcile_counters(apply: bool = False) -> list:
+    """
+    Recompute every bucket from the signups collection and compare with signup_counters.
+    Returns the drifting buckets as (key, expected, actual); with apply=True the counters are corrected
+    in place (set to the expected count) so readers never see an empty collection.
+    """
+    group_id = {field: {"$ifNull": [f"${path}", None]} for field, path in COUNTER_KEY_FIELDS.items()}
+    pipeline = [
+        {"$group": {"_id": group_id, "count": {"$sum": 1}, "referral": {"$last": "$companyInfo.referral"}}}
+    ]
+    expected = {}
+    async for row in db.signups.aggregate(pipeline, allowDiskUse=True):
+        expected[_key_tuple(row["_id"])] = (row["_id"], row["count"], row.get("referral"))
+
+    actual = {}
+    async for doc in db.signup_counters.find({}):
+        actual[_key_tuple(doc)] = doc.get("count", 0)
+
+    drift = []
+    operations = []
+    for key_tuple, (key, count, referral) in expected.items():
+        current = actual.get(key_tuple, 0)
+        if current != count:
+            drift.append((key, count, current))
+            operations.append(UpdateOne(key, {"$set": {"count": count, "referral": referral}}, upsert=True))
+    for key_tuple, current in actual.items():
+        if key_tuple not in expected and current != 0:
+            key = dict(zip(COUNTER_KEY_FIELDS, key_tuple))
+            drift.append((key, 0, current))
+            operations.append(UpdateOne(key, {"$set": {"count": 0}}))
+
+    if apply:
+        from db_indexes import apply_collection_indexes
+        await apply_collection_indexes("signup_counters")
+        if operations:
+            await db.signup_counters.bulk_write(operations, ordered=False)
+        await db.signup_counters.delete_many({"count": {"$lte": 0}})
+        await db.counters.update_one(
+            {"_id": READY_MARKER_ID},
+            {"$set": {"rebuilt_at": datetime.utcnow()}},
+            upsert=True
+        )
+    return drift
+
+
+async def main(apply: bool):
+    drift = await reconcile_counters(apply=apply)
+    for key, expected_count, actual_count in drift:
+        print(f"  [DRIFT] {key}: expected {expected_count}, counted {actual_count}")
+    print(f"\n{len(drift)} drifting buckets. {'Corrected.' if apply else 'Run with --apply to correct.'}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Rebuild / reconcile the signup_counters collection")
+    parser.add_argument("--apply", action="store_true", help="write the recomputed counts")
+    args = parser.parse_args()
+    asyncio.run(main(args.apply))
@@ -0,0 +1,321 @@
+"""
+SMTP client and session pool on asyncio streams, for SMTP configs with transport "asyncio".
+
+The default "thread" transport (smtp_pool) runs smtplib in executor threads: every in-flight send
+holds a thread, and a slow server ties up the default executor that other run_in_executor work
+shares. This transport sends on the event loop itself:
+    - STARTTLS upgrades the open connection with loop.start_tls (no blocking handshake)
+    - AUTH PLAIN, or AUTH LOGIN when PLAIN is not offered
+    - MAIL/RCPT/DATA are written in one round trip when the server advertises PIPELINING
+The pool follows the same policies as smtp_pool (MAX_CONNECTIONS, NOOP_AFTER, IDLE_TIMEOUT,
+rotation on config change, one retry on a dropped reused session) and raises the smtplib
+exception types, so callers and the outbox handle both transports the same way.
+"""
+import asyncio
+import base64
+import smtplib
+import socket
+import ssl
+import time
+
+from smtp_pool import MAX_CONNECTIONS, IDLE_TIMEOUT, NOOP_AFTER, SMTP_TIMEOUT, _config_key
+
+LOCAL_HOSTNAME = socket.getfqdn()
+
+
+class _ReplyProtocol(asyncio.Protocol):
+    """Splits the byte stream into complete (code, text) replies, joining multi-line ones."""
+
+    def __init__(self):
+        self.transport = None
+        self._buffer = bytearray()
+        self._lines = []
+        self._replies = asyncio.Queue()
+        self._closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data: bytes):
+        self._buffer += data
+        while True:
+            end = self._buffer.find(b"\r\n")
+            if end < 0:
+                return
+            line = bytes(self._buffer[:end])
+            del self._buffer[:end + 2]
+            self._lines.append(line[4:])
+            if line[3:4] != b"-":
+                try:
+                    code = int(line[:3])
+                except ValueError:
+                    code = -1
+                self._replies.put_nowait((code, b"\n".join(self._lines)))
+                self._lines = []
+
+    def connection_lost(self, exc):
+        self._closed = True
+        self._replies.put_nowait(None)
+
+    async def read_reply(self) -> tuple:
+        reply = await asyncio.wait_for(self._replies.get(), SMTP_TIMEOUT)
+        if reply is None:
+            self._replies.put_nowait(None)  # every later read fails the same way
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return reply
+
+
+class AsyncSMTP:
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.features = {}
+        self._protocol = None
+
+    @property
+    def transport(self):
+        return self._protocol.transport
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        self._protocol = _ReplyProtocol()
+        await asyncio.wait_for(
+            loop.create_connection(lambda: self._protocol, self.host, self.port), SMTP_TIMEOUT
+        )
+        code, message = await self._protocol.read_reply()
+        if code != 220:
+            self.close()
+            raise smtplib.SMTPConnectError(code, message)
+
+    def _write(self, *commands: str):
+        if self._protocol._closed:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.transport.write(b"".join(f"{command}\r\n".encode("ascii") for command in commands))
+
+    async def command(self, command: str) -> tuple:
+        self._write(command)
+        return await self._protocol.read_reply()
+
+    async def ehlo(self):
+        code, message = await self.command(f"EHLO {LOCAL_HOSTNAME}")
+        if code != 250:
+            raise smtplib.SMTPHeloError(code, message)
+        self.features = {}
+        for line in message.decode("latin-1").split("\n")[1:]:
+            keyword, _, params = line.partition(" ")
+            self.features[keyword.lower()] = params.strip()
+
+    async def starttls(self):
+        if "starttls" not in self.features:
+            raise smtplib.SMTPNotSupportedError("STARTTLS extension not supported by server.")
+        code, message = await self.command("STARTTLS")
+        if code != 220:
+            raise smtplib.SMTPResponseException(code, message)
+        # Same context smtplib.starttls() builds by default
+        context = ssl._create_stdlib_context()
+        loop = asyncio.get_running_loop()
+        self._protocol.transport = await asyncio.wait_for(
+            loop.start_tls(self.transport, self._protocol, context, server_hostname=self.host), SMTP_TIMEOUT
+        )
+        # The pre-TLS capabilities must not be trusted (RFC 3207)
+        await self.ehlo()
+
+    async def login(self, username: str, password: str):
+        mechanisms = self.features.get("auth", "").upper().split()
+        if "PLAIN" in mechanisms:
+            token = base64.b64encode(f"\0{username}\0{password}".encode()).decode("ascii")
+            code, message = await self.command(f"AUTH PLAIN {token}")
+        elif "LOGIN" in mechanisms:
+            code, message = await self.command("AUTH LOGIN")
+            for value in (username, password):
+                if code != 334:
+                    break
+                code, message = await self.command(base64.b64encode(value.encode()).decode("ascii"))
+        else:
+            raise smtplib.SMTPException("No suitable authentication method found.")
+        if code not in (235, 503):  # 503: already authenticated
+            raise smtplib.SMTPAuthenticationError(code, message)
+
+    async def sendmail(self, from_addr: str, to_addrs, message: str) -> dict:
+        """Like smtplib.SMTP.sendmail: returns refused recipients, raises if none was accepted."""
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        data = smtplib.quotedata(message).encode("ascii")
+        if not data.endswith(b"\r\n"):
+            data += b"\r\n"
+        commands = [f"MAIL FROM:{smtplib.quoteaddr(from_addr)}"]
+        commands += [f"RCPT TO:{smtplib.quoteaddr(addr)}" for addr in to_addrs]
+        commands.append("DATA")
+
+        if "pipelining" in self.features:
+            self._write(*commands)
+            replies = [await self._protocol.read_reply() for _ in commands]
+        else:
+            replies = []
+            for command in commands:
+                replies.append(await self.command(command))
+                if command.startswith("MAIL") and replies[-1][0] != 250:
+                    break
+
+        code, response = replies[0]
+        if code != 250:
+            if len(replies) == len(commands) and replies[-1][0] == 354:
+                await self._abort_data()
+            await self._rset()
+            raise smtplib.SMTPSenderRefused(code, response, from_addr)
+
+        refused = {
+            addr: reply for addr, reply in zip(to_addrs, replies[1:-1]) if reply[0] not in (250, 251)
+        }
+        code, response = replies[-1]
+        if len(refused) == len(to_addrs):
+            if code == 354:
+                await self._abort_data()
+            await self._rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        if code != 354:
+            await self._rset()
+            raise smtplib.SMTPDataError(code, response)
+
+        self.transport.write(data + b".\r\n")
+        code, response = await self._protocol.read_reply()
+        if code != 250:
+            await self._rset()
+            raise smtplib.SMTPDataError(code, response)
+        return refused
+
+    async def _abort_data(self):
+        # The server is waiting for a body; an empty one ends the transaction so RSET can follow
+        self.transport.write(b".\r\n")
+        await self._protocol.read_reply()
+
+    async def _rset(self):
+        try:
+            await self.command("RSET")
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+    async def noop(self) -> int:
+        return (await self.command("NOOP"))[0]
+
+    async def quit(self):
+        try:
+            await self.command("QUIT")
+        finally:
+            self.close()
+
+    def close(self):
+        if self._protocol and self._protocol.transport:
+            self._protocol.transport.close()
+
+
+async def _close(server: AsyncSMTP):
+    try:
+        await server.quit()
+    except Exception:
+        server.close()
+
+
+class AsyncSMTPConnectionPool:
+    def __init__(self, max_connections: int = MAX_CONNECTIONS):
+        self._max_connections = max_connections
+        self._slots = None  # asyncio.Semaphore, created on first use so it belongs to the running loop
+        self._key = None
+        self._idle = []  # [(server, last_used)], most recently used last
+        self._metrics = {"opened": 0, "reused": 0, "sent": 0, "failed": 0, "discarded": 0}
+
+    async def _connect(self, config: dict) -> AsyncSMTP:
+        server = AsyncSMTP(config["host"], config["port"])
+        await server.connect()
+        try:
+            await server.ehlo()
+            await server.starttls()
+            await server.login(config["username"], config["password"])
+        except Exception:
+            server.close()
+            raise
+        self._metrics["opened"] += 1
+        return server
+
+    async def _checkout(self, config: dict, key: tuple) -> tuple:
+        """(server, reused). Opens a new session when no healthy idle one is available."""
+        stale = []
+        candidate = None
+        if key != self._key:
+            # Active config changed: sessions of the old one are never reused
+            stale = [server for server, _ in self._idle]
+            self._idle, self._key = [], key
+        while self._idle:
+            server, last_used = self._idle.pop()
+            if time.monotonic() - last_used > IDLE_TIMEOUT:
+                stale.append(server)
+                continue
+            candidate = (server, last_used)
+            break
+        for server in stale:
+            await _close(server)
+
+        if candidate:
+            server, last_used = candidate
+            if time.monotonic() - last_used <= NOOP_AFTER or await self._is_healthy(server):
+                self._metrics["reused"] += 1
+                return server, True
+            self._discard(server)
+        return await self._connect(config), False
+
+    async def _is_healthy(self, server: AsyncSMTP) -> bool:
+        try:
+            return await server.noop() == 250
+        except Exception:
+            return False
+
+    async def _checkin(self, key: tuple, server: AsyncSMTP):
+        if key == self._key:
+            self._idle.append((server, time.monotonic()))
+            return
+        await _close(server)
+
+    def _discard(self, server: AsyncSMTP):
+        self._metrics["discarded"] += 1
+        server.close()
+
+    async def send(self, config: dict, from_addr: str, to_addrs, message: str):
+        """Send one message on a pooled session. Raises on failure like smtplib.sendmail."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_connections)
+        key = _config_key(config)
+        async with self._slots:
+            for attempt in range(2):
+                server, reused = await self._checkout(config, key)
+                try:
+                    await server.sendmail(from_addr, to_addrs, message)
+                except smtplib.SMTPRecipientsRefused:
+                    # The session itself is fine
+                    await self._checkin(key, server)
+                    self._metrics["failed"] += 1
+                    raise
+                except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                    self._discard(server)
+                    if reused and attempt == 0:
+                        continue
+                    self._metrics["failed"] += 1
+                    raise e
+                except BaseException:
+                    # Includes cancellation mid-transaction: the session state is unknown
+                    self._discard(server)
+                    self._metrics["failed"] += 1
+                    raise
+                await self._checkin(key, server)
+                self._metrics["sent"] += 1
+                return
+
+    async def close_all(self):
+        idle, self._idle = self._idle, []
+        for server, _ in idle:
+            await _close(server)
+
+    def metrics(self) -> dict:
+        return {**self._metrics, "idle": len(self._idle)}
+
+
+async_smtp_pool = AsyncSMTPConnectionPool()
@@ -0,0 +1,142 @@
+"""
+Pooled SMTP sessions for email_utils.
+
+Opening a session costs a TCP connect, STARTTLS and AUTH, which used to be paid for every
+recipient. The pool keeps authenticated sessions open and hands them to the sending threads:
+    - at most MAX_CONNECTIONS sessions per worker, so bulk sends cannot open unbounded sessions
+    - a session idle for more than NOOP_AFTER seconds is checked with NOOP before reuse
+    - a session idle for more than IDLE_TIMEOUT is closed instead of reused
+      (servers drop idle clients anyway, typically after a few minutes)
+    - sessions are tied to the SMTP config they were opened with; when the active config
+      changes, the idle sessions of the old one are closed
+A send that fails because a reused session was dropped is retried once on a fresh one.
+
+Everything here is blocking and runs in executor threads (see email_utils.send_email).
+"""
+import smtplib
+import threading
+import time
+
+MAX_CONNECTIONS = 4
+IDLE_TIMEOUT = 60  # seconds
+NOOP_AFTER = 5  # seconds
+SMTP_TIMEOUT = 30  # seconds, per socket operation
+
+
+def _config_key(config: dict) -> tuple:
+    return (config["host"], config["port"], config["username"], config["password"])
+
+
+def _close(server: smtplib.SMTP):
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+
+class SMTPConnectionPool:
+    def __init__(self, max_connections: int = MAX_CONNECTIONS):
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._key = None
+        self._idle = []  # [(server, last_used)], most recently used last
+        self._metrics = {"opened": 0, "reused": 0, "sent": 0, "failed": 0, "discarded": 0}
+
+    def _connect(self, config: dict) -> smtplib.SMTP:
+        server = smtplib.SMTP(config["host"], config["port"], timeout=SMTP_TIMEOUT)
+        try:
+            server.starttls()
+            server.login(config["username"], config["password"])
+        except Exception:
+            server.close()
+            raise
+        self._record("opened")
+        return server
+
+    def _checkout(self, config: dict, key: tuple) -> tuple:
+        """(server, reused). Opens a new session when no healthy idle one is available."""
+        stale = []
+        candidate = None
+        with self._lock:
+            if key != self._key:
+                # Active config changed: sessions of the old one are never reused
+                stale = [server for server, _ in self._idle]
+                self._idle, self._key = [], key
+            while self._idle:
+                server, last_used = self._idle.pop()
+                if time.monotonic() - last_used > IDLE_TIMEOUT:
+                    stale.append(server)
+                    continue
+                candidate = (server, last_used)
+                break
+        for server in stale:
+            _close(server)
+
+        if candidate:
+            server, last_used = candidate
+            if time.monotonic() - last_used <= NOOP_AFTER or self._is_healthy(server):
+                self._record("reused")
+                return server, True
+            self._discard(server)
+        return self._connect(config), False
+
+    def _is_healthy(self, server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkin(self, key: tuple, server: smtplib.SMTP):
+        with self._lock:
+            if key == self._key:
+                self._idle.append((server, time.monotonic()))
+                return
+        _close(server)
+
+    def _discard(self, server: smtplib.SMTP):
+        self._record("discarded")
+        server.close()
+
+    def send(self, config: dict, from_addr: str, to_addrs, message: str):
+        """Send one message on a pooled session. Raises on failure like smtplib.sendmail."""
+        key = _config_key(config)
+        with self._slots:
+            for attempt in range(2):
+                server, reused = self._checkout(config, key)
+                try:
+                    server.sendmail(from_addr, to_addrs, message)
+                except smtplib.SMTPRecipientsRefused:
+                    # The session itself is fine
+                    self._checkin(key, server)
+                    self._record("failed")
+                    raise
+                except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                    self._discard(server)
+                    if reused and attempt == 0:
+                        continue
+                    self._record("failed")
+                    raise e
+                except Exception:
+                    self._discard(server)
+                    self._record("failed")
+                    raise
+                self._checkin(key, server)
+                self._record("sent")
+                return
+
+    def _record(self, outcome: str):
+        with self._lock:
+            self._metrics[outcome] += 1
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            _close(server)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {**self._metrics, "idle": len(self._idle)}
+
+
+smtp_pool = SMTPConnectionPool()
@@ -0,0 +1,178 @@
+"""
+Local SMTP stand-in for development and testing of outgoing mail.
+
+Speaks enough SMTP for email_utils: EHLO/HELO, STARTTLS (throwaway self-signed certificate),
+AUTH PLAIN/LOGIN (any credentials), MAIL, RCPT, DATA, RSET, NOOP and QUIT, and advertises
+PIPELINING (commands are read line by line, so pipelined batches just work). Messages are not
+delivered; each one is logged with the session it arrived on, so connection reuse is visible.
+    python smtp_sink.py                  # listens on 127.0.0.1:2525
+    python smtp_sink.py --port 1025 --print-body
+
+Point the app at it with SMTP_HOST=127.0.0.1 SMTP_PORT=2525 (any SMTP_USER/SMTP_PASSWORD), or an
+SMTP config with the same host and port.
+"""
+import argparse
+import base64
+import datetime
+import itertools
+import socket
+import socketserver
+import ssl
+import tempfile
+import threading
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+
+def _self_signed_context() -> ssl.SSLContext:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    with tempfile.NamedTemporaryFile("wb", suffix=".pem") as pem:
+        pem.write(cert.public_bytes(serialization.Encoding.PEM))
+        pem.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()
+        ))
+        pem.flush()
+        context.load_cert_chain(pem.name)
+    return context
+
+
+class SinkStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = itertools.count(1)
+        self.messages = 0
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        # Replies to a pipelined batch are separate small writes; without this, Nagle holds them
+        # back until the client's delayed ACK (~40 ms), which real servers do not do
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().setup()
+        self.session = next(self.server.stats.sessions)
+        self.sent_in_session = 0
+
+    def reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode())
+        self.wfile.flush()
+
+    def readline(self) -> str:
+        return self.rfile.readline().decode("utf-8", errors="replace").rstrip("\r\n")
+
+    def start_tls(self):
+        self.reply("220 Ready to start TLS")
+        self.wfile.flush()
+        self.connection = self.request = self.server.tls_context.wrap_socket(self.request, server_side=True)
+        self.rfile = self.connection.makefile("rb")
+        self.wfile = self.connection.makefile("wb")
+
+    def handle(self):
+        self.reply("220 smtp-sink ESMTP")
+        mail_from, rcpt_to = None, []
+        while True:
+            line = self.readline()
+            if not line and self.rfile.closed:
+                return
+            verb, _, arg = line.partition(" ")
+            verb = verb.upper()
+            if verb == "EHLO":
+                self.wfile.write(b"250-smtp-sink\r\n250-STARTTLS\r\n250-AUTH PLAIN LOGIN\r\n250-PIPELINING\r\n250 8BITMIME\r\n")
+                self.wfile.flush()
+            elif verb == "HELO":
+                self.reply("250 smtp-sink")
+            elif verb == "STARTTLS":
+                self.start_tls()
+            elif verb == "AUTH":
+                mechanism, _, initial = arg.partition(" ")
+                if mechanism.upper() == "LOGIN":
+                    self.reply("334 " + base64.b64encode(b"Username:").decode())
+                    self.readline()
+                    self.reply("334 " + base64.b64encode(b"Password:").decode())
+                    self.readline()
+                elif not initial:
+                    self.reply("334 ")
+                    self.readline()
+                self.reply("235 Authentication successful")
+            elif verb == "MAIL":
+                mail_from, rcpt_to = arg, []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                rcpt_to.append(arg)
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while True:
+                    data_line = self.readline()
+                    if data_line == ".":
+                        break
+                    body.append(data_line[1:] if data_line.startswith("..") else data_line)
+                self.sent_in_session += 1
+                with self.server.stats.lock:
+                    self.server.stats.messages += 1
+                    total = self.server.stats.messages
+                recipients = ", ".join(r.split(":", 1)[-1] for r in rcpt_to)
+                if not self.server.quiet:
+                    print(f"[session {self.session} msg {self.sent_in_session} / total {total}] {mail_from} -> {recipients}")
+                if self.server.print_body:
+                    print("\n".join(body) + "\n")
+                self.reply("250 OK: queued")
+            elif verb == "RSET":
+                mail_from, rcpt_to = None, []
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            elif not line:
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address: tuple, print_body: bool = False, quiet: bool = False):
+        super().__init__(address, SMTPSinkHandler)
+        self.tls_context = _self_signed_context()
+        self.stats = SinkStats()
+        self.print_body = print_body
+        self.quiet = quiet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--print-body", action="store_true")
+    args = parser.parse_args()
+
+    with SMTPSink((args.host, args.port), print_body=args.print_body) as server:
+        print(f"SMTP sink listening on {args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
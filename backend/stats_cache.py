@@ -0,0 +1,31 @@
+"""
+Per-scope cache for /admin/stats.
+
+The scope filter built by stats_utils.build_stats_scope_query (role, referrer and application
+permission) is the cache key, so users with the same view share one entry. Concurrent misses for a
+scope share a single computation (async_cache.AsyncTTLCache). Tracked signup writes that move a
+signup between status / referrer / application type buckets drop every entry; writes from other
+workers are picked up when the entry expires.
+"""
+import json
+from typing import Awaitable, Callable
+from async_cache import AsyncTTLCache
+
+STATS_CACHE_TTL = 30  # seconds
+# One entry per distinct scope: a handful of admin scopes plus one per referrer
+MAX_CACHED_SCOPES = 500
+
+stats_cache = AsyncTTLCache("admin_stats", ttl=STATS_CACHE_TTL, max_entries=MAX_CACHED_SCOPES)
+
+
+def _scope_key(query: dict) -> str:
+    return json.dumps(query, sort_keys=True, default=str)
+
+
+async def get_cached_stats(query: dict, compute: Callable[[dict], Awaitable[dict]]) -> dict:
+    return await stats_cache.get_or_load(_scope_key(query), lambda: compute(query))
+
+
+def invalidate_stats_cache():
+    # Also discards computations that predate the write
+    stats_cache.clear()
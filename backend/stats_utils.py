@@ -0,0 +1,185 @@
+from bson import ObjectId
+from database import db
+from models import User, UserRole, SignupStatus, ApplicationPermission
+
+WEB_TRAFFIC_TYPES = ["Web Traffic", "Both"]
+CALL_TRAFFIC_TYPES = ["Call Traffic", "Both"]
+TOP_REFERRERS_LIMIT = 5
+
+
+def build_stats_scope_query(user: User) -> dict:
+    """
+    Build the signups filter that scopes dashboard stats to what the user may see
+    (referral ownership for non-admins, application permission for everyone but super admins).
+    """
+    query = {}
+
+    # Role based filtering for stats
+    if user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        # Filter by referral_id if available (more robust), falling back to name for old data
+        if hasattr(user, '_id') and user._id:
+            query["$or"] = [
+                {"companyInfo.referral_id": {"$in": [ObjectId(str(user._id)), str(user._id)]}},
+                # Fallback for old data without ID
+                {"companyInfo.referral": user.full_name}
+            ]
+        elif user.full_name:
+            query["companyInfo.referral"] = user.full_name
+        else:
+            query["companyInfo.referral"] = "NON_EXISTENT_REFERRAL"
+
+    # Application permission filtering
+    # Super admin sees everything, no filtering needed
+    if user.role != UserRole.SUPER_ADMIN and hasattr(user, 'application_permission'):
+        if user.application_permission == ApplicationPermission.WEB_TRAFFIC:
+            # Show Web Traffic signups and Both signups
+            query["marketingInfo.applicationType"] = {"$in": WEB_TRAFFIC_TYPES}
+        elif user.application_permission == ApplicationPermission.CALL_TRAFFIC:
+            # Show Call Traffic signups and Both signups
+            query["marketingInfo.applicationType"] = {"$in": CALL_TRAFFIC_TYPES}
+        # If user permission is BOTH, show all signups (no additional filtering needed)
+
+    return query
+
+
+# --- Aggregation expression helpers ---
+
+def _count_if(condition: dict) -> dict:
+    return {"$sum": {"$cond": [condition, 1, 0]}}
+
+
+def _is_null(field: str) -> dict:
+    # Matches both missing and explicit null, like {field: None} does in a find filter
+    return {"$eq": [{"$ifNull": [f"${field}", None]}, None]}
+
+
+def _platform_counters(prefix: str, api_status_field: str, app_type: str) -> dict:
+    """
+    Per-platform counters. Same semantics as the old count_documents queries:
+    an explicit platform status wins, single-type applications fall back to the global status.
+    """
+    app = "$marketingInfo.applicationType"
+    api_status = f"${api_status_field}"
+    in_platform = {"$in": [app, [app_type, "Both"]]}
+    single_type = {"$eq": [app, app_type]}
+    no_api_status = _is_null(api_status_field)
+
+    approved = {"$or": [
+        {"$eq": [api_status, "APPROVED"]},
+        {"$and": [single_type, {"$eq": ["$status", SignupStatus.APPROVED]}, no_api_status]}
+    ]}
+    rejected = {"$or": [
+        {"$eq": [api_status, "REJECTED"]},
+        {"$and": [single_type, {"$eq": ["$status", SignupStatus.REJECTED]}, no_api_status]}
+    ]}
+    pending = {"$or": [
+        # Explicitly FAILED means Pending/Needs Action
+        {"$eq": [api_status, "FAILED"]},
+        # For Both: no platform status yet means Pending
+        {"$and": [{"$eq": [app, "Both"]}, no_api_status]},
+        # For Single: global Pending or Requested
+        {"$and": [single_type, {"$in": ["$status", [SignupStatus.PENDING, SignupStatus.REQUESTED_FOR_APPROVAL]]}]}
+    ]}
+
+    return {
+        f"{prefix}_total": _count_if(in_platform),
+        f"{prefix}_approved": _count_if({"$and": [in_platform, approved]}),
+        f"{prefix}_rejected": _count_if({"$and": [in_platform, rejected]}),
+        f"{prefix}_pending": _count_if({"$and": [in_platform, pending]}),
+    }
+
+
+def _top_referrers_stages(app_types: list = None) -> list:
+    stages = []
+    if app_types:
+        stages.append({"$match": {"marketingInfo.applicationType": {"$in": app_types}}})
+    stages += [
+        {
+            "$group": {
+                "_id": "$companyInfo.referral_id",
+                "name": {"$first": "$companyInfo.referral"},  # Fallback name
+                "count": {"$sum": 1}
+            }
+        },
+        {"$match": {"_id": {"$nin": [None, ""]}}},  # Exclude empty referrers
+        # Rank before the lookup so only the top rows hit the users collection
+        {"$sort": {"count": -1}},
+        {"$limit": TOP_REFERRERS_LIMIT},
+        {
+            "$lookup": {
+                "from": "users",
+                "let": {"referrer_id": {"$convert": {"input": "$_id", "to": "objectId", "onError": None, "onNull": None}}},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", "$$referrer_id"]}}},
+                    {"$project": {"full_name": 1}}
+                ],
+                "as": "user_info"
+            }
+        },
+        {
+            "$project": {
+                "name": {"$ifNull": [{"$arrayElemAt": ["$user_info.full_name", 0]}, "$name"]},
+                "count": 1
+            }
+        },
+        {"$sort": {"count": -1}}
+    ]
+    return stages
+
+
+def build_stats_pipeline(query: dict) -> list:
+    """Single $facet pipeline producing every dashboard counter and the three referrer leaderboards."""
+    counters = {
+        "_id": None,
+        "total": {"$sum": 1},
+        "pending": _count_if({"$in": ["$status", [SignupStatus.PENDING, SignupStatus.REQUESTED_FOR_APPROVAL]]}),
+        "approved": _count_if({"$eq": ["$status", SignupStatus.APPROVED]}),
+        "rejected": _count_if({"$eq": ["$status", SignupStatus.REJECTED]}),
+        **_platform_counters("cake", "cake_api_status", "Web Traffic"),
+        **_platform_counters("ringba", "ringba_api_status", "Call Traffic"),
+    }
+
+    return [
+        {"$match": query},
+        {
+            "$facet": {
+                "counters": [{"$group": counters}],
+                "top_referrers": _top_referrers_stages(),
+                "top_cake_referrers": _top_referrers_stages(WEB_TRAFFIC_TYPES),
+                "top_ringba_referrers": _top_referrers_stages(CALL_TRAFFIC_TYPES),
+            }
+        }
+    ]
+
+
+def _format_referrers(rows: list) -> list:
+    return [{"name": row.get("name") or "Unknown", "count": row["count"]} for row in rows]
+
+
+async def compute_stats(query: dict) -> dict:
+    """Run the stats pipeline for an already scoped signups filter and shape the /admin/stats response."""
+    cursor = db.signups.aggregate(build_stats_pipeline(query), allowDiskUse=True)
+    result = await cursor.to_list(length=1)
+    facets = result[0] if result else {}
+
+    counters = (facets.get("counters") or [{}])[0]
+
+    def platform(prefix: str) -> dict:
+        return {
+            "total": counters.get(f"{prefix}_total", 0),
+            "approved": counters.get(f"{prefix}_approved", 0),
+            "rejected": counters.get(f"{prefix}_rejected", 0),
+            "pending": counters.get(f"{prefix}_pending", 0)
+        }
+
+    return {
+        "total": counters.get("total", 0),
+        "pending": counters.get("pending", 0),
+        "approved": counters.get("approved", 0),
+        "rejected": counters.get("rejected", 0),
+        "cake_stats": platform("cake"),
+        "ringba_stats": platform("ringba"),
+        "top_referrers": _format_referrers(facets.get("top_referrers", [])),
+        "top_cake_referrers": _format_referrers(facets.get("top_cake_referrers", [])),
+        "top_ringba_referrers": _format_referrers(facets.get("top_ringba_referrers", []))
+    }
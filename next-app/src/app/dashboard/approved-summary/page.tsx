@@ -109,6 +109,8 @@ function ApprovedSummaryContent() {
             params.append('limit', limit.toString());
             params.append('sort_by', sortBy);
             params.append('sort_order', sortOrder.toString());
+            // Q/A responses are not part of the list summary unless asked for
+            params.append('include_qa', 'true');
 
             const queryString = params.toString();
             if (queryString) url += `&${queryString}`;
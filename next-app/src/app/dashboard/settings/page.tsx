@@ -36,7 +36,7 @@ export default function SettingsPage() {
     const [isSmtpDialogOpen, setIsSmtpDialogOpen] = useState(false);
     const [currentSmtp, setCurrentSmtp] = useState<any | null>(null);
     const [smtpForm, setSmtpForm] = useState({
-        name: '', host: '', port: 587, username: '', password: '', from_name: '', from_email: '', reply_to_email: '', is_active: false
+        name: '', host: '', port: 587, username: '', password: '', from_name: '', from_email: '', reply_to_email: '', transport: 'thread', is_active: false
     });
     const [isTestingSmtp, setIsTestingSmtp] = useState(false);
 
@@ -148,6 +148,9 @@ export default function SettingsPage() {
         })
             .then(async res => {
                 if (res && res.ok) {
+                    // The change signed out every session, this one included: switch to the new token
+                    const data = await res.json();
+                    if (data.access_token) await update({ accessToken: data.access_token });
                     alert("Password updated successfully");
                     setPassword({ current: '', new: '', confirm: '' });
                 } else {
@@ -238,12 +241,13 @@ export default function SettingsPage() {
                 from_name: config.from_name || '',
                 from_email: config.from_email,
                 reply_to_email: config.reply_to_email || '',
+                transport: config.transport || 'thread',
                 is_active: config.is_active
             });
         } else {
             setCurrentSmtp(null);
             setSmtpForm({
-                name: '', host: '', port: 587, username: '', password: '', from_name: '', from_email: '', reply_to_email: '', is_active: false
+                name: '', host: '', port: 587, username: '', password: '', from_name: '', from_email: '', reply_to_email: '', transport: 'thread', is_active: false
             });
         }
         setIsSmtpDialogOpen(true);
@@ -846,6 +850,21 @@ export default function SettingsPage() {
                                         <Label htmlFor="reply_to_email">Reply-To Email (Optional)</Label>
                                         <Input id="reply_to_email" value={smtpForm.reply_to_email} onChange={e => setSmtpForm({ ...smtpForm, reply_to_email: e.target.value })} placeholder="support@example.com" />
                                     </div>
+                                    <div className="space-y-2">
+                                        <Label htmlFor="transport">Transport</Label>
+                                        <Select
+                                            value={smtpForm.transport}
+                                            onValueChange={(value) => setSmtpForm({ ...smtpForm, transport: value })}
+                                        >
+                                            <SelectTrigger id="transport">
+                                                <SelectValue placeholder="Select transport" />
+                                            </SelectTrigger>
+                                            <SelectContent>
+                                                <SelectItem value="thread">Thread pool (smtplib)</SelectItem>
+                                                <SelectItem value="asyncio">Async (event loop)</SelectItem>
+                                            </SelectContent>
+                                        </Select>
+                                    </div>
                                     <div className="flex items-center gap-2 pt-2">
                                         <input
                                             type="checkbox"
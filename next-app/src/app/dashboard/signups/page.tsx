@@ -250,6 +250,23 @@ function SignupsContent() {
         return <Badge variant="outline" className={`${variants[status] || variants[signup.status] || ""} border font-medium whitespace-nowrap`}>{status}</Badge>;
     };
 
+    // The list only carries notes_count; load the notes themselves from the full signup
+    const openNotes = async (signup: any) => {
+        setSelectedSignupForNotes(signup);
+        setIsNotesModalOpen(true);
+        try {
+            const res = await authFetch(`${process.env.NEXT_PUBLIC_API_URL}/admin/signups/${signup._id}`);
+            if (res && res.ok) {
+                const full = await res.json();
+                setSelectedSignupForNotes((prev: any) =>
+                    prev && prev._id === signup._id ? { ...prev, notes: full.notes || [] } : prev
+                );
+            }
+        } catch (e) {
+            console.error("Error loading notes", e);
+        }
+    };
+
     const handleDelete = async (signupId: string, companyName: string) => {
         if (!confirm(`Are you sure you want to permanently delete the signup for "${companyName}"? This action cannot be undone.`)) return;
 
@@ -628,15 +645,14 @@ function SignupsContent() {
                                                         className="h-9 w-9 text-gray-400 hover:text-primary hover:bg-primary/5"
                                                         onClick={(e) => {
                                                             e.stopPropagation();
-                                                            setSelectedSignupForNotes(signup);
-                                                            setIsNotesModalOpen(true);
+                                                            openNotes(signup);
                                                         }}
                                                         title="Manage Internal Notes"
                                                     >
                                                         <div className="relative">
                                                             <MessageSquare className="h-4 w-4" />
                                                             <span className="absolute -top-2 -right-2 flex h-4 min-w-[1rem] items-center justify-center rounded-full bg-primary px-1 text-[10px] font-medium text-primary-foreground shadow-sm">
-                                                                {signup.notes?.length || 0}
+                                                                {signup.notes_count ?? signup.notes?.length ?? 0}
                                                             </span>
                                                         </div>
                                                     </Button>
@@ -816,14 +832,13 @@ function SignupsContent() {
                                                     className="h-8 w-8 sm:h-9 sm:w-9 text-gray-400 hover:text-primary"
                                                     onClick={(e) => {
                                                         e.stopPropagation();
-                                                        setSelectedSignupForNotes(signup);
-                                                        setIsNotesModalOpen(true);
+                                                        openNotes(signup);
                                                     }}
                                                 >
                                                     <div className="relative">
                                                         <MessageSquare className="h-4 w-4" />
                                                         <span className="absolute -top-2 -right-2 flex h-4 min-w-[1rem] items-center justify-center rounded-full bg-primary px-1 text-[10px] font-medium text-primary-foreground shadow-sm">
-                                                            {signup.notes?.length || 0}
+                                                            {signup.notes_count ?? signup.notes?.length ?? 0}
                                                         </span>
                                                     </div>
                                                 </Button>
@@ -904,7 +919,7 @@ function SignupsContent() {
                     initialNotes={selectedSignupForNotes.notes || []}
                     onNotesUpdate={(updatedNotes) => {
                         setSignups(prev => prev.map(s =>
-                            s._id === selectedSignupForNotes._id ? { ...s, notes: updatedNotes } : s
+                            s._id === selectedSignupForNotes._id ? { ...s, notes_count: updatedNotes.length } : s
                         ));
                     }}
                 />
@@ -36,11 +36,14 @@ export const {
                 remember: { label: "Remember Me", type: "checkbox" },
                 otp: { label: "OTP", type: "text" }
             },
-            async authorize(credentials) {
+            async authorize(credentials, request) {
                 if (!credentials?.email || !credentials?.password) return null;
 
                 try {
                     const apiUrl = process.env.INTERNAL_API_URL || process.env.NEXT_PUBLIC_API_URL;
+                    // Login is called server-side: pass the browser's IP on so the API's per-IP login limit applies to it
+                    const clientIp = request?.headers?.get("x-real-ip")
+                        || request?.headers?.get("x-forwarded-for")?.split(",")[0]?.trim();
                     const res = await fetch(`${apiUrl}/token`, {
                         method: "POST",
                         body: new URLSearchParams({
@@ -49,7 +52,10 @@ export const {
                             remember: String(credentials.remember || false),
                             otp: (credentials.otp as string) || "",
                         }),
-                        headers: { "Content-Type": "application/x-www-form-urlencoded" }
+                        headers: {
+                            "Content-Type": "application/x-www-form-urlencoded",
+                            ...(clientIp ? { "X-Real-IP": clientIp } : {}),
+                        }
                     });
 
 
@@ -134,6 +140,8 @@ export const {
             // When update() is called client-side, merge the updated fields into the token
             if (trigger === 'update' && session) {
                 if (session.name) token.name = session.name;
+                // Password change: the API revoked the old token and issued this one
+                if (session.accessToken) token.accessToken = session.accessToken;
             }
             return token;
         },